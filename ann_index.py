@@ -0,0 +1,320 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class IVFIndex:
+    """Приближенный поиск ближайших соседей (IVF) поверх EmbeddingStore.
+
+    Центроиды строятся сферическим k-means по выборке эмбеддингов, каждая
+    строка хранилища приписывается к ближайшему центроиду. Поиск просматривает
+    только nprobe ближайших к запросу списков и до скалярного произведения
+    отсекает строки вне временного окна. Новые строки хранилища добавляются
+    инкрементально через sync(), индекс переобучается при росте архива в
+    retrain_growth раз. sync() с обучением и записью на диск вызывают только
+    фоновые пути (сборщик, лидер); запросы делают refresh() - перечитывают
+    уже сохраненный индекс, если его обновил другой процесс.
+    """
+
+    def __init__(self, store, path='data/ann_index.npz', db_path='data/news.db',
+                 min_train_size=2048, retrain_growth=4.0, nprobe=16, exact_limit=20000):
+        self.store = store
+        self.path = path
+        self.db_path = db_path
+        self.min_train_size = min_train_size
+        self.retrain_growth = retrain_growth
+        self.nprobe = nprobe
+        self.exact_limit = exact_limit  # узкое окно с меньшим числом строк ищем точно
+
+        self.centroids = None
+        self.row_list = np.empty(0, dtype=np.int32)         # номер списка для каждой строки (-1 - без списка)
+        self.row_published = np.empty(0, dtype=np.float64)  # время публикации строки (unix time)
+        self.trained_size = 0
+        self.lists = []
+        self.list_published = []
+
+        self._dirty = False
+        self._mtime = None  # время изменения файла индекса при последней загрузке или записи
+        self._lock = threading.RLock()
+        self._load()
+
+    # --- Персистентность ---
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+
+        try:
+            self._mtime = os.path.getmtime(self.path)
+            data = np.load(self.path)
+            centroids = data['centroids']
+            self.centroids = centroids if centroids.size else None
+            self.row_list = data['row_list'].astype(np.int32)
+            self.row_published = data['row_published'].astype(np.float64)
+            self.trained_size = int(data['trained_size'])
+
+            # Индекс мог отстать или опередить хранилище - обрезаем до общей длины
+            known = min(len(self.row_list), len(self.store))
+            self.row_list = self.row_list[:known]
+            self.row_published = self.row_published[:known]
+
+            self._rebuild_lists()
+            logger.info(f"✅ ANN-индекс загружен: {known} строк, {self.nlist} списков")
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки ANN-индекса, будет перестроен: {e}")
+            self.centroids = None
+            self.row_list = np.empty(0, dtype=np.int32)
+            self.row_published = np.empty(0, dtype=np.float64)
+
+    def save(self):
+        """Атомарная запись индекса на диск"""
+        with self._lock:
+            if not self._dirty:
+                return
+
+            tmp_path = f"{self.path}.tmp.npz"
+            np.savez(
+                tmp_path,
+                centroids=self.centroids if self.centroids is not None else np.empty((0, 0), dtype=np.float32),
+                row_list=self.row_list,
+                row_published=self.row_published,
+                trained_size=np.int64(self.trained_size)
+            )
+            os.replace(tmp_path, self.path)
+            self._mtime = os.path.getmtime(self.path)
+            self._dirty = False
+
+    def refresh(self):
+        """Подхватывает индекс, сохраненный фоновой синхронизацией (в т.ч. другим процессом).
+
+        Только чтение: без обучения и записи на диск - для обработчиков запросов.
+        """
+        self.store.refresh()
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        with self._lock:
+            if mtime != self._mtime and not self._dirty:
+                self._load()
+
+    @property
+    def nlist(self):
+        return 0 if self.centroids is None else len(self.centroids)
+
+    def __len__(self):
+        return len(self.row_list)
+
+    # --- Построение ---
+
+    def _rebuild_lists(self):
+        """Инвертированные списки из назначений строк (argsort вместо цикла)"""
+        self.lists = []
+        self.list_published = []
+        if self.centroids is None:
+            return
+
+        order = np.argsort(self.row_list, kind='stable').astype(np.int32)
+        bounds = np.searchsorted(self.row_list[order], np.arange(self.nlist + 1))
+        for list_id in range(self.nlist):
+            rows = order[bounds[list_id]:bounds[list_id + 1]]
+            self.lists.append(rows)
+            self.list_published.append(self.row_published[rows])
+
+    @staticmethod
+    def _chunk_size(nlist, budget=1 << 24):
+        """Строк в блоке, чтобы матрица сходств (строки x списки) занимала не больше budget float32 (64 МБ)"""
+        return max(1024, budget // max(nlist, 1))
+
+    @classmethod
+    def _nearest(cls, vectors, centroids):
+        """Номер ближайшего центроида для векторов - блоками, без плотной матрицы на всю выборку"""
+        labels = np.empty(len(vectors), dtype=np.int32)
+        chunk_size = cls._chunk_size(len(centroids))
+        for start in range(0, len(vectors), chunk_size):
+            labels[start:start + chunk_size] = np.argmax(vectors[start:start + chunk_size] @ centroids.T, axis=1)
+        return labels
+
+    def _assign(self, rows):
+        """Номер ближайшего центроида для строк хранилища"""
+        assignments = np.empty(len(rows), dtype=np.int32)
+        chunk_size = self._chunk_size(self.nlist)
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            vectors = np.asarray(self.store.matrix[chunk], dtype=np.float32)
+            assignments[start:start + chunk_size] = self._nearest(vectors, self.centroids)
+        return assignments
+
+    def train(self, nlist=None, iterations=10, sample_size=None, seed=42):
+        """Сферический k-means по выборке эмбеддингов и переназначение всех строк"""
+        with self._lock:
+            count = len(self.row_list)
+            if count < self.min_train_size:
+                return False
+
+            if nlist is None:
+                nlist = int(np.clip(4 * np.sqrt(count), 16, 4096))
+            sample_size = sample_size or min(count, nlist * 64, 262144)
+
+            started = time.time()
+            rng = np.random.default_rng(seed)
+            sample_rows = np.sort(rng.choice(count, size=sample_size, replace=False))
+            sample = np.asarray(self.store.matrix[sample_rows], dtype=np.float32)
+
+            centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+            for _ in range(iterations):
+                labels = self._nearest(sample, centroids)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                counts = np.bincount(labels, minlength=nlist)
+
+                # Пустые кластеры переинициализируем случайными точками
+                empty = counts == 0
+                if empty.any():
+                    sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+                centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+            self.centroids = centroids.astype(np.float32)
+            self.row_list = self._assign(np.arange(count, dtype=np.int32))
+            self.trained_size = count
+            self._rebuild_lists()
+            self._dirty = True
+
+            logger.info(f"🧭 ANN-индекс обучен: {count} строк, {nlist} списков за {time.time() - started:.1f}с")
+            return True
+
+    def add(self, rows, published):
+        """Инкрементальная вставка строк хранилища с временем публикации"""
+        rows = np.asarray(rows, dtype=np.int32)
+        published = np.asarray(published, dtype=np.float64)
+        if not len(rows):
+            return
+
+        with self._lock:
+            if self.centroids is not None:
+                assignments = self._assign(rows)
+            else:
+                assignments = np.full(len(rows), -1, dtype=np.int32)
+
+            self.row_list = np.concatenate([self.row_list, assignments])
+            self.row_published = np.concatenate([self.row_published, published])
+            self._dirty = True
+
+            if self.centroids is None or len(self.row_list) >= self.trained_size * self.retrain_growth:
+                if self.train():
+                    return
+
+            if self.centroids is not None:
+                for list_id in np.unique(assignments):
+                    mask = assignments == list_id
+                    self.lists[list_id] = np.concatenate([self.lists[list_id], rows[mask]])
+                    self.list_published[list_id] = np.concatenate([self.list_published[list_id], published[mask]])
+
+    def sync(self):
+        """Догоняет хранилище: добавляет новые строки, время публикации берет из базы"""
+        with self._lock:
+            start = len(self.row_list)
+            end = len(self.store)
+            if end <= start:
+                return 0
+
+            rows = np.arange(start, end, dtype=np.int32)
+            article_ids = [article_id.decode('ascii') for article_id in self.store.ids[start:end].tolist()]
+            published = self._lookup_published(article_ids)
+
+            self.add(rows, [published.get(article_id, time.time()) for article_id in article_ids])
+            self.save()
+            return end - start
+
+    def _lookup_published(self, article_ids, batch_size=500):
+        """Время публикации статей из raw_articles"""
+        published = {}
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            for start in range(0, len(article_ids), batch_size):
+                batch = article_ids[start:start + batch_size]
+                placeholders = ','.join('?' * len(batch))
+                cursor.execute(f"SELECT id, published_at FROM raw_articles WHERE id IN ({placeholders})", batch)
+                for article_id, published_at in cursor.fetchall():
+                    try:
+                        published[article_id] = datetime.fromisoformat(published_at).timestamp()
+                    except (TypeError, ValueError):
+                        continue
+            conn.close()
+        except Exception as e:
+            logger.error(f"❌ Ошибка чтения времени публикации: {e}")
+        return published
+
+    # --- Поиск ---
+
+    def search(self, query, k=10, nprobe=None, since=None, until=None):
+        """Top-k ближайших статей: список (id, similarity).
+
+        since/until - границы окна публикации (unix time), фильтр применяется
+        до вычисления близости. Если в окно попадает не больше exact_limit строк,
+        они просматриваются целиком - это и быстрее, и точнее пробинга.
+        """
+        query = np.asarray(query, dtype=np.float32).ravel()
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        with self._lock:
+            if not len(self.row_list):
+                return []
+
+            window = None
+            if since is not None or until is not None:
+                window = np.ones(len(self.row_published), dtype=bool)
+                if since is not None:
+                    window &= self.row_published >= since
+                if until is not None:
+                    window &= self.row_published <= until
+
+            if self.centroids is None or (window is not None and window.sum() <= self.exact_limit):
+                rows = np.arange(len(self.row_list), dtype=np.int32)
+                published = self.row_published
+            else:
+                nprobe = min(nprobe or self.nprobe, self.nlist)
+                centroid_scores = self.centroids @ query
+                probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+                rows = np.concatenate([self.lists[list_id] for list_id in probe])
+                published = np.concatenate([self.list_published[list_id] for list_id in probe])
+
+            mask = np.ones(len(rows), dtype=bool)
+            if since is not None:
+                mask &= published >= since
+            if until is not None:
+                mask &= published <= until
+            rows = np.sort(rows[mask])  # последовательное чтение memmap
+
+            if not len(rows):
+                return []
+
+            scores = self.store.scores(query, rows=rows)
+            k = min(k, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            return [(self.store.ids[rows[i]].decode('ascii'), float(scores[i])) for i in top]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_ann_index(path='data/ann_index.npz'):
+    """Общий для процесса ANN-индекс над общим хранилищем эмбеддингов"""
+    from embedding_store import get_embedding_store
+
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = IVFIndex(get_embedding_store(), path=path)
+        return _indexes[path]
@@ -1,4 +1,4 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request
 import json
 from datetime import datetime, timedelta
 import sqlite3
@@ -7,9 +7,15 @@ import os
 import threading
 import time
 import asyncio
-import queue
 import hashlib
 
+from job_store import get_job_store, default_worker_id
+from hotness_engine import get_hotness_index
+from hot_news_index import get_hot_news_index
+from stats_rollup import get_stats_rollup
+from entity_index import get_entity_index, ner_entities
+from shared_state import get_shared_state, LeaderElection
+
 app = Flask(__name__)
 app.secret_key = 'radar-secret-key-2025'
 
@@ -17,21 +23,22 @@ app.secret_key = 'radar-secret-key-2025'
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Глобальные переменные
+# Глобальные переменные процесса; общее для воркеров состояние - в shared_state
 components_ready = False
 collector = None
 neural_analyzer = None
-news_drafts = {}
-initial_collection_done = False
+leader_election = None
+leader_duties_started = False
 
-# Очереди для фоновой обработки
-news_processing_queue = queue.Queue()
-processing_results = {}
+# Фоновая обработка: задачи в таблице ai_jobs, воркер-поток и/или scripts/neural_worker.py
 background_processor = None
 
+# Статус задачи -> статус нейросетевой обработки в карточке
+NEURAL_JOB_STATES = {'pending': 'queued', 'leased': 'processing', 'failed': 'failed', 'rejected': 'deferred'}
+
 def initialize_components():
-    """Инициализация компонентов системы"""
-    global components_ready, collector, neural_analyzer, background_processor
+    """Инициализация компонентов процесса (каждого веб-воркера)"""
+    global components_ready, collector, neural_analyzer, leader_election
     
     try:
         logger.info("🔄 Инициализация компонентов системы...")
@@ -39,32 +46,30 @@ def initialize_components():
         #  создаем базу данных
         setup_database()
         
+        # Хранилище эмбеддингов (memmap, открывается за миллисекунды)
+        from embedding_store import get_embedding_store
+        get_embedding_store()
+        
         
         from data_collector import AdvancedFinanceNewsCollector
         collector = AdvancedFinanceNewsCollector()
         logger.info("✅ Коллектор новостей инициализирован")
         
-        def init_neural_in_background():
-            global neural_analyzer
-            try:
-                from neural_analyzer import NeuralNewsAnalyzer
-                neural_analyzer = NeuralNewsAnalyzer()
-                neural_status = neural_analyzer.get_models_status()
-                logger.info(f"🧠 Нейросетевой анализатор: {neural_status}")
-                
-                if neural_analyzer.models_loaded:
-                    start_background_processor()
-                    
-            except Exception as e:
-                logger.error(f"❌ Ошибка инициализации нейросетей: {e}")
-                neural_analyzer = None
+        # Клиент сервера инференса дешев - он нужен каждому воркеру (поиск, похожие)
+        if os.environ.get('RADAR_INFERENCE_URL'):
+            from neural_analyzer import get_neural_analyzer
+            neural_analyzer = get_neural_analyzer()
+        
+        # Нейросети и фоновая обработка - только у одного воркера-лидера
+        leader_election = LeaderElection(get_shared_state(), on_elected=start_leader_duties,
+                                         on_lost=stop_leader_duties)
+        leader_election.info = {'ready': True}
         
-        neural_thread = threading.Thread(target=init_neural_in_background)
-        neural_thread.daemon = True
-        neural_thread.start()
+        # Прогоны сбора с эмбеддингами - только у лидера, остальные воркеры передают ему запрос
+        from collection_coordinator import get_collection_coordinator
+        get_collection_coordinator().can_run = lambda: leader_election.is_leader
         
-        # Сразу создаем демо-данные
-        create_demo_data_if_needed()
+        leader_election.start()
         
         components_ready = True
         logger.info("✅ Все компоненты инициализированы")
@@ -73,61 +78,159 @@ def initialize_components():
         logger.error(f"❌ Ошибка инициализации компонентов: {e}")
         components_ready = False
 
-def start_background_processor():
-    """Запускает фоновый процессор для нейросетевой обработки"""
+def start_leader_duties():
+    """Задачи, которые выполняет ровно один процесс: нейросети, фоновая обработка, демо-данные.
+    
+    Все циклы задач получают срок лидерства (term) и проверяют его на каждой
+    итерации: потерявший аренду воркер останавливает их сам.
+    """
+    global leader_duties_started
+    
+    if leader_duties_started:
+        return
+    leader_duties_started = True
+    term = leader_election.term
+    get_shared_state().set('neural_ready', False)
+    
+    def init_neural_in_background():
+        global neural_analyzer
+        try:
+            from neural_analyzer import get_neural_analyzer
+            neural_analyzer = get_neural_analyzer()
+            neural_status = neural_analyzer.get_models_status()
+            logger.info(f"🧠 Нейросетевой анализатор: {neural_status}")
+            if term.is_set():
+                return
+            get_shared_state().set('neural_ready', neural_analyzer.models_loaded)
+            
+            if neural_analyzer.models_loaded:
+                start_background_processor(term)
+                # Эмбеддинги статей, сохраненных до запуска, затем - периодически
+                interval = float(os.environ.get('RADAR_EMBED_BACKFILL_SECONDS', 300))
+                backfill_embeddings(stop_event=term)
+                while not term.wait(interval):
+                    backfill_embeddings(hours=24, stop_event=term)
+                
+        except Exception as e:
+            logger.error(f"❌ Ошибка инициализации нейросетей: {e}")
+            neural_analyzer = None
+            get_shared_state().set('neural_ready', False)
+    
+    neural_thread = threading.Thread(target=init_neural_in_background)
+    neural_thread.daemon = True
+    neural_thread.start()
+    
+    # Сразу создаем демо-данные
+    create_demo_data_if_needed()
+    
+    # Индекс сущностей для статей, сохраненных до его появления (и демо-данных)
+    entity_thread = threading.Thread(target=backfill_entities, kwargs={'stop_event': term})
+    entity_thread.daemon = True
+    entity_thread.start()
+    
+    # Прогоны сбора, запрошенные другими воркерами
+    collection_thread = threading.Thread(target=serve_collection_requests, args=(term,))
+    collection_thread.daemon = True
+    collection_thread.start()
+
+def stop_leader_duties():
+    """Аренда лидера потеряна: циклы задач завершаются по term, при новом избрании запускаются заново"""
+    global leader_duties_started
+    leader_duties_started = False
+    logger.warning("⏹️ Задачи лидера останавливаются")
+
+def serve_collection_requests(term, poll_interval=2.0):
+    """Лидер выполняет прогоны сбора, запрошенные в других воркерах (модели эмбеддингов только у него)"""
+    from collection_coordinator import get_collection_coordinator
+    
+    coordinator = get_collection_coordinator()
+    while not term.wait(poll_interval):
+        try:
+            collection_request = get_shared_state().pop('collection_request')
+            if collection_request:
+                result = coordinator.trigger(**collection_request)
+                logger.info(f"📥 Запрос сбора от другого воркера: {result['status']}")
+        except Exception as e:
+            logger.error(f"❌ Ошибка обработки запроса сбора: {e}")
+
+def is_neural_ready():
+    """Нейросети готовы у этого процесса или у воркера-лидера"""
+    if neural_analyzer is not None and getattr(neural_analyzer, 'models_loaded', False):
+        return True
+    return bool(get_shared_state().get('neural_ready', False))
+
+def start_background_processor(term=None):
+    """Запускает фоновый процессор для нейросетевой обработки (до конца срока лидерства term)"""
     global background_processor
     
-    if background_processor and background_processor.is_alive():
+    # Поток прошлого срока дорабатывает текущую задачу и выходит сам - ему нужна замена
+    if background_processor and background_processor.is_alive() and background_processor.term is term:
         return
     
-    def process_news_background():
-        """Фоновая обработка новостей нейросетями"""
-        while True:
-            try:
-                # Берем новость из очереди (с таймаутом чтобы не блокировать)
-                try:
-                    news_data = news_processing_queue.get(timeout=1.0)
-                    news_id, article = news_data
-                    
-                    logger.info(f"🧠 Фоновая обработка новости: {article['title'][:50]}...")
-                    
-                    # Обрабатываем нейросетью
-                    if neural_analyzer and neural_analyzer.models_loaded:
-                        processed_articles = asyncio.run(
-                            neural_analyzer.process_articles_batch([article])
-                        )
-                        
-                        if processed_articles:
-                            enhanced_article = processed_articles[0]
-                            
-                            # Сохраняем результат
-                            processing_results[news_id] = {
-                                'enhanced_data': enhanced_article,
-                                'processed_at': datetime.now(),
-                                'status': 'completed'
-                            }
-                            
-                            # Обновляем базу данных с улучшенными данными
-                            update_article_with_ai_data(news_id, enhanced_article)
-                            
-                            logger.info(f"✅ Новость обработана нейросетью: {news_id}")
-                    
-                    news_processing_queue.task_done()
-                    
-                except queue.Empty:
-                    # Очередь пуста, продолжаем ждать
-                    time.sleep(0.1)
-                    continue
-                    
-            except Exception as e:
-                logger.error(f"❌ Ошибка фоновой обработки: {e}")
-                time.sleep(1)
+    # При внешних воркерах (scripts/neural_worker.py) веб-процесс может не обрабатывать сам
+    if os.environ.get('RADAR_INPROCESS_WORKER', '1') == '0':
+        logger.info("ℹ️ Встроенный воркер отключен, задачи обрабатывают внешние воркеры")
+        return
     
-    background_processor = threading.Thread(target=process_news_background)
+    background_processor = threading.Thread(target=run_enrichment_worker, args=(neural_analyzer, None, term))
+    background_processor.term = term
     background_processor.daemon = True
     background_processor.start()
     logger.info("✅ Фоновый процессор нейросетей запущен")
 
+def process_enrichment_job(analyzer, article):
+    """Нейросетевая обработка одной статьи с сохранением AI-данных в базу"""
+    # Сюжет уже обработан по другой статье - переиспользуем результат
+    story_data = get_story_ai_data(article)
+    if story_data:
+        update_article_with_ai_data(article['id'], story_data)
+        logger.info(f"🧩 AI-данные взяты из сюжета: {article['id']}")
+        return story_data
+    
+    processed_articles = asyncio.run(analyzer.process_articles_batch([article]))
+    if not processed_articles:
+        return None
+    
+    update_article_with_ai_data(article['id'], processed_articles[0])
+    # Сущности NER дополняют словарные в индексе article_entities
+    get_entity_index().add_articles([
+        (article['id'], article['published_at'], ner_entities(processed_articles[0].get('ner_entities')))
+    ])
+    # Оценка с учетом тональности заменяет оценку сборщика (индекс горячих новостей подхватит по scored_at)
+    get_hotness_index().rescore([(article['id'], processed_articles[0]['hotness'], article['published_at'])])
+    logger.info(f"✅ Новость обработана нейросетью: {article['id']}")
+    return processed_articles[0]
+
+def run_enrichment_worker(analyzer, worker_id=None, stop_event=None, idle_sleep=1.0):
+    """Цикл воркера: захват задачи из ai_jobs, обработка, отметка результата"""
+    from neural_analyzer import MODEL_VERSION
+    
+    jobs = get_job_store()
+    worker_id = worker_id or default_worker_id()
+    logger.info(f"👷 Воркер нейросетевой обработки: {worker_id}")
+    
+    while not (stop_event and stop_event.is_set()):
+        try:
+            articles = jobs.claim(worker_id)
+            if not articles:
+                time.sleep(idle_sleep)
+                continue
+            
+            for article in articles:
+                logger.info(f"🧠 Фоновая обработка новости: {article['title'][:50]}...")
+                try:
+                    if process_enrichment_job(analyzer, article):
+                        jobs.complete(article['id'], worker_id, MODEL_VERSION)
+                    else:
+                        jobs.fail(article['id'], worker_id, 'empty result')
+                except Exception as e:
+                    logger.error(f"❌ Ошибка обработки задачи {article['id']}: {e}")
+                    jobs.fail(article['id'], worker_id, e)
+                    
+        except Exception as e:
+            logger.error(f"❌ Ошибка фоновой обработки: {e}")
+            time.sleep(1)
+
 def update_article_with_ai_data(article_id, enhanced_data):
     """Обновляет статью в базе с AI-данными"""
     try:
@@ -162,6 +265,49 @@ def update_article_with_ai_data(article_id, enhanced_data):
     except Exception as e:
         logger.error(f"❌ Ошибка сохранения AI-данных: {e}")
 
+def backfill_entities(hours=72, stop_event=None):
+    """Достраивает индекс сущностей для статей без строк в article_entities"""
+    try:
+        get_entity_index().backfill(hours=hours, stop_event=stop_event)
+    except Exception as e:
+        logger.error(f"❌ Ошибка построения индекса сущностей: {e}")
+
+def backfill_embeddings(hours=72, batch_size=64, stop_event=None):
+    """Достраивает эмбеддинги для статей, сохраненных до запуска нейросетей"""
+    try:
+        from embedding_store import get_embedding_store, embedding_text
+        store = get_embedding_store()
+        
+        conn = sqlite3.connect('data/news.db')
+        cursor = conn.cursor()
+        since_time = datetime.now() - timedelta(hours=hours)
+        cursor.execute('''
+            SELECT id, title, content FROM raw_articles
+            WHERE is_finance = 1 AND published_at >= ?
+        ''', (since_time.isoformat(),))
+        rows = [row for row in cursor.fetchall() if row[0] not in store]
+        conn.close()
+        
+        added = 0
+        for start in range(0, len(rows), batch_size):
+            if stop_event and stop_event.is_set():
+                return
+            batch = rows[start:start + batch_size]
+            texts = [embedding_text({'title': row[1], 'content': row[2]}) for row in batch]
+            vectors = neural_analyzer.embed_texts(texts, batch_size=batch_size)
+            if vectors is None:
+                break
+            added += store.add([row[0] for row in batch], vectors)
+        
+        if added:
+            logger.info(f"🧬 Достроено эмбеддингов: {added}")
+        
+        from ann_index import get_ann_index
+        get_ann_index().sync()
+            
+    except Exception as e:
+        logger.error(f"❌ Ошибка построения эмбеддингов: {e}")
+
 def get_ai_enhanced_data(article_id):
     """Получает AI-улучшенные данные для статьи"""
     try:
@@ -184,6 +330,50 @@ def get_ai_enhanced_data(article_id):
         logger.error(f"❌ Ошибка получения AI-данных: {e}")
         return None
 
+def adapt_ai_data(enhanced, article):
+    """AI-данные другой статьи (оригинала или копии сюжета) в карточку этой статьи"""
+    published_at = article.get('published_at', datetime.now())
+    enhanced = dict(enhanced)
+    enhanced.update({
+        'id': article['id'],
+        'headline': article['title'],
+        'source': article['source_name'],
+        'sources': [article['url']],
+        'published_at': published_at.isoformat() if isinstance(published_at, datetime) else published_at
+    })
+    return enhanced
+
+def get_story_ai_data(article):
+    """AI-данные другой статьи того же сюжета, адаптированные под эту статью"""
+    try:
+        conn = sqlite3.connect('data/news.db')
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT d.enhanced_data FROM article_stories own
+            JOIN article_stories peer ON peer.story_id = own.story_id
+            JOIN ai_article_data d ON d.article_id = peer.article_id
+            WHERE own.article_id = ? AND peer.article_id != ? AND d.ai_enhanced = 1
+            LIMIT 1
+        ''', (article['id'], article['id']))
+        
+        result = cursor.fetchone()
+        conn.close()
+        
+        if not result:
+            return None
+        
+        enhanced = adapt_ai_data(json.loads(result[0]), article)
+        enhanced['story_shared'] = True
+        return enhanced
+        
+    except sqlite3.OperationalError:
+        # Таблиц сюжетов ещё нет - кластеризация не запускалась
+        return None
+    except Exception as e:
+        logger.error(f"❌ Ошибка получения AI-данных сюжета: {e}")
+        return None
+
 def setup_database():
     """Создает базу данных с правильной структурой"""
     try:
@@ -206,7 +396,8 @@ def setup_database():
                 category TEXT,
                 is_finance BOOLEAN DEFAULT 0,
                 country TEXT DEFAULT 'unknown',
-                importance_score REAL DEFAULT 0.5
+                importance_score REAL DEFAULT 0.5,
+                duplicate_of TEXT
             )
         ''')
         
@@ -223,13 +414,15 @@ def setup_database():
         cursor.execute("PRAGMA table_info(raw_articles)")
         existing_columns = [column[1] for column in cursor.fetchall()]
         
-        required_columns = ['country', 'importance_score']
+        required_columns = ['country', 'importance_score', 'duplicate_of']
         for column in required_columns:
             if column not in existing_columns:
                 if column == 'country':
                     cursor.execute("ALTER TABLE raw_articles ADD COLUMN country TEXT DEFAULT 'unknown'")
                 elif column == 'importance_score':
                     cursor.execute("ALTER TABLE raw_articles ADD COLUMN importance_score REAL DEFAULT 0.5")
+                elif column == 'duplicate_of':
+                    cursor.execute("ALTER TABLE raw_articles ADD COLUMN duplicate_of TEXT")
                 logger.info(f"✅ Добавлена колонка: {column}")
         
         # Создаем индексы 
@@ -245,16 +438,27 @@ def setup_database():
         
         conn.commit()
         conn.close()
+        # Колонка hot_key, ее индекс и опорное время затухания
+        get_hotness_index()
+        # Почасовая сводка для статистики (триггеры на raw_articles и ai_article_data)
+        get_stats_rollup()
+        get_entity_index()
         logger.info("✅ База данных инициализирована")
         
     except Exception as e:
         logger.error(f"❌ Ошибка создания базы данных: {e}")
 
-def get_real_news_from_db(hours=24, limit=50, sort_by='hotness', priority_filter='all'):
-    """Получение новостей из базы с поддержкой сортировки и фильтрации"""
+def get_real_news_from_db(hours=24, limit=50, sort_by='hotness', priority_filter='all', entity=None):
+    """Получение новостей из базы с поддержкой сортировки и фильтрации (entity - только статьи о сущности)"""
     try:
         if not os.path.exists('data/news.db'):
             return []
+        
+        # Первые страницы по горячести - из индекса в памяти, база - при холодном старте и глубоких страницах
+        if sort_by == 'hotness' and not entity:
+            articles = get_hot_news_index().top(hours=hours, limit=limit, band=priority_filter)
+            if articles is not None:
+                return articles
             
         conn = sqlite3.connect('data/news.db')
         cursor = conn.cursor()
@@ -262,7 +466,7 @@ def get_real_news_from_db(hours=24, limit=50, sort_by='hotness', priority_filter
         since_time = datetime.now() - timedelta(hours=hours)
         #БАЗА SQL ЗАПРОСА 
         base_query = '''
-            SELECT id, source_name, title, url, content, published_at, country, importance_score
+            SELECT id, source_name, title, url, content, published_at, country, importance_score, duplicate_of
             FROM raw_articles 
             WHERE is_finance = 1 AND published_at >= ?
         '''
@@ -270,6 +474,12 @@ def get_real_news_from_db(hours=24, limit=50, sort_by='hotness', priority_filter
         # Добавляем фильтр по приоритету
         params = [since_time.isoformat()]
         
+        # Фильтр по сущности: id статей - диапазон по первичному ключу article_entities
+        if entity:
+            from entity_index import canonical_entity
+            base_query += f' AND id IN ({get_entity_index().article_ids_query()})'
+            params += [canonical_entity(entity), since_time.isoformat()]
+        
         priority_conditions = {
             'high': 'importance_score > 0.7',
             'medium': 'importance_score BETWEEN 0.4 AND 0.7', 
@@ -282,13 +492,14 @@ def get_real_news_from_db(hours=24, limit=50, sort_by='hotness', priority_filter
         
         # Добавляем сортировку
         sort_options = {
-            'hotness': 'importance_score DESC',
+            # hot_key - логарифм затухающей горячести (hotness_engine.HotnessIndex), порядок по индексу
+            'hotness': 'hot_key DESC',
             'date_new': 'published_at DESC',
             'date_old': 'published_at ASC',
             'source': 'source_name ASC'
         }
         
-        order_by = sort_options.get(sort_by, 'importance_score DESC')
+        order_by = sort_options.get(sort_by, 'hot_key DESC')
         base_query += f' ORDER BY {order_by}'
         
         # 
@@ -308,6 +519,7 @@ def get_real_news_from_db(hours=24, limit=50, sort_by='hotness', priority_filter
                 'published_at': datetime.fromisoformat(row[5]) if row[5] else datetime.now(),
                 'country': row[6] or 'unknown',
                 'importance_score': row[7] or 0.5,
+                'duplicate_of': row[8],
                 'collected_at': datetime.now()
             })
         
@@ -318,6 +530,40 @@ def get_real_news_from_db(hours=24, limit=50, sort_by='hotness', priority_filter
         logger.error(f"Ошибка при получении новостей из базы: {e}")
         return []
 
+def find_article_id(news_id):
+    """Полный id статьи по id или его префиксу из карточки"""
+    conn = sqlite3.connect('data/news.db')
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM raw_articles WHERE id LIKE ? || '%' LIMIT 1", (news_id,))
+    result = cursor.fetchone()
+    conn.close()
+    return result[0] if result else None
+
+def get_articles_by_ids(article_ids):
+    """Статьи по списку id (порядок не гарантируется)"""
+    if not article_ids:
+        return []
+    
+    conn = sqlite3.connect('data/news.db')
+    cursor = conn.cursor()
+    placeholders = ','.join('?' * len(article_ids))
+    cursor.execute(f'''
+        SELECT id, source_name, title, url, published_at, importance_score
+        FROM raw_articles WHERE id IN ({placeholders})
+    ''', list(article_ids))
+    
+    articles = [{
+        'id': row[0],
+        'source_name': row[1],
+        'title': row[2],
+        'url': row[3],
+        'published_at': row[4],
+        'importance_score': row[5] or 0.5
+    } for row in cursor.fetchall()]
+    
+    conn.close()
+    return articles
+
 def quick_entity_extraction(title):
     """Быстрое извлечение сущностей"""
     text_lower = title.lower()
@@ -378,6 +624,7 @@ def quick_impact_level(importance_score):
 def create_fast_news_format(raw_articles):
     """Быстрое создание формата новостей с возможностью фонового улучшения"""
     processed_news = []
+    pending = {}
     
     for article in raw_articles:
         try:
@@ -389,6 +636,22 @@ def create_fast_news_format(raw_articles):
                 processed_news.append(ai_data)
                 continue
             
+            # Почти-дубликат: берем результат оригинала
+            if article.get('duplicate_of'):
+                original_data = get_ai_enhanced_data(article['duplicate_of'])
+                if original_data:
+                    ai_data = adapt_ai_data(original_data, article)
+                    ai_data['duplicate_of'] = article['duplicate_of'][:12]
+                    processed_news.append(ai_data)
+                    continue
+            
+            # Нейросети запускаются один раз на сюжет
+            ai_data = get_story_ai_data(article)
+            if ai_data:
+                update_article_with_ai_data(article['id'], ai_data)
+                processed_news.append(ai_data)
+                continue
+            
             # Быстрая обработка 
             title = article['title']
             importance_score = article.get('importance_score', 0.5)
@@ -416,9 +679,12 @@ def create_fast_news_format(raw_articles):
                 'neural_processing': 'pending'  
             }
             
-            if neural_analyzer and neural_analyzer.models_loaded:
-                news_processing_queue.put((article['id'], article))
-                processed_article['neural_processing'] = 'queued'
+            if article.get('duplicate_of'):
+                # Перепечатку не обрабатываем: дождется результата оригинала
+                processed_article['duplicate_of'] = article['duplicate_of'][:12]
+                processed_article['neural_processing'] = 'duplicate'
+            else:
+                pending[article['id']] = (article, processed_article)
             
             processed_news.append(processed_article)
             
@@ -426,8 +692,55 @@ def create_fast_news_format(raw_articles):
             logger.error(f"Ошибка быстрой обработки статьи: {e}")
             continue
     
+    # Постановка в ai_jobs одной транзакцией; повторная постановка (опрос UI) задачу не дублирует
+    if pending:
+        try:
+            statuses = get_job_store().enqueue_many([article for article, _ in pending.values()])
+            for article_id, (_, processed_article) in pending.items():
+                processed_article['neural_processing'] = NEURAL_JOB_STATES.get(statuses.get(article_id), 'pending')
+        except Exception as e:
+            logger.error(f"❌ Ошибка постановки в очередь обработки: {e}")
+    
     return processed_news
 
+def group_articles_by_story(raw_articles, limit):
+    """Одна статья на сюжет (первая в текущей сортировке) и сводка её сюжета"""
+    from story_clusterer import get_story_ids, get_stories
+    
+    try:
+        story_ids = get_story_ids(a['id'] for a in raw_articles)
+        stories = get_stories(set(story_ids.values()))
+    except sqlite3.OperationalError:
+        # Кластеризация ещё не запускалась
+        return raw_articles[:limit], {}
+    
+    selected = []
+    story_by_article = {}
+    seen_stories = set()
+    for article in raw_articles:
+        story_id = story_ids.get(article['id'])
+        if story_id in seen_stories:
+            continue
+        if story_id in stories:
+            seen_stories.add(story_id)
+            story_by_article[article['id'][:12]] = stories[story_id]
+        
+        selected.append(article)
+        if len(selected) >= limit:
+            break
+    
+    return selected, story_by_article
+
+def apply_story_to_card(news, story):
+    """Заполняет карточку источниками всех копий события"""
+    urls = list(dict.fromkeys(a['url'] for a in story['articles']))
+    news['sources'] = urls or news.get('sources', [])
+    news['story_id'] = story['story_id'][:12]
+    news['story_size'] = story['article_count']
+    news['story_sources'] = sorted({a['source_name'] for a in story['articles']})
+    news['story_velocity'] = story['velocity']
+    return news
+
 def create_demo_data_if_needed():
     """Создает демо-данные если база пуста"""
     try:
@@ -523,6 +836,8 @@ def create_sample_articles():
         
         conn.commit()
         conn.close()
+        # Ключи горячести и scored_at - индекс горячих новостей подхватит демо-статьи при обновлении
+        get_hotness_index().backfill()
         logger.info("✅ Демо-данные с разными приоритетами созданы!")
         
     except Exception as e:
@@ -556,17 +871,32 @@ def get_news():
         limit = request.args.get('limit', 20, type=int)
         sort_by = request.args.get('sort', 'hotness')
         priority_filter = request.args.get('priority', 'all')
+        group = request.args.get('group', 'none')
+        entity = request.args.get('entity', '').strip() or None
+        
+        logger.info(f"📊 Запрос новостей: sort={sort_by}, priority={priority_filter}, group={group}, entity={entity}")
         
-        logger.info(f"📊 Запрос новостей: sort={sort_by}, priority={priority_filter}")
+        # При группировке по сюжетам берем запас статей: копии схлопываются
+        fetch_limit = min(limit * 4, 500) if group == 'story' else limit
         
         raw_articles = get_real_news_from_db(
             hours=hours, 
-            limit=limit, 
+            limit=fetch_limit, 
             sort_by=sort_by, 
-            priority_filter=priority_filter
+            priority_filter=priority_filter,
+            entity=entity
         )
+        story_by_article = {}
+        if group == 'story':
+            raw_articles, story_by_article = group_articles_by_story(raw_articles, limit)
+        
         processed_news = create_fast_news_format(raw_articles)
         
+        for news in processed_news:
+            story = story_by_article.get(news['id'][:12])
+            if story:
+                apply_story_to_card(news, story)
+        
         # Статистика по приоритетам
         priority_stats = {
             'high': len([n for n in processed_news if n['hotness'] > 0.7]),
@@ -585,6 +915,8 @@ def get_news():
                 "sorting": {
                     "current_sort": sort_by,
                     "current_priority": priority_filter,
+                    "current_group": group,
+                    "current_entity": entity,
                     "priority_stats": priority_stats
                 }
             })
@@ -609,34 +941,21 @@ def get_news():
 def get_stats():
     """Статистика системы"""
     try:
-        raw_articles = get_real_news_from_db(24, 100)
-        total_articles = len(raw_articles)
+        # Счетчики - из почасовой сводки, без чтения статей
+        rollup = get_stats_rollup()
+        last_24h = rollup.summary(hours=24)
         
-        priority_stats = {
-            'high': len([a for a in raw_articles if a['importance_score'] > 0.7]),
-            'medium': len([a for a in raw_articles if 0.4 <= a['importance_score'] <= 0.7]),
-            'low': len([a for a in raw_articles if a['importance_score'] < 0.4])
-        }
-        
-        ai_processed = 0
-        try:
-            conn = sqlite3.connect('data/news.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM ai_article_data")
-            result = cursor.fetchone()
-            ai_processed = result[0] if result else 0
-            conn.close()
-        except:
-            pass
+        from collection_coordinator import get_collection_coordinator
         
         return jsonify({
-            "total_articles": total_articles,
-            "last_24h": total_articles,
-            "sources_count": len(set([article['source_name'] for article in raw_articles])),
-            "ai_processed": ai_processed,
-            "neural_ready": neural_analyzer is not None and getattr(neural_analyzer, 'models_loaded', False),
-            "queue_size": news_processing_queue.qsize(),
-            "priority_stats": priority_stats
+            "total_articles": last_24h['articles'],
+            "last_24h": last_24h['articles'],
+            "sources_count": last_24h['sources_count'],
+            "ai_processed": rollup.summary()['ai_processed'],
+            "neural_ready": is_neural_ready(),
+            "queue_size": get_job_store().get_stats()['pending'],
+            "priority_stats": last_24h['priority_stats'],
+            "source_health": get_collection_coordinator().health.get_summary()
         })
         
     except Exception as e:
@@ -650,26 +969,57 @@ def get_stats():
             "priority_stats": {'high': 0, 'medium': 0, 'low': 0}
         })
 
+@app.route('/api/stats/timeseries')
+def get_stats_timeseries():
+    """Почасовые ряды числа статей по полосе приоритета, источнику, категории, языку или стране"""
+    try:
+        hours = min(request.args.get('hours', 48, type=int), 24 * 90)
+        group_by = request.args.get('group', 'band')
+        metric = request.args.get('metric', 'articles')
+        filters = {dimension: request.args.get(dimension) for dimension in ('source_name', 'category', 'language',
+                                                                           'country', 'band')}
+        
+        series = get_stats_rollup().series(hours=hours, group_by=group_by, metric=metric, filters=filters)
+        
+        return jsonify({"status": "success", "hours": hours, "group": group_by, "metric": metric, "series": series})
+        
+    except Exception as e:
+        logger.error(f"Ошибка получения рядов статистики: {e}")
+        return jsonify({"status": "error", "message": f"Ошибка: {str(e)}", "series": []}), 500
+
+@app.route('/api/stats/breakdown')
+def get_stats_breakdown():
+    """Итоги за период в разрезах: источники, категории, языки, страны, полосы приоритета"""
+    try:
+        hours = request.args.get('hours', 24, type=int)
+        summary = get_stats_rollup().summary(hours=hours if hours > 0 else None)
+        
+        return jsonify(dict(summary, status="success", hours=hours))
+        
+    except Exception as e:
+        logger.error(f"Ошибка получения статистики: {e}")
+        return jsonify({"status": "error", "message": f"Ошибка: {str(e)}"}), 500
+
 @app.route('/api/collect-now', methods=['POST'])
 def collect_now():
-    """Запуск сбора новостей"""
+    """Запуск сбора новостей (повторные нажатия присоединяются к идущему прогону)"""
     try:
-        def collect_background():
-            try:
-                from data_collector import AdvancedFinanceNewsCollector
-                collector = AdvancedFinanceNewsCollector()
-                articles = asyncio.run(collector.collect_news_async(hours_back=24))
-                logger.info(f"✅ Собрано {len(articles)} статей")
-            except Exception as e:
-                logger.error(f"❌ Ошибка сбора: {e}")
-        
-        thread = threading.Thread(target=collect_background)
-        thread.daemon = True
-        thread.start()
+        from collection_coordinator import get_collection_coordinator
+        
+        result = get_collection_coordinator().trigger(force=request.args.get('force') == '1')
+        messages = {
+            'started': "Сбор новостей запущен! Новости появятся через 1-2 минуты.",
+            'running': "Сбор новостей уже идет, новости появятся через 1-2 минуты.",
+            'queued': "Сбор передан воркеру-лидеру, новости появятся через 1-2 минуты.",
+            'throttled': f"Сбор был недавно, следующий возможен через {result.get('retry_after', 0)} с."
+        }
         
         return jsonify({
             "status": "success",
-            "message": "Сбор новостей запущен! Новости появятся через 1-2 минуты."
+            "collection": result['status'],
+            "message": messages[result['status']],
+            "run": result.get('run'),
+            "retry_after": result.get('retry_after')
         })
         
     except Exception as e:
@@ -678,6 +1028,35 @@ def collect_now():
             "message": f"Ошибка: {str(e)}"
         })
 
+@app.route('/api/collect-status')
+def collect_status():
+    """Ход текущего (или последнего) прогона сбора по источникам"""
+    try:
+        from collection_coordinator import get_collection_coordinator
+        return jsonify(dict(get_collection_coordinator().status(), status="success"))
+    except Exception as e:
+        logger.error(f"Ошибка получения статуса сбора: {e}")
+        return jsonify({"status": "error", "message": f"Ошибка: {str(e)}"}), 500
+
+@app.route('/api/collect-telemetry')
+def collect_telemetry():
+    """Телеметрия сбора по источникам за окно (?hours=24): фазы загрузки, ошибки, статьи"""
+    try:
+        from collection_telemetry import get_collection_telemetry
+        hours = int(request.args.get('hours', 24))
+        return jsonify(dict(get_collection_telemetry().summary(hours=hours), status="success"))
+    except Exception as e:
+        logger.error(f"Ошибка получения телеметрии сбора: {e}")
+        return jsonify({"status": "error", "message": f"Ошибка: {str(e)}"}), 500
+
+@app.route('/metrics')
+def metrics():
+    """Метрики сбора в текстовом формате Prometheus"""
+    from collection_coordinator import get_collection_coordinator
+    from collection_telemetry import get_collection_telemetry
+    body = get_collection_telemetry().prometheus(breakers=get_collection_coordinator().health.get_states())
+    return Response(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/news/<news_id>')
 def news_detail(news_id):
     """Детальная страница новости"""
@@ -687,7 +1066,7 @@ def news_detail(news_id):
         cursor = conn.cursor()
         
         cursor.execute('''
-            SELECT id, source_name, title, url, content, published_at
+            SELECT id, source_name, title, url, content, published_at, duplicate_of
             FROM raw_articles WHERE id LIKE ? || '%'
         ''', (news_id,))
         
@@ -703,7 +1082,8 @@ def news_detail(news_id):
             'title': result[2],
             'url': result[3],
             'content': result[4] or '',
-            'published_at': result[5]
+            'published_at': datetime.fromisoformat(result[5]) if result[5] else datetime.now(),
+            'duplicate_of': result[6]
         }
         
         # Улучш АИшкой
@@ -720,8 +1100,9 @@ def news_detail(news_id):
                 return render_template('error.html', message="Ошибка обработки новости"), 500
         
         # Используем сохраненный черновик если есть
-        if news_id in news_drafts:
-            news_item['draft'] = news_drafts[news_id]
+        saved_draft = get_shared_state().get_draft(news_id)
+        if saved_draft:
+            news_item['draft'] = saved_draft
             
         return render_template('news_detail.html', news=news_item)
         
@@ -729,12 +1110,183 @@ def news_detail(news_id):
         logger.error(f"Ошибка при загрузке деталей новости: {e}")
         return render_template('error.html', message="Ошибка загрузки"), 500
 
+@app.route('/api/similar/<news_id>')
+def similar_news(news_id):
+    """Похожие публикации по эмбеддингам (скалярное произведение в NumPy, без вызова модели)"""
+    try:
+        limit = min(request.args.get('limit', 10, type=int), 50)
+        
+        article_id = find_article_id(news_id)
+        if not article_id:
+            return jsonify({"status": "error", "message": "Новость не найдена", "similar": []}), 404
+        
+        from embedding_store import get_embedding_store
+        store = get_embedding_store()
+        store.refresh()
+        
+        if article_id not in store:
+            return jsonify({
+                "status": "not_indexed",
+                "message": "Эмбеддинг для новости ещё не построен",
+                "similar": []
+            })
+        
+        matches = store.similar(article_id, k=limit)
+        articles = {a['id']: a for a in get_articles_by_ids([match_id for match_id, _ in matches])}
+        
+        similar = []
+        for match_id, similarity in matches:
+            article = articles.get(match_id)
+            if not article:
+                continue
+            similar.append({
+                'id': match_id[:12],
+                'headline': article['title'],
+                'source': article['source_name'],
+                'url': article['url'],
+                'published_at': article['published_at'],
+                'hotness': article['importance_score'],
+                'similarity': round(similarity, 4)
+            })
+        
+        return jsonify({
+            "status": "success",
+            "news_id": article_id[:12],
+            "similar": similar
+        })
+        
+    except Exception as e:
+        logger.error(f"Ошибка поиска похожих новостей: {e}")
+        return jsonify({"status": "error", "message": f"Ошибка: {str(e)}", "similar": []}), 500
+
+@app.route('/api/semantic-search')
+def semantic_search():
+    """Семантический поиск по архиву: запрос эмбеддится один раз, далее ANN-индекс"""
+    try:
+        query = request.args.get('q', '').strip()
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        hours = request.args.get('hours', type=int)
+        
+        if not query:
+            return jsonify({"status": "error", "message": "Пустой запрос", "news": []}), 400
+        
+        if not neural_analyzer or not neural_analyzer.models_loaded:
+            return jsonify({"status": "unavailable", "message": "Нейросети ещё загружаются", "news": []}), 503
+        
+        started = time.time()
+        vectors = neural_analyzer.embed_texts([query])
+        if vectors is None:
+            return jsonify({"status": "unavailable", "message": "Модель эмбеддингов недоступна", "news": []}), 503
+        embed_ms = (time.time() - started) * 1000
+        
+        from ann_index import get_ann_index
+        index = get_ann_index()
+        # Синхронизацию и переобучение делают сборщик и лидер, запрос только подхватывает готовый индекс
+        index.refresh()
+        
+        since = time.time() - hours * 3600 if hours else None
+        started = time.time()
+        matches = index.search(vectors[0], k=limit, since=since)
+        search_ms = (time.time() - started) * 1000
+        
+        articles = {a['id']: a for a in get_articles_by_ids([match_id for match_id, _ in matches])}
+        results = []
+        for match_id, similarity in matches:
+            article = articles.get(match_id)
+            if not article:
+                continue
+            results.append({
+                'id': match_id[:12],
+                'headline': article['title'],
+                'source': article['source_name'],
+                'url': article['url'],
+                'published_at': article['published_at'],
+                'hotness': article['importance_score'],
+                'similarity': round(similarity, 4)
+            })
+        
+        return jsonify({
+            "status": "success",
+            "query": query,
+            "news": results,
+            "timing_ms": {"embed": round(embed_ms, 1), "search": round(search_ms, 1)}
+        })
+        
+    except Exception as e:
+        logger.error(f"Ошибка семантического поиска: {e}")
+        return jsonify({"status": "error", "message": f"Ошибка: {str(e)}", "news": []}), 500
+
+@app.route('/api/stories')
+def get_stories_api():
+    """Сюжеты за период, отсортированные по скорости распространения (источников в час)"""
+    try:
+        hours = request.args.get('hours', 24, type=int)
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        
+        from story_clusterer import get_stories
+        
+        conn = sqlite3.connect('data/news.db')
+        cursor = conn.cursor()
+        since_time = datetime.now() - timedelta(hours=hours)
+        cursor.execute('''
+            SELECT story_id FROM stories
+            WHERE last_seen >= ? AND source_count > 1
+        ''', (since_time.isoformat(),))
+        story_ids = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        
+        stories = sorted(get_stories(story_ids).values(), key=lambda s: s['velocity'], reverse=True)[:limit]
+        
+        leads = {a['id']: a for a in get_articles_by_ids([s['lead_article_id'] for s in stories])}
+        for story in stories:
+            lead = leads.get(story['lead_article_id'])
+            story['headline'] = lead['title'] if lead else ''
+            story['story_id'] = story['story_id'][:12]
+        
+        return jsonify({"status": "success", "stories": stories})
+        
+    except sqlite3.OperationalError:
+        return jsonify({"status": "success", "stories": []})
+    except Exception as e:
+        logger.error(f"Ошибка получения сюжетов: {e}")
+        return jsonify({"status": "error", "message": f"Ошибка: {str(e)}", "stories": []}), 500
+
+@app.route('/api/entities/suggest')
+def suggest_entities():
+    """Подсказки сущностей по началу имени (для фильтра entity= в /api/news)"""
+    try:
+        query = request.args.get('q', '')
+        limit = min(request.args.get('limit', 10, type=int), 50)
+        
+        return jsonify({"status": "success", "query": query, "entities": get_entity_index().suggest(query, limit)})
+        
+    except Exception as e:
+        logger.error(f"Ошибка подсказки сущностей: {e}")
+        return jsonify({"status": "error", "message": f"Ошибка: {str(e)}", "entities": []}), 500
+
+@app.route('/api/trends')
+def get_trends_api():
+    """Частые сущности и ключевые слова окна (minute - последний час, hour - двое суток) со всплеском"""
+    try:
+        window = request.args.get('window', 'hour')
+        limit = min(request.args.get('limit', 20, type=int), 200)
+        sort_by = request.args.get('sort', 'burst')
+        
+        from trend_detector import get_trend_detector
+        trends = get_trend_detector().trends(level=window, limit=limit, sort=sort_by)
+        
+        return jsonify({"status": "success", "window": window, "sort": sort_by, "trends": trends})
+        
+    except Exception as e:
+        logger.error(f"Ошибка получения трендов: {e}")
+        return jsonify({"status": "error", "message": f"Ошибка: {str(e)}", "trends": []}), 500
+
 @app.route('/api/save-draft/<news_id>', methods=['POST'])
 def save_draft(news_id):
     """Сохранение черновика"""
     try:
         draft_data = request.json
-        news_drafts[news_id] = draft_data
+        get_shared_state().save_draft(news_id, draft_data)
         
         return jsonify({
             "status": "success",
@@ -750,8 +1302,9 @@ def save_draft(news_id):
 @app.route('/api/get-draft/<news_id>')
 def get_draft(news_id):
     """Получение черновика"""
-    if news_id in news_drafts:
-        return jsonify(news_drafts[news_id])
+    saved_draft = get_shared_state().get_draft(news_id)
+    if saved_draft:
+        return jsonify(saved_draft)
     else:
         return jsonify({
             "title": "",
@@ -765,10 +1318,13 @@ def system_status():
     """Статус системы"""
     return jsonify({
         "database_ready": os.path.exists('data/news.db'),
-        "articles_count": len(get_real_news_from_db(24, 10)),
-        "neural_ready": neural_analyzer is not None and getattr(neural_analyzer, 'models_loaded', False),
-        "initial_collection": initial_collection_done,
+        "articles_count": get_stats_rollup().count(hours=24),
+        "neural_ready": is_neural_ready(),
+        "initial_collection": bool(get_shared_state().get('last_collection')),
         "collector_ready": components_ready,
+        "worker": leader_election.worker_id if leader_election else None,
+        "leader": get_shared_state().lease_owner('leader'),
+        "workers": len(leader_election.workers()) if leader_election else 1,
         "status": "operational"
     })
 
@@ -776,13 +1332,24 @@ def system_status():
 def neural_status():
     """Статус нейросетей"""
     if not neural_analyzer:
-        return jsonify({"neural_models_loaded": False})
+        # Модели у воркера-лидера: отдаем то, что видно через общую базу
+        jobs = get_job_store().get_stats()
+        return jsonify({
+            "neural_models_loaded": is_neural_ready(),
+            "leader": get_shared_state().lease_owner('leader'),
+            "jobs": jobs,
+            "queue_size": jobs['pending']
+        })
+    
+    from near_duplicates import get_duplicate_detector
     
     status = neural_analyzer.get_models_status()
-    status['queue_size'] = news_processing_queue.qsize()
-    status['processing_results'] = len(processing_results)
+    status['near_duplicates'] = get_duplicate_detector().get_stats()
+    status['jobs'] = get_job_store().get_stats()
+    status['queue_size'] = status['jobs']['pending']
     return jsonify(status)
 
 if __name__ == '__main__':
     startup_sequence()
-    app.run(debug=True, port=5000, host='0.0.0.0', threaded=True)
\ No newline at end of file
+    # Без перезагрузчика: иначе модели и фоновые задачи поднимаются в двух процессах
+    app.run(debug=True, use_reloader=False, port=5000, host='0.0.0.0', threaded=True)
\ No newline at end of file
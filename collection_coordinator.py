@@ -0,0 +1,368 @@
+import asyncio
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from job_store import default_worker_id
+from shared_state import get_shared_state
+from source_health import SourceHealth
+from source_scheduler import SourceScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class CollectionCoordinator:
+    """Единственный владелец прогонов сбора новостей в процессе.
+
+    Держит один постоянный event loop (в своем потоке) и один экземпляр
+    сборщика. Повторный запуск во время прогона не стартует новый, а
+    присоединяется к текущему; между прогонами выдерживается min_interval
+    секунд. Между процессами веб-воркеров прогоны разводятся арендой
+    collection в общей базе, а ход прогона публикуется в app_state, чтобы
+    /api/collect-status отвечал одинаково в любом воркере. Итоги прогонов
+    (длительность, статьи, ошибки по источникам) пишутся в collection_runs.
+    Прогон с due_only опрашивает только источники, которым подошел срок по
+    адаптивному расписанию (source_scheduler.py). Если задан can_run и он
+    ложен (веб-воркер не лидер), прогон не идет в этом процессе: запрос
+    кладется в app_state (collection_request) и его выполняет лидер.
+    """
+
+    def __init__(self, db_path="data/news.db", min_interval=None, hours_back=24, lease_ttl=900):
+        if min_interval is None:
+            min_interval = float(os.environ.get('RADAR_COLLECT_MIN_INTERVAL', 300))
+
+        self.db_path = db_path
+        self.min_interval = min_interval
+        self.hours_back = hours_back
+        self.lease_ttl = lease_ttl
+        self.owner = default_worker_id()
+
+        self.state = get_shared_state(db_path)
+        self.scheduler = SourceScheduler(db_path)
+        self.health = SourceHealth(db_path)
+        self.collector = None
+        self.can_run = None  # None - прогоны в этом процессе; иначе callable -> bool
+        self.loop = None
+        self.current = None
+        self.last_run = None
+        self.runs = 0
+        self.coalesced = 0
+
+        self._lock = threading.Lock()
+        self._loop_ready = threading.Event()
+        self._run_finished = threading.Event()
+        self._run_finished.set()
+        self._thread = None
+        self._last_publish = 0
+
+        self._setup_database()
+
+    def _setup_database(self):
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS collection_runs (
+                    run_id TEXT PRIMARY KEY,
+                    trigger TEXT,
+                    worker TEXT,
+                    started_at TIMESTAMP,
+                    finished_at TIMESTAMP,
+                    duration REAL,
+                    status TEXT,
+                    fetched INTEGER,
+                    saved INTEGER,
+                    failed_sources INTEGER,
+                    error TEXT,
+                    sources TEXT
+                )
+            ''')
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания таблицы истории сбора: {e}")
+
+    # --- Постоянный event loop ---
+
+    def _ensure_loop(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._loop_ready.clear()
+        self._thread = threading.Thread(target=self._run_loop, name='collection-loop', daemon=True)
+        self._thread.start()
+        self._loop_ready.wait()
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._loop_ready.set()
+        self.loop.run_forever()
+
+    def _get_collector(self):
+        if self.collector is None:
+            from data_collector import AdvancedFinanceNewsCollector
+            self.collector = AdvancedFinanceNewsCollector(db_path=self.db_path)
+            self.collector.progress_callback = self._on_progress
+        return self.collector
+
+    # --- Запуск ---
+
+    def trigger(self, force=False, hours_back=None, origin='web', due_only=False):
+        """Запрос прогона: started | running (присоединен к текущему) | throttled | queued (передан лидеру)"""
+        with self._lock:
+            if self.current:
+                self.coalesced += 1
+                return {'status': 'running', 'run': self._snapshot(self.current)}
+
+            remaining = self._throttle_remaining()
+            if remaining > 0 and not force:
+                return {'status': 'throttled', 'retry_after': round(remaining)}
+
+            if self.can_run is not None and not self.can_run():
+                if self.state.lease_owner('collection'):
+                    return {'status': 'running', 'run': self.state.get('collection_run')}
+                # Эмбеддинги и сюжеты строятся моделями лидера - прогон запускает он
+                self.state.set('collection_request', {
+                    'force': force, 'hours_back': hours_back, 'origin': origin, 'due_only': due_only
+                })
+                return {'status': 'queued', 'run': self.state.get('collection_run')}
+
+            if not self.state.acquire_lease('collection', self.owner, self.lease_ttl):
+                # Прогон идет в другом воркере - его ход виден через общую базу
+                return {'status': 'running', 'run': self.state.get('collection_run')}
+
+            self.current = {
+                'run_id': f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{os.getpid()}",
+                'trigger': origin,
+                'due_only': due_only,
+                'state': 'running',
+                'stage': 'starting',
+                'started_at': datetime.now().isoformat(),
+                'finished_at': None,
+                'worker': self.owner,
+                'sources': {},
+                'fetched': 0,
+                'saved': 0,
+                'error': None
+            }
+            self.runs += 1
+            self._run_finished.clear()
+            run = self._snapshot(self.current)
+
+        self._publish(force=True)
+        self._ensure_loop()
+        asyncio.run_coroutine_threadsafe(self._sweep(hours_back or self.hours_back, due_only, run['run_id']), self.loop)
+        return {'status': 'started', 'run': run}
+
+    def _throttle_remaining(self):
+        last = self.state.get('last_collection') or {}
+        finished_at = last.get('finished_at')
+        if not finished_at:
+            return 0
+        elapsed = (datetime.now() - datetime.fromisoformat(finished_at)).total_seconds()
+        return max(self.min_interval - elapsed, 0)
+
+    def wait(self, timeout=None):
+        """Ожидание конца прогона этого процесса; True - прогона нет или он завершился"""
+        return self._run_finished.wait(timeout)
+
+    def next_due_in(self):
+        """Секунд до ближайшего опроса по расписанию источников"""
+        return self.scheduler.next_due_in(self._get_collector().get_sources())
+
+    async def _sweep(self, hours_back, due_only=False, run_id=None):
+        error = None
+        articles = []
+        try:
+            collector = self._get_collector()
+            await collector.start_session()  # пул соединений живет между прогонами
+            articles = await collector.collect_news_async(hours_back=hours_back, due_only=due_only, run_id=run_id)
+        except Exception as e:
+            logger.error(f"❌ Ошибка прогона сбора: {e}")
+            error = str(e)
+
+        with self._lock:
+            run = self.current
+            run['state'] = 'failed' if error else 'finished'
+            run['stage'] = 'done'
+            run['error'] = error
+            run['finished_at'] = datetime.now().isoformat()
+            run['fetched'] = run['fetched'] or len(articles)
+            self.last_run = run
+            self.current = None
+
+        self.state.set('last_collection', {
+            'finished_at': run['finished_at'],
+            'articles': len(articles),
+            'saved': run['saved'],
+            'run_id': run['run_id']
+        })
+        self._publish(force=True, run=run)
+        self._save_history(run)
+        self.state.release_lease('collection', self.owner)
+        self._run_finished.set()
+        logger.info(f"✅ Прогон сбора {run['run_id']} завершен: {run['fetched']} статей, сохранено {run['saved']}")
+
+    def shutdown(self, timeout=30):
+        """Закрывает пул соединений и останавливает event loop"""
+        if not (self._thread and self._thread.is_alive()):
+            return
+        if self.collector:
+            future = asyncio.run_coroutine_threadsafe(self.collector.close_session(), self.loop)
+            try:
+                future.result(timeout)
+            except Exception as e:
+                logger.warning(f"⚠️ Ошибка закрытия HTTP-сессии: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+
+    # --- История ---
+
+    def _save_history(self, run):
+        try:
+            started = datetime.fromisoformat(run['started_at'])
+            finished = datetime.fromisoformat(run['finished_at'])
+            sources = self._snapshot(run)['sources']
+
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO collection_runs
+                (run_id, trigger, worker, started_at, finished_at, duration, status, fetched, saved,
+                 failed_sources, error, sources)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                run['run_id'], run.get('trigger'), run['worker'], run['started_at'], run['finished_at'],
+                round((finished - started).total_seconds(), 2), run['state'], run['fetched'], run['saved'],
+                sum(1 for source in sources.values() if source.get('state') == 'failed'),
+                run['error'], json.dumps(sources, ensure_ascii=False)
+            ))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи истории сбора: {e}")
+
+    def get_history(self, limit=10):
+        """Последние прогоны (без детализации по источникам)"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT run_id, trigger, started_at, duration, status, fetched, saved, failed_sources, error
+                FROM collection_runs ORDER BY started_at DESC LIMIT ?
+            ''', (limit,))
+            columns = [column[0] for column in cursor.description]
+            history = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            conn.close()
+            return history
+        except Exception as e:
+            logger.error(f"❌ Ошибка чтения истории сбора: {e}")
+            return []
+
+    # --- Ход прогона ---
+
+    def _on_progress(self, event, data):
+        with self._lock:
+            run = self.current
+            if run is None:
+                return
+            sources = run['sources']
+            now = time.time()
+
+            if event == 'sources':
+                for source in data['sources']:
+                    sources[source['name']] = {'type': source['type'], 'state': 'pending', 'articles': 0}
+            elif event == 'stage':
+                run['stage'] = data['stage']
+            elif event == 'source_skipped':
+                sources.setdefault(data['name'], {'articles': 0})['state'] = 'skipped'
+            elif event == 'source_started':
+                sources.setdefault(data['name'], {'articles': 0}).update(state='running', started=now)
+            elif event in ('source_done', 'source_failed'):
+                source = sources.setdefault(data['name'], {'articles': 0})
+                source['state'] = 'done' if event == 'source_done' else 'failed'
+                source['articles'] = data.get('articles', 0)
+                if data.get('error'):
+                    source['error'] = data['error']
+                if 'started' in source:
+                    source['seconds'] = round(now - source.pop('started'), 2)
+            elif event == 'finished':
+                run['fetched'] = data['fetched']
+                run['saved'] = data['saved']
+
+        self._publish()
+
+    def _snapshot(self, run):
+        snapshot = copy.deepcopy(run)
+        sources = snapshot['sources'].values()
+        snapshot['progress'] = {
+            'total': len(snapshot['sources']),
+            'done': sum(1 for s in sources if s.get('state') == 'done'),
+            'failed': sum(1 for s in sources if s.get('state') == 'failed'),
+            'running': sum(1 for s in sources if s.get('state') == 'running'),
+            'skipped': sum(1 for s in sources if s.get('state') == 'skipped')
+        }
+        for source in sources:
+            source.pop('started', None)
+        return snapshot
+
+    def _publish(self, force=False, run=None):
+        """Снимок прогона в общую базу (не чаще раза в секунду) + продление аренды"""
+        now = time.time()
+        if not force and now - self._last_publish < 1:
+            return
+        self._last_publish = now
+
+        with self._lock:
+            run = run or self.current
+            if run is None:
+                return
+            snapshot = self._snapshot(run)
+
+        try:
+            self.state.set('collection_run', snapshot)
+            if snapshot['state'] == 'running':
+                self.state.acquire_lease('collection', self.owner, self.lease_ttl)
+        except Exception as e:
+            logger.error(f"❌ Ошибка публикации хода сбора: {e}")
+
+    def status(self):
+        """Состояние сбора для API: текущий или последний прогон и когда можно следующий"""
+        with self._lock:
+            run = self._snapshot(self.current) if self.current else None
+        if run is None:
+            run = self.state.get('collection_run')
+            if run and run.get('state') == 'running' and not self.state.lease_owner('collection'):
+                # Процесс, который вел прогон, умер, не завершив его
+                run['state'] = 'abandoned'
+
+        remaining = self._throttle_remaining()
+        return {
+            'running': bool(run and run.get('state') == 'running'),
+            'run': run,
+            'min_interval': self.min_interval,
+            'next_allowed_in': round(remaining),
+            'runs': self.runs,
+            'coalesced_triggers': self.coalesced,
+            'history': self.get_history(),
+            'schedule': self.scheduler.get_schedule(),
+            'breakers': self.health.get_states()
+        }
+
+
+_coordinator = None
+_coordinator_lock = threading.Lock()
+
+
+def get_collection_coordinator(db_path="data/news.db"):
+    """Общий для процесса координатор сбора"""
+    global _coordinator
+    with _coordinator_lock:
+        if _coordinator is None:
+            _coordinator = CollectionCoordinator(db_path)
+        return _coordinator
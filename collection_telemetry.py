@@ -0,0 +1,257 @@
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import aiohttp
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Поля строки телеметрии: один опрос одного источника в одном прогоне
+TELEMETRY_FIELDS = (
+    'run_id', 'source_name', 'source_type', 'fetched_at', 'status', 'http_status', 'attempts',
+    'dns_ms', 'connect_ms', 'ttfb_ms', 'download_ms', 'bytes', 'parse_ms',
+    'elements', 'extracted', 'new', 'duplicates', 'error'
+)
+
+# Фазы загрузки для /metrics: поле -> значение метки phase
+PHASES = {'dns_ms': 'dns', 'connect_ms': 'connect', 'ttfb_ms': 'ttfb', 'download_ms': 'download', 'parse_ms': 'parse'}
+
+
+def create_trace_config():
+    """TraceConfig aiohttp: тайминги DNS, соединения и первого байта в trace_request_ctx.
+
+    В trace_request_ctx передается словарь, в него пишутся отметки времени
+    (time.perf_counter) начала запроса, DNS, установки соединения и
+    получения заголовков ответа.
+    """
+    def marker(name):
+        async def on_event(session, context, params):
+            timings = context.trace_request_ctx
+            if isinstance(timings, dict):
+                timings.setdefault(name, time.perf_counter())
+        return on_event
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(marker('request_start'))
+    trace.on_dns_resolvehost_start.append(marker('dns_start'))
+    trace.on_dns_resolvehost_end.append(marker('dns_end'))
+    trace.on_connection_create_start.append(marker('connect_start'))
+    trace.on_connection_create_end.append(marker('connect_end'))
+    trace.on_request_end.append(marker('headers'))
+    return trace
+
+
+def timings_to_ms(timings, finished=None):
+    """Отметки trace_request_ctx -> длительности фаз, мс (None, если фазы не было)"""
+    def span(start, end):
+        if start in timings and end in timings:
+            return round((timings[end] - timings[start]) * 1000, 1)
+        return None
+
+    result = {
+        'dns_ms': span('dns_start', 'dns_end'),
+        'connect_ms': span('connect_start', 'connect_end'),
+        'ttfb_ms': span('request_start', 'headers'),
+        'download_ms': None
+    }
+    if finished is not None and 'headers' in timings:
+        result['download_ms'] = round((finished - timings['headers']) * 1000, 1)
+    return result
+
+
+class CollectionTelemetry:
+    """Телеметрия сбора по источникам: таблица collection_telemetry.
+
+    Строка на каждый опрос источника в прогоне: статус и HTTP-код, фазы
+    загрузки (DNS, соединение, первый байт, тело), объем, время разбора,
+    совпавшие селекторы элементы, извлеченные, новые и дублирующиеся статьи,
+    ошибка. Поверх таблицы - JSON-сводка по источникам и текст для Prometheus.
+    """
+
+    def __init__(self, db_path="data/news.db", retention_days=14):
+        self.db_path = db_path
+        self.retention_days = retention_days
+        self._setup_database()
+
+    def _setup_database(self):
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS collection_telemetry (
+                    run_id TEXT,
+                    source_name TEXT,
+                    source_type TEXT,
+                    fetched_at TIMESTAMP,
+                    status TEXT,
+                    http_status INTEGER,
+                    attempts INTEGER,
+                    dns_ms REAL,
+                    connect_ms REAL,
+                    ttfb_ms REAL,
+                    download_ms REAL,
+                    bytes INTEGER,
+                    parse_ms REAL,
+                    elements INTEGER,
+                    extracted INTEGER,
+                    new INTEGER,
+                    duplicates INTEGER,
+                    error TEXT,
+                    PRIMARY KEY (run_id, source_name)
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_telemetry_source_time
+                ON collection_telemetry(source_name, fetched_at)
+            ''')
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания таблицы телеметрии сбора: {e}")
+
+    def record(self, run_id, rows):
+        """Запись телеметрии прогона и удаление строк старше retention_days"""
+        if not rows:
+            return 0
+        values = [tuple(dict(row, run_id=run_id).get(field) for field in TELEMETRY_FIELDS) for row in rows]
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat()
+
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.executemany(f'''
+                INSERT OR REPLACE INTO collection_telemetry ({', '.join(TELEMETRY_FIELDS)})
+                VALUES ({', '.join('?' * len(TELEMETRY_FIELDS))})
+            ''', values)
+            conn.execute("DELETE FROM collection_telemetry WHERE fetched_at < ?", (cutoff,))
+            conn.commit()
+        finally:
+            conn.close()
+        return len(values)
+
+    def _rows(self, hours):
+        since = (datetime.now() - timedelta(hours=hours)).isoformat()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT {', '.join(TELEMETRY_FIELDS)} FROM collection_telemetry
+                WHERE fetched_at >= ? ORDER BY fetched_at
+            ''', (since,))
+            return [dict(zip(TELEMETRY_FIELDS, row)) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def summary(self, hours=24):
+        """Сводка по источникам за окно: доля ошибок, p50/p95 фаз, статьи, последний опрос"""
+        try:
+            rows = self._rows(hours)
+        except Exception as e:
+            logger.error(f"❌ Ошибка чтения телеметрии сбора: {e}")
+            return {}
+
+        by_source = {}
+        for row in rows:
+            by_source.setdefault(row['source_name'], []).append(row)
+
+        sources = {}
+        for name, source_rows in by_source.items():
+            fetched = [row for row in source_rows if row['status'] != 'skipped']
+            errors = [row for row in fetched if row['status'] == 'error']
+            last = source_rows[-1]
+
+            phases = {}
+            for field in ('ttfb_ms', 'download_ms', 'parse_ms'):
+                values = np.array([row[field] for row in fetched if row[field] is not None])
+                if len(values):
+                    phases[field] = {'p50': round(float(np.percentile(values, 50)), 1),
+                                     'p95': round(float(np.percentile(values, 95)), 1)}
+
+            sources[name] = {
+                'type': last['source_type'],
+                'fetches': len(fetched),
+                'skipped': len(source_rows) - len(fetched),
+                'errors': len(errors),
+                'error_rate': round(len(errors) / len(fetched), 3) if fetched else None,
+                'bytes_avg': round(float(np.mean([row['bytes'] or 0 for row in fetched]))) if fetched else 0,
+                'elements_avg': round(float(np.mean([row['elements'] or 0 for row in fetched])), 1) if fetched else 0,
+                'extracted': sum(row['extracted'] or 0 for row in source_rows),
+                'new': sum(row['new'] or 0 for row in source_rows),
+                'duplicates': sum(row['duplicates'] or 0 for row in source_rows),
+                'phases_ms': phases,
+                'last_status': last['status'],
+                'last_http_status': last['http_status'],
+                'last_error': errors[-1]['error'] if errors else None,
+                'last_fetched_at': last['fetched_at']
+            }
+
+        return {
+            'window_hours': hours,
+            'runs': len({row['run_id'] for row in rows}),
+            'fetches': sum(source['fetches'] for source in sources.values()),
+            'errors': sum(source['errors'] for source in sources.values()),
+            'sources': sources
+        }
+
+    def prometheus(self, hours=24, breakers=None):
+        """Метрики в текстовом формате Prometheus (последний опрос + счетчики за окно)"""
+        rows = self._rows(hours)
+        last = {}
+        counts = {}
+        for row in rows:
+            last[row['source_name']] = row
+            key = (row['source_name'], row['status'])
+            counts[key] = counts.get(key, 0) + 1
+
+        def label(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+        lines = []
+
+        def metric(name, help_text, samples, kind='gauge'):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                rendered = ','.join(f'{key}="{label(val)}"' for key, val in labels.items())
+                lines.append(f'{name}{{{rendered}}} {value}')
+
+        metric('radar_source_fetches', f'Опросы источника за {hours}ч по статусу',
+               [({'source': source, 'status': status}, count) for (source, status), count in sorted(counts.items())])
+        metric('radar_source_phase_seconds', 'Фазы последнего опроса источника, с',
+               [({'source': source, 'phase': phase}, round(row[field] / 1000, 4))
+                for source, row in sorted(last.items())
+                for field, phase in PHASES.items() if row[field] is not None])
+        metric('radar_source_response_bytes', 'Размер последнего ответа источника, байт',
+               [({'source': source}, row['bytes'] or 0) for source, row in sorted(last.items())
+                if row['status'] != 'skipped'])
+        metric('radar_source_http_status', 'HTTP-код последнего опроса источника',
+               [({'source': source}, row['http_status']) for source, row in sorted(last.items())
+                if row['http_status'] is not None])
+        metric('radar_source_articles', 'Статьи последнего опроса источника',
+               [({'source': source, 'kind': kind}, row[field] or 0)
+                for source, row in sorted(last.items()) if row['status'] != 'skipped'
+                for field, kind in (('elements', 'elements'), ('extracted', 'extracted'),
+                                    ('new', 'new'), ('duplicates', 'duplicate'))])
+        metric('radar_source_last_fetch_timestamp_seconds', 'Время последнего опроса источника',
+               [({'source': source}, round(datetime.fromisoformat(row['fetched_at']).timestamp()))
+                for source, row in sorted(last.items())])
+        if breakers is not None:
+            metric('radar_source_breaker_open', 'Предохранитель источника разомкнут (1) или на пробе (0.5)',
+                   [({'source': source}, {'open': 1, 'half_open': 0.5}.get(state['state'], 0))
+                    for source, state in sorted(breakers.items())])
+
+        return '\n'.join(lines) + '\n'
+
+
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+
+def get_collection_telemetry(db_path="data/news.db"):
+    global _telemetry
+    with _telemetry_lock:
+        if _telemetry is None:
+            _telemetry = CollectionTelemetry(db_path)
+        return _telemetry
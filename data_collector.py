@@ -14,6 +14,18 @@ import asyncio
 import aiohttp
 from urllib.parse import urljoin
 import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+
+from collection_telemetry import CollectionTelemetry, create_trace_config, timings_to_ms
+from entity_index import EntityIndex, extract_entities
+from hotness_engine import HotnessEngine, HotnessIndex
+from page_archive import PageArchive
+from source_health import SourceHealth, RETRYABLE_STATUSES, retry_delay
+from source_scheduler import SourceScheduler
+from stats_rollup import StatsRollup
+from trend_detector import TrendDetector
 
 # Отключение предупреждений SSL
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -22,13 +34,30 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class AdvancedFinanceNewsCollector:
-    def __init__(self, config_path="config/sources.json", db_path="data/news.db"):
+    def __init__(self, config_path="config/sources.json", db_path="data/news.db", embed_articles=True,
+                 archive_pages=None):
         self.config_path = config_path
         self.db_path = db_path
+        self.embed_articles = embed_articles
+        if archive_pages is None:
+            archive_pages = os.environ.get('RADAR_ARCHIVE_PAGES', '0') == '1'
         self.sources_config = self._load_config()
         self.session = None
+        self.progress_callback = None  # progress_callback(event, data) - ход прогона для координатора
+        self.fetch_outcomes = {}  # имя источника -> статьи или текст ошибки последнего прогона
+        self.fetch_stats = {}  # имя источника -> строка телеметрии последнего прогона
         self._setup_directories()
         self._setup_database()
+        self.scheduler = SourceScheduler(db_path, self.sources_config.get('polling'))
+        self.health = SourceHealth(db_path, self.sources_config.get('fetch'))
+        self.telemetry = CollectionTelemetry(db_path)
+        self.archive = PageArchive(db_path=db_path) if archive_pages else None  # тела ответов для reparse
+        self.hotness = HotnessEngine(self.sources_config.get('hotness'))
+        self.hotness_index = HotnessIndex(db_path, self.sources_config.get('hotness'))
+        self.trends = TrendDetector(db_path, self.sources_config.get('trends'))
+        self.rollup = StatsRollup(db_path)  # почасовая сводка, ее ведут триггеры на raw_articles
+        self.entities = EntityIndex(db_path)
+        self.run_id = None
 
         # Расширенные финансовые ключевые слова на разных языках
         self.finance_keywords = [
@@ -89,6 +118,12 @@ class AdvancedFinanceNewsCollector:
                 )
             ''')
             
+            # Ссылка на оригинал для почти-дубликатов
+            cursor.execute("PRAGMA table_info(raw_articles)")
+            existing_columns = [column[1] for column in cursor.fetchall()]
+            if 'duplicate_of' not in existing_columns:
+                cursor.execute("ALTER TABLE raw_articles ADD COLUMN duplicate_of TEXT")
+            
             # Создаем индекс для быстрого поиска
             cursor.execute('''
                 CREATE INDEX IF NOT EXISTS idx_finance_published 
@@ -101,90 +136,291 @@ class AdvancedFinanceNewsCollector:
         except Exception as e:
             logger.error(f"❌ Ошибка создания базы данных: {e}")
 
+    def _report_progress(self, event, **data):
+        """Уведомление наблюдателя (координатора сбора) о ходе прогона"""
+        if self.progress_callback:
+            try:
+                self.progress_callback(event, data)
+            except Exception as e:
+                logger.debug(f"Ошибка обработчика прогресса: {e}")
+
+    def _fetch_stat(self, source, **fields):
+        """Поля строки телеметрии источника в текущем прогоне"""
+        stat = self.fetch_stats.setdefault(source['name'], {
+            'source_name': source['name'], 'source_type': source.get('type'),
+            'fetched_at': datetime.now().isoformat()
+        })
+        stat.update(fields)
+        return stat
+
+    def _source_done(self, source, articles):
+        self.fetch_outcomes[source['name']] = articles
+        self._fetch_stat(source, status='ok', extracted=len(articles))
+        self._report_progress('source_done', name=source['name'], articles=len(articles))
+
+    def _source_failed(self, source, error):
+        self.fetch_outcomes[source['name']] = error
+        self._fetch_stat(source, status='error', error=str(error)[:300])
+        self._report_progress('source_failed', name=source['name'], error=error)
+
+    def get_sources(self):
+        return self.sources_config.get("html_sources", []) + self.sources_config.get("rss_sources", [])
+
+    async def start_session(self, limit=50):
+        """Общий пул HTTP-соединений для серии прогонов (демон, координатор сбора)"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=limit, ttl_dns_cache=300, ssl=False)
+            self.session = aiohttp.ClientSession(connector=connector, trace_configs=[create_trace_config()])
+        return self.session
+
+    async def close_session(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    @asynccontextmanager
+    async def _http_session(self, headers):
+        """Постоянная сессия, если открыта, иначе - временная на один источник"""
+        if self.session and not self.session.closed:
+            yield self.session
+        else:
+            async with aiohttp.ClientSession(headers=headers, trace_configs=[create_trace_config()]) as session:
+                yield session
+
     def get_random_user_agent(self):
         """Возвращает случайный User-Agent"""
         return random.choice(self.user_agents)
 
-    async def collect_news_async(self, hours_back=48):
-        """Улучшенный сбор новостей с поддержкой международных источников"""
+    async def collect_news_async(self, hours_back=48, due_only=False, run_id=None):
+        """Улучшенный сбор новостей с поддержкой международных источников.
+
+        due_only - опрашивать только источники, которым подошел срок по
+        адаптивному расписанию (фоновый демон); иначе - все. run_id -
+        идентификатор прогона для телеметрии (по умолчанию - время запуска).
+        """
         logger.info("🚀 ЗАПУСК РАСШИРЕННОГО СБОРА ФИНАНСОВЫХ НОВОСТЕЙ")
         
         all_articles = []
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d%H%M%S')
+        sources = self.get_sources()
+        if due_only:
+            sources = self.scheduler.due_sources(sources)
+            logger.info(f"🗓️ По расписанию к опросу: {len(sources)} источников")
+        self.fetch_outcomes = {}
+        self.fetch_stats = {}
+        if not sources:
+            logger.info("✅ Ни одному источнику еще не пора, прогон пропущен")
+            self._report_progress('finished', fetched=0, saved=0)
+            return []
+        self._report_progress('sources', sources=[
+            {'name': source['name'], 'type': source.get('type')} for source in sources
+        ])
         
         # Собираем из HTML источников
         logger.info("📄 Сбор из HTML источников...")
-        html_articles = await self.parse_html_sources_async()
+        self._report_progress('stage', stage='html')
+        html_articles = await self.parse_html_sources_async(sources)
         all_articles.extend(html_articles)
         
         # Собираем из RSS источников
         logger.info("📡 Сбор из RSS источников...")
-        rss_articles = await self.parse_rss_sources_async()
+        self._report_progress('stage', stage='rss')
+        rss_articles = await self.parse_rss_sources_async(sources)
         all_articles.extend(rss_articles)
 
+        # Урожайность и здоровье источников считаются до сохранения: новые - те, которых еще нет в базе
+        await self.update_source_state_async(sources)
+
         # Обрабатываем и обогащаем статьи
         logger.info("🔧 Обработка и обогащение статей...")
+        self._report_progress('stage', stage='enrich')
         enriched_articles = await self.enrich_articles_async(all_articles)
 
+        # Помечаем перепечатки до сохранения и нейросетевой обработки
+        await self.flag_near_duplicates_async(enriched_articles)
+
         # Сохраняем в базу
+        self._report_progress('stage', stage='save')
         saved_count = await self.save_to_database_async(enriched_articles)
+        await self.record_telemetry_async(self.run_id, enriched_articles)
+        if self.archive:
+            await self.prune_archive_async()
+        
+        # Строим эмбеддинги сохраненных статей пакетами
+        if self.embed_articles:
+            self._report_progress('stage', stage='embed')
+            await self.embed_articles_async(enriched_articles)
+            assignments = await self.cluster_articles_async(enriched_articles)
+            await self.rescore_by_stories_async(enriched_articles, assignments)
+
+        # Периодический перенос опорного времени горячести (не чаще compact_interval_hours)
+        await asyncio.get_event_loop().run_in_executor(None, self.hotness_index.compact_if_due)
         
         logger.info(f"✅ СБОР ЗАВЕРШЕН. Обработано статей: {len(all_articles)}, Сохранено финансовых: {saved_count}")
+        self._report_progress('finished', fetched=len(all_articles), saved=saved_count)
         return enriched_articles
 
-    async def parse_html_sources_async(self):
+    async def update_source_state_async(self, sources):
+        """Пересчет интервалов опроса и предохранителей по итогам прогона"""
+        loop = asyncio.get_event_loop()
+        try:
+            await loop.run_in_executor(None, self.health.record_outcomes, self.fetch_outcomes)
+        except Exception as e:
+            logger.error(f"❌ Ошибка обновления состояния источников: {e}")
+
+        try:
+            updated = await loop.run_in_executor(
+                None, self.scheduler.record_fetches, sources, self.fetch_outcomes
+            )
+            for name, entry in updated.items():
+                if name in self.fetch_stats:
+                    self.fetch_stats[name]['new'] = entry.get('new_count', 0)
+            slowed = [name for name, entry in updated.items() if entry['last_status'] != 'ok']
+            if slowed:
+                logger.info(f"🐢 Опрос отложен (ошибки или нет новых статей): {len(slowed)} источников")
+        except Exception as e:
+            logger.error(f"❌ Ошибка обновления расписания источников: {e}")
+
+    async def archive_page_async(self, source, body):
+        """Тело ответа -> архив страниц (сжатие и запись вне event loop)"""
+        try:
+            await asyncio.get_event_loop().run_in_executor(
+                None, self.archive.store, source, source['url'], body, self.run_id
+            )
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи страницы {source['name']} в архив: {e}")
+
+    async def prune_archive_async(self):
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, self.archive.prune)
+        except Exception as e:
+            logger.error(f"❌ Ошибка очистки архива страниц: {e}")
+
+    async def record_telemetry_async(self, run_id, articles):
+        """Телеметрия прогона по источникам -> collection_telemetry"""
+        for article in articles:
+            if article.get('duplicate_of') and article['source_name'] in self.fetch_stats:
+                stat = self.fetch_stats[article['source_name']]
+                stat['duplicates'] = stat.get('duplicates', 0) + 1
+
+        try:
+            await asyncio.get_event_loop().run_in_executor(
+                None, self.telemetry.record, run_id, list(self.fetch_stats.values())
+            )
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи телеметрии сбора: {e}")
+
+    async def _allowed_sources(self, sources):
+        """Источники с замкнутым предохранителем (или на пробном опросе)"""
+        try:
+            allowed = await asyncio.get_event_loop().run_in_executor(
+                None, self.health.allow, [source['name'] for source in sources]
+            )
+        except Exception as e:
+            logger.error(f"❌ Ошибка чтения состояния источников: {e}")
+            return sources
+
+        for source in sources:
+            if source['name'] not in allowed:
+                logger.info(f"🔌 {source['name']}: предохранитель разомкнут, источник пропущен")
+                self._fetch_stat(source, status='skipped')
+                self._report_progress('source_skipped', name=source['name'])
+        return [source for source in sources if source['name'] in allowed]
+
+    async def _fetch(self, source, headers, semaphore, as_text=True):
+        """GET с повторами; возвращает (тело, None) или (None, ошибка).
+
+        Таймауты соединения и чтения раздельные, чтобы мертвый хост не держал
+        слот семафора весь прогон; паузы между повторами - экспоненциальные с
+        разбросом и проходят вне семафора.
+        """
+        config = self.health.config
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=config['connect_timeout'],
+                                        sock_read=config['read_timeout'])
+        attempts = config['retries'] + 1
+        error = None
+
+        for attempt in range(attempts):
+            timings = {}  # отметки TraceConfig: DNS, соединение, первый байт
+            self._fetch_stat(source, attempts=attempt + 1, http_status=None)
+            try:
+                async with semaphore:
+                    async with self._http_session(headers) as session:
+                        async with session.get(source['url'], headers=headers, timeout=timeout, ssl=False,
+                                               trace_request_ctx=timings) as response:
+                            self._fetch_stat(source, http_status=response.status)
+                            if response.status == 200:
+                                raw = await response.read()
+                                self._fetch_stat(source, bytes=len(raw),
+                                                 **timings_to_ms(timings, time.perf_counter()))
+                                if self.archive:
+                                    await self.archive_page_async(source, raw)
+                                body = await response.text() if as_text else raw
+                                return body, None
+                            error = f"HTTP {response.status}"
+                            retryable = response.status in RETRYABLE_STATUSES
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = str(e) or type(e).__name__
+                retryable = True
+            self._fetch_stat(source, **timings_to_ms(timings))
+
+            if not retryable or attempt == attempts - 1:
+                break
+            delay = retry_delay(attempt, config['retry_base_delay'], config['retry_max_delay'])
+            logger.info(f"🔁 {source['name']}: {error}, повтор через {delay:.1f}с")
+            await asyncio.sleep(delay)
+
+        return None, error
+
+    async def parse_html_sources_async(self, sources=None):
         """Асинхронный парсинг HTML источников с улучшенной обработкой"""
         articles = []
         semaphore = asyncio.Semaphore(5)  # Ограничиваем одновременные запросы
         
         async def process_source(source):
-            async with semaphore:
-                if source.get('type') != 'html':
+            if source.get('type') != 'html':
+                return []
+            
+            try:
+                logger.info(f"Парсинг HTML {source['name']}...")
+                self._report_progress('source_started', name=source['name'])
+                
+                headers = {
+                    'User-Agent': self.get_random_user_agent(),
+                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+                    'Accept-Language': 'ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3',
+                    'Accept-Encoding': 'gzip, deflate, br',
+                    'Connection': 'keep-alive',
+                    'Upgrade-Insecure-Requests': '1',
+                }
+                
+                html, error = await self._fetch(source, headers, semaphore)
+                if error:
+                    logger.warning(f"Ошибка загрузки {source['name']}: {error}")
+                    self._source_failed(source, error)
                     return []
                 
-                try:
-                    logger.info(f"Парсинг HTML {source['name']}...")
-                    
-                    headers = {
-                        'User-Agent': self.get_random_user_agent(),
-                        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                        'Accept-Language': 'ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3',
-                        'Accept-Encoding': 'gzip, deflate, br',
-                        'Connection': 'keep-alive',
-                        'Upgrade-Insecure-Requests': '1',
-                    }
+                parse_started = time.perf_counter()
+                source_articles, elements = self.extract_html_articles(source, html)
+                logger.info(f"Найдено элементов в {source['name']}: {elements}")
+                
+                self._fetch_stat(source, elements=elements,
+                                 parse_ms=round((time.perf_counter() - parse_started) * 1000, 1))
+                self._source_done(source, source_articles)
+                
+                # Задержка для избежания блокировки
+                await asyncio.sleep(1)
+                return source_articles
                     
-                    async with aiohttp.ClientSession(headers=headers) as session:
-                        async with session.get(source['url'], timeout=30, ssl=False) as response:
-                            if response.status != 200:
-                                logger.warning(f"Статус {response.status} для {source['name']}")
-                                return []
-                            
-                            html = await response.text()
-                            soup = BeautifulSoup(html, 'html.parser')
-                            selectors = source.get('selectors', {})
-                            
-                            source_articles = []
-                            article_selector = selectors.get('article', '')
-                            
-                            if article_selector:
-                                article_elements = soup.select(article_selector)
-                                logger.info(f"Найдено элементов в {source['name']}: {len(article_elements)}")
-                                
-                                for elem in article_elements[:15]:  # Ограничиваем количество
-                                    article_data = self._extract_article_data(elem, selectors, source)
-                                    if article_data:
-                                        source_articles.append(article_data)
-                            
-                            # Задержка для избежания блокировки
-                            await asyncio.sleep(1)
-                            return source_articles
-                            
-                except Exception as e:
-                    logger.error(f"Ошибка при парсинге HTML {source['name']}: {e}")
-                    return []
+            except Exception as e:
+                logger.error(f"Ошибка при парсинге HTML {source['name']}: {e}")
+                self._source_failed(source, str(e) or type(e).__name__)
+                return []
         
         # Запускаем все источники параллельно
-        tasks = [process_source(source) for source in self.sources_config.get("html_sources", [])]
+        sources = self.sources_config.get("html_sources", []) if sources is None else sources
+        sources = await self._allowed_sources([source for source in sources if source.get('type') == 'html'])
+        tasks = [process_source(source) for source in sources]
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
         # Собираем все статьи
@@ -194,49 +430,51 @@ class AdvancedFinanceNewsCollector:
         
         return articles
 
-    async def parse_rss_sources_async(self):
+    async def parse_rss_sources_async(self, sources=None):
         """Асинхронный парсинг RSS источников с поддержкой международных"""
         articles = []
         semaphore = asyncio.Semaphore(10)  # RSS запросы быстрее, можно больше
         
         async def process_source(source):
-            async with semaphore:
-                if source.get('type') != 'rss':
-                    return []
+            if source.get('type') != 'rss':
+                return []
+            
+            try:
+                logger.info(f"Парсинг RSS {source['name']}...")
+                self._report_progress('source_started', name=source['name'])
                 
-                try:
-                    logger.info(f"Парсинг RSS {source['name']}...")
-                    
-                    # Используем feedparser в отдельном потоке
-                    def parse_feed():
-                        return feedparser.parse(source['url'])
-                    
-                    feed = await asyncio.get_event_loop().run_in_executor(None, parse_feed)
-                    
-                    if hasattr(feed, 'status') and feed.status != 200:
-                        logger.warning(f"RSS статус {feed.status} для {source['name']}")
-                        return []
-                    
-                    source_articles = []
-                    entries = feed.entries[:20]  # Ограничиваем количество
-                    
-                    logger.info(f"Найдено RSS элементов в {source['name']}: {len(entries)}")
-                    
-                    for entry in entries:
-                        article_data = self._extract_rss_article_data(entry, source)
-                        if article_data:
-                            source_articles.append(article_data)
-                    
-                    # Короткая задержка
-                    await asyncio.sleep(0.5)
-                    return source_articles
-                    
-                except Exception as e:
-                    logger.error(f"Ошибка при парсинге RSS {source['name']}: {e}")
+                # Загружаем через общий пул соединений, разбираем feedparser'ом в отдельном потоке
+                headers = {'User-Agent': self.get_random_user_agent()}
+                body, error = await self._fetch(source, headers, semaphore, as_text=False)
+                if error:
+                    logger.warning(f"RSS ошибка для {source['name']}: {error}")
+                    self._source_failed(source, error)
                     return []
+                
+                parse_started = time.perf_counter()
+                source_articles, elements = await asyncio.get_event_loop().run_in_executor(
+                    None, self.extract_rss_articles, source, body
+                )
+                
+                logger.info(f"Найдено RSS элементов в {source['name']}: {elements}")
+                
+                self._fetch_stat(source, elements=elements,
+                                 parse_ms=round((time.perf_counter() - parse_started) * 1000, 1))
+                self._source_done(source, source_articles)
+                
+                # Короткая задержка
+                await asyncio.sleep(0.5)
+                return source_articles
+                
+            except Exception as e:
+                logger.error(f"Ошибка при парсинге RSS {source['name']}: {e}")
+                self._source_failed(source, str(e) or type(e).__name__)
+                return []
         
         # Запускаем все RSS источники параллельно
-        tasks = [process_source(source) for source in self.sources_config.get("rss_sources", [])]
+        sources = self.sources_config.get("rss_sources", []) if sources is None else sources
+        sources = await self._allowed_sources([source for source in sources if source.get('type') == 'rss'])
+        tasks = [process_source(source) for source in sources]
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
         # Собираем все статьи
@@ -246,6 +484,79 @@ class AdvancedFinanceNewsCollector:
         
         return articles
 
+    def extract_html_articles(self, source, html):
+        """Статьи со страницы HTML источника: (статьи, число элементов по селектору)"""
+        soup = BeautifulSoup(html, 'html.parser')
+        selectors = source.get('selectors', {})
+        article_selector = selectors.get('article', '')
+        if not article_selector:
+            return [], 0
+        
+        article_elements = soup.select(article_selector)
+        articles = []
+        for elem in article_elements[:15]:  # Ограничиваем количество
+            article_data = self._extract_article_data(elem, selectors, source)
+            if article_data:
+                articles.append(article_data)
+        return articles, len(article_elements)
+
+    def extract_rss_articles(self, source, body):
+        """Статьи из RSS ленты: (статьи, число записей в ленте)"""
+        feed = feedparser.parse(body)
+        articles = []
+        for entry in feed.entries[:20]:  # Ограничиваем количество
+            article_data = self._extract_rss_article_data(entry, source)
+            if article_data:
+                articles.append(article_data)
+        return articles, len(feed.entries)
+
+    async def reparse_archive_async(self, source_names=None, since=None, until=None, latest_only=False,
+                                    workers=None, save=False):
+        """Повторный разбор архивных страниц текущими селекторами, без сети.
+
+        Страницы разбираются параллельно в пуле процессов; статьи получают
+        collected_at = время загрузки страницы. save=False - только отчет
+        (подбор селекторов), save=True - обогащение, дубликаты и сохранение в
+        базу как при обычном сборе (досборка).
+        """
+        archive = self.archive or PageArchive(db_path=self.db_path)
+        sources = {source['name']: source for source in self.get_sources()}
+        pages = [page for page in archive.pages(source_names, since, until, latest_only)
+                 if page['source_name'] in sources]
+        logger.info(f"🗄️ Повторный разбор: {len(pages)} архивных страниц")
+
+        report = {}
+        articles = {}
+        loop = asyncio.get_event_loop()
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_reparse_worker,
+                                 initargs=(self.config_path, self.db_path, archive.root)) as pool:
+            results = await asyncio.gather(*(
+                loop.run_in_executor(pool, _reparse_page, sources[page['source_name']], page)
+                for page in pages
+            ), return_exceptions=True)
+
+        for page, result in zip(pages, results):
+            source_report = report.setdefault(page['source_name'], {'pages': 0, 'errors': 0, 'elements': 0, 'articles': 0})
+            source_report['pages'] += 1
+            if isinstance(result, Exception):
+                logger.error(f"❌ Ошибка разбора {page['source_name']} ({page['fetched_at']}): {result}")
+                source_report['errors'] += 1
+                continue
+            page_articles, elements = result
+            source_report['elements'] += elements
+            source_report['articles'] += len(page_articles)
+            for article in page_articles:
+                articles.setdefault(article['id'], article)  # самая ранняя копия статьи
+
+        saved_count = 0
+        if save and articles:
+            enriched_articles = await self.enrich_articles_async(list(articles.values()))
+            await self.flag_near_duplicates_async(enriched_articles)
+            saved_count = await self.save_to_database_async(enriched_articles)
+
+        logger.info(f"✅ Повторный разбор: статей {len(articles)}, сохранено {saved_count}")
+        return {'pages': len(pages), 'articles': len(articles), 'saved': saved_count, 'sources': report}
+
     def _extract_article_data(self, elem, selectors, source):
         """Улучшенное извлечение данных статьи из HTML элемента"""
         try:
@@ -261,6 +572,10 @@ class AdvancedFinanceNewsCollector:
             if selectors.get('link'):
                 link_elem = elem.select_one(selectors.get('link', ''))
             
+            if not link_elem and elem.name == 'a':
+                # Карточка сама является ссылкой (a.news-feed__item): select_one ищет только потомков
+                link_elem = elem
+
             if not link_elem:
                 link_elem = elem.find('a') if hasattr(elem, 'find') else None
             
@@ -309,8 +624,7 @@ class AdvancedFinanceNewsCollector:
                 'language': language,
                 'category': 'finance',
                 'is_finance': True,
-                'country': country,
-                'importance_score': self._calculate_importance_score(title, content, source['name'])
+                'country': country
             }
             
             return article_data
@@ -365,8 +679,7 @@ class AdvancedFinanceNewsCollector:
                 'language': language,
                 'category': 'finance',
                 'is_finance': True,
-                'country': country,
-                'importance_score': self._calculate_importance_score(title, content, source['name'])
+                'country': country
             }
 
             return article_data
@@ -440,41 +753,6 @@ class AdvancedFinanceNewsCollector:
         else:
             return 'international'
 
-    def _calculate_importance_score(self, title, content, source_name):
-        """Расчет важности статьи"""
-        text = f"{title} {content}".lower()
-        score = 0.3
-        
-        # Вес источника
-        source_weights = {
-            'reuters': 0.9, 'bloomberg': 0.95, 'financial times': 0.9,
-            'рбк': 0.85, 'коммерсант': 0.8, 'ведомости': 0.8,
-            'цб': 1.0, 'ecb': 0.9, 'imf': 0.9, 'world bank': 0.9
-        }
-        
-        for source, weight in source_weights.items():
-            if source in source_name.lower():
-                score = weight
-                break
-        
-        # Ключевые слова для увеличения важности
-        important_terms = {
-            'срочн': 0.2, 'экстрен': 0.3, 'кризис': 0.25, 'важн': 0.15,
-            'urgent': 0.2, 'breaking': 0.3, 'crisis': 0.25, 'important': 0.15,
-            'санкц': 0.2, 'санкции': 0.2, 'sanction': 0.2,
-            'цб': 0.3, 'central bank': 0.3, 'fed': 0.3,
-            'курс': 0.15, 'exchange rate': 0.15, 'currency': 0.15,
-            'нефть': 0.2, 'oil': 0.2, 'газ': 0.2, 'gas': 0.2,
-            'биткоин': 0.15, 'bitcoin': 0.15, 'крипто': 0.15, 'crypto': 0.15
-        }
-        
-        for term, boost in important_terms.items():
-            if term in text:
-                score += boost
-                break  # Только одно самое важное слово
-        
-        return min(max(score, 0.1), 1.0)
-
     def _is_finance_article(self, title, content):
         """Проверка финансовой тематики с улучшенной логикой"""
         text = (title + ' ' + content).lower()
@@ -506,10 +784,8 @@ class AdvancedFinanceNewsCollector:
                 # Добавляем теги
                 article['tags'] = self._extract_tags(article['title'], article.get('content', ''))
                 
-                # Улучшаем оценку важности
-                article['importance_score'] = self._calculate_importance_score(
-                    article['title'], article.get('content', ''), article['source_name']
-                )
+                # Словарные сущности (канонические имена) для индекса article_entities
+                article['entities'] = extract_entities(article['title'], article.get('content', ''))
                 
                 enriched.append(article)
                 
@@ -517,8 +793,41 @@ class AdvancedFinanceNewsCollector:
                 logger.error(f"Ошибка обогащения статьи: {e}")
                 enriched.append(article)  # Все равно добавляем статью
         
+        # Упоминания новых статей -> счетчики трендов; всплеск - признак горячести
+        await self.observe_trends_async(enriched)
+
+        # Оценка важности всего прогона одним пакетом
+        self.hotness.assign(enriched, bursts=[article.get('burst') for article in enriched])
         return enriched
 
+    async def observe_trends_async(self, articles):
+        """Теги статей, которых еще нет в базе, -> TrendDetector; article['burst'] - всплеск ее тегов"""
+        def observe():
+            known = set()
+            ids = [article['id'] for article in articles]
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start:start + 500]
+                    known.update(row[0] for row in conn.execute(
+                        f"SELECT id FROM raw_articles WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                    ))
+            finally:
+                conn.close()
+
+            # Повторно опрошенные статьи не считаются второй раз
+            self.trends.observe([(article.get('tags'), article['published_at'])
+                                 for article in articles if article['id'] not in known])
+            self.trends.flush()
+            return self.trends.burst_scores([article.get('tags') for article in articles])
+
+        try:
+            bursts = await asyncio.get_event_loop().run_in_executor(None, observe)
+            for article, burst in zip(articles, bursts):
+                article['burst'] = round(burst, 3)
+        except Exception as e:
+            logger.error(f"❌ Ошибка учета трендов: {e}")
+
     def _categorize_article(self, title, content):
         """Категоризация статьи"""
         text = (title + ' ' + content).lower()
@@ -575,6 +884,19 @@ class AdvancedFinanceNewsCollector:
                 conn = sqlite3.connect(self.db_path)
                 cursor = conn.cursor()
                 saved_count = 0
+                entity_items = []
+                # Опорное время горячести читаем в транзакции записи - компактация другого процесса не вклинится
+                cursor.execute("BEGIN IMMEDIATE")
+                ref_ts = self.hotness_index.reference(conn)
+                
+                # Уже сохраненные статьи: пересчеты важности (сюжеты, нейросети), hot_key и scored_at не трогаем
+                known = set()
+                ids = [article['id'] for article in articles]
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start:start + 500]
+                    known.update(row[0] for row in cursor.execute(
+                        f"SELECT id FROM raw_articles WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                    ))
                 
                 for article in articles:
                     try:
@@ -582,11 +904,30 @@ class AdvancedFinanceNewsCollector:
                         is_finance = self._is_finance_article(article['title'], article.get('content', ''))
                         article['is_finance'] = is_finance
                         
+                        if article['id'] in known:
+                            # Повторный опрос: обновляем только полученное содержимое
+                            cursor.execute('''
+                                UPDATE raw_articles SET source_name = ?, title = ?, url = ?, content = ?,
+                                    language = ?, category = ?, is_finance = ?, country = ?
+                                WHERE id = ?
+                            ''', (
+                                article['source_name'],
+                                article['title'],
+                                article['url'],
+                                article['content'],
+                                article['language'],
+                                article['category'],
+                                article['is_finance'],
+                                article.get('country', 'unknown'),
+                                article['id']
+                            ))
+                            continue
+                        
                         cursor.execute('''
-                            INSERT OR REPLACE INTO raw_articles
+                            INSERT INTO raw_articles
                             (id, source_name, title, url, content, published_at, collected_at, 
-                             language, category, is_finance, country, importance_score)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                             language, category, is_finance, country, importance_score, duplicate_of, hot_key, scored_at)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                         ''', (
                             article['id'],
                             article['source_name'],
@@ -599,11 +940,16 @@ class AdvancedFinanceNewsCollector:
                             article['category'],
                             article['is_finance'],
                             article.get('country', 'unknown'),
-                            article.get('importance_score', 0.5)
+                            article.get('importance_score', 0.5),
+                            article.get('duplicate_of'),
+                            self.hotness_index.key(article.get('importance_score', 0.5), article['published_at'], ref_ts),
+                            time.time()
                         ))
                         
                         if cursor.rowcount > 0:
+                            known.add(article['id'])
                             saved_count += 1
+                            entity_items.append((article['id'], article['published_at'], article.get('entities')))
                             if saved_count % 10 == 0:
                                 logger.info(f"💾 Сохранено {saved_count} статей...")
                                 
@@ -613,6 +959,12 @@ class AdvancedFinanceNewsCollector:
 
                 conn.commit()
                 conn.close()
+                
+                # Индекс сущностей - одной пачкой на прогон
+                try:
+                    self.entities.add_articles(entity_items)
+                except Exception as e:
+                    logger.error(f"❌ Ошибка индексации сущностей: {e}")
                 return saved_count
             
             # Запускаем в отдельном потоке
@@ -624,36 +976,132 @@ class AdvancedFinanceNewsCollector:
             logger.error(f"❌ ОШИБКА БАЗЫ ДАННЫХ: {e}")
             return 0
 
+    async def flag_near_duplicates_async(self, articles):
+        """SimHash-проверка на перепечатки до сохранения и нейросетевой обработки"""
+        try:
+            from near_duplicates import get_duplicate_detector
+
+            detector = get_duplicate_detector(self.db_path)
+            flagged = await asyncio.get_event_loop().run_in_executor(
+                None, detector.flag_duplicates, articles
+            )
+            if flagged:
+                logger.info(f"🪞 Найдено почти-дубликатов: {flagged}")
+            return flagged
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка поиска дубликатов: {e}")
+            return 0
+
+    async def embed_articles_async(self, articles, batch_size=64):
+        """Пакетное построение эмбеддингов для сохраненных финансовых статей"""
+        try:
+            from embedding_store import get_embedding_store, embedding_text
+            from neural_analyzer import get_neural_analyzer
+        except ImportError as e:
+            logger.warning(f"⚠️ Эмбеддинги недоступны: {e}")
+            return 0
+
+        try:
+            store = get_embedding_store()
+            pending = [article for article in articles
+                       if article.get('is_finance') and not article.get('duplicate_of')
+                       and article['id'] not in store]
+            if not pending:
+                return 0
+
+            def embed_sync():
+                analyzer = get_neural_analyzer()
+                added = 0
+                for start in range(0, len(pending), batch_size):
+                    batch = pending[start:start + batch_size]
+                    vectors = analyzer.embed_texts([embedding_text(a) for a in batch], batch_size=batch_size)
+                    if vectors is None:
+                        break
+                    added += store.add([a['id'] for a in batch], vectors)
+                return added
+
+            added = await asyncio.get_event_loop().run_in_executor(None, embed_sync)
+            logger.info(f"🧬 Построено эмбеддингов: {added}")
+
+            # Инкрементально добавляем новые строки в ANN-индекс
+            if added:
+                from ann_index import get_ann_index
+                await asyncio.get_event_loop().run_in_executor(None, get_ann_index().sync)
+
+            return added
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка построения эмбеддингов: {e}")
+            return 0
+
+    async def cluster_articles_async(self, articles):
+        """Назначение сюжетов новым статьям (одна копия события из разных источников - один сюжет)"""
+        try:
+            from story_clusterer import get_story_clusterer
+
+            candidates = [article for article in articles if article.get('is_finance')]
+            if not candidates:
+                return {}
+
+            clusterer = get_story_clusterer()
+            assignments = await asyncio.get_event_loop().run_in_executor(
+                None, clusterer.assign_articles, candidates
+            )
+            assignments.update(clusterer.attach_duplicates(candidates))
+
+            if assignments:
+                stories_count = len(set(assignments.values()))
+                logger.info(f"🧩 Статей распределено по сюжетам: {len(assignments)} -> {stories_count}")
+            return assignments
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка кластеризации сюжетов: {e}")
+            return {}
+
+    async def rescore_by_stories_async(self, articles, assignments):
+        """Пересчет важности статей, попавших в сюжеты из нескольких копий (размер и скорость сюжета - признаки горячести)"""
+        if not assignments:
+            return 0
+        try:
+            from story_clusterer import get_story_stats
+
+            loop = asyncio.get_event_loop()
+            stats = await loop.run_in_executor(None, get_story_stats, set(assignments.values()), self.db_path)
+            story_stats = [stats.get(assignments.get(article['id'])) or {} for article in articles]
+            cluster_sizes = [story.get('size', 1) for story in story_stats]
+            if max(cluster_sizes, default=1) <= 1:
+                return 0
+
+            previous = [article.get('importance_score') for article in articles]
+            self.hotness.assign(articles, cluster_sizes=cluster_sizes,
+                                velocities=[story.get('velocity', 0.0) for story in story_stats],
+                                bursts=[article.get('burst') for article in articles])
+            changed = [(article['id'], article['importance_score'], article['published_at'])
+                       for article, old in zip(articles, previous) if article['importance_score'] != old]
+
+            if changed:
+                await loop.run_in_executor(None, self.hotness_index.rescore, changed)
+                logger.info(f"🔥 Важность пересчитана по размеру сюжетов: {len(changed)} статей")
+            return len(changed)
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка пересчета важности по сюжетам: {e}")
+            return 0
+
     async def get_collection_stats(self):
         """Получение статистики по сбору"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Общая статистика
-            cursor.execute("SELECT COUNT(*) FROM raw_articles WHERE is_finance = 1")
-            total_finance = cursor.fetchone()[0] or 0
-            
-            cursor.execute("SELECT COUNT(DISTINCT source_name) FROM raw_articles WHERE is_finance = 1")
-            sources_count = cursor.fetchone()[0] or 0
-            
-            cursor.execute("SELECT COUNT(*) FROM raw_articles WHERE is_finance = 1 AND datetime(collected_at) > datetime('now', '-1 day')")
-            last_24h = cursor.fetchone()[0] or 0
-            
-            cursor.execute("SELECT country, COUNT(*) FROM raw_articles WHERE is_finance = 1 GROUP BY country")
-            countries_stats = cursor.fetchall()
-            
-            cursor.execute("SELECT language, COUNT(*) FROM raw_articles WHERE is_finance = 1 GROUP BY language")
-            languages_stats = cursor.fetchall()
-            
-            conn.close()
+            # Итоги - из почасовой сводки (O(корзин) вместо агрегатов по всей таблице)
+            totals = self.rollup.summary()
             
             stats = {
-                'total_finance_articles': total_finance,
-                'sources_count': sources_count,
-                'last_24h_articles': last_24h,
-                'countries': dict(countries_stats),
-                'languages': dict(languages_stats)
+                'total_finance_articles': totals['articles'],
+                'sources_count': totals['sources_count'],
+                'last_24h_articles': self.rollup.count(hours=24),
+                'countries': totals['countries'],
+                'languages': totals['languages'],
+                'telemetry': self.telemetry.summary(hours=24)
             }
             
             return stats
@@ -662,10 +1110,65 @@ class AdvancedFinanceNewsCollector:
             logger.error(f"Ошибка получения статистики: {e}")
             return {}
 
+_reparse_collector = None
+_reparse_archive = None
+
+def _init_reparse_worker(config_path, db_path, archive_root):
+    """Инициализация процесса пула повторного разбора"""
+    global _reparse_collector, _reparse_archive
+    logging.getLogger().setLevel(logging.WARNING)
+    _reparse_collector = AdvancedFinanceNewsCollector(config_path, db_path, embed_articles=False)
+    _reparse_archive = PageArchive(archive_root, db_path)
+
+def _reparse_page(source, page):
+    """Разбор одной архивной страницы: (статьи, число элементов)"""
+    body = _reparse_archive.load(page['sha256'])
+    if source.get('type') == 'rss':
+        articles, elements = _reparse_collector.extract_rss_articles(source, body)
+    else:
+        articles, elements = _reparse_collector.extract_html_articles(source, body)
+
+    fetched_at = datetime.fromisoformat(page['fetched_at'])
+    for article in articles:
+        article['collected_at'] = fetched_at
+    return articles, elements
+
+def reparse_main(args):
+    """Повторный разбор архива страниц (python data_collector.py --reparse)"""
+    async def run_reparse():
+        collector = AdvancedFinanceNewsCollector(embed_articles=False)
+        since = datetime.now() - timedelta(hours=args.hours) if args.hours else None
+        report = await collector.reparse_archive_async(
+            source_names=args.source, since=since, latest_only=args.latest, workers=args.workers, save=args.save
+        )
+        
+        print(f"\n🗄️ ПОВТОРНЫЙ РАЗБОР АРХИВА: {report['pages']} страниц")
+        print("=" * 60)
+        for name, source in sorted(report['sources'].items()):
+            print(f"   {name}: страниц {source['pages']}, элементов {source['elements']}, "
+                  f"статей {source['articles']}, ошибок {source['errors']}")
+        print(f"\n📰 Уникальных статей: {report['articles']}, сохранено: {report['saved']}")
+
+    asyncio.run(run_reparse())
+
 def main():
     """Основная функция с улучшенной статистикой"""
+    parser = argparse.ArgumentParser(description='Сбор финансовых новостей')
+    parser.add_argument('--archive', action='store_true', help='Сохранять загруженные страницы в архив')
+    parser.add_argument('--reparse', action='store_true', help='Повторный разбор архивных страниц без сети')
+    parser.add_argument('--source', action='append', help='Только этот источник (можно несколько раз)')
+    parser.add_argument('--hours', type=float, help='Только страницы за последние N часов')
+    parser.add_argument('--latest', action='store_true', help='Только последняя страница каждого источника')
+    parser.add_argument('--workers', type=int, help='Процессов разбора (по умолчанию - число CPU)')
+    parser.add_argument('--save', action='store_true', help='Сохранить статьи в базу (иначе только отчет)')
+    args = parser.parse_args()
+    
+    if args.reparse:
+        reparse_main(args)
+        return
+    
     async def run_collection():
-        collector = AdvancedFinanceNewsCollector()
+        collector = AdvancedFinanceNewsCollector(archive_pages=args.archive or None)
         
         print("🌐 ЗАПУСК РАСШИРЕННОГО СБОРА НОВОСТЕЙ")
         print("=" * 60)
@@ -691,6 +1194,19 @@ def main():
         for language, count in stats.get('languages', {}).items():
             print(f"   {language}: {count} статей")
         
+        telemetry_sources = stats.get('telemetry', {}).get('sources', {})
+        problems = sorted(
+            ((name, source) for name, source in telemetry_sources.items()
+             if source['errors'] or not source['extracted']),
+            key=lambda item: -(item[1]['error_rate'] or 0)
+        )
+        if problems:
+            print(f"\n🐢 ПРОБЛЕМНЫЕ ИСТОЧНИКИ ЗА 24 ЧАСА:")
+            for name, source in problems[:10]:
+                ttfb = source['phases_ms'].get('ttfb_ms', {}).get('p50')
+                print(f"   {name}: ошибок {source['errors']}/{source['fetches']}, статей {source['extracted']}, "
+                      f"TTFB p50 {ttfb if ttfb is not None else '-'} мс, {source['last_error'] or source['last_status']}")
+        
         if articles:
             print(f"\n📰 ПОСЛЕДНИЕ ФИНАНСОВЫЕ СТАТЬИ:")
             for i, article in enumerate(articles[:5], 1):
@@ -1,30 +1,28 @@
 import logging
-from neural_analyzer import NeuralNewsAnalyzer
+
+from hotness_engine import get_hotness_engine
+from neural_analyzer import get_neural_analyzer
 
 logger = logging.getLogger(__name__)
 
 class DraftGenerator:
     def __init__(self):
-        self.neural_analyzer = NeuralNewsAnalyzer()
-        logger.info("✅ DraftGenerator инициализирован с нейросетевым модулем")
+        self.neural_analyzer = get_neural_analyzer()
+        logger.info("✅ DraftGenerator инициализирован с общим нейросетевым модулем")
 
-    def generate_draft(self, article, entities):
-        """Генерация черновика с использованием нейросетей"""
+    async def generate_draft(self, article, entities):
+        """Генерация черновика с использованием нейросетей (корутина, как и методы анализатора)"""
         try:
-            # Используем нейросеть для генерации улучшенного черновика
-            importance_score = self.neural_analyzer.analyze_importance(
-                article.get('title', ''), 
-                article.get('content', '')
-            )
+            # Важность - общим движком горячести (analyze_importance асинхронный и требует источник)
+            importance_score = get_hotness_engine().score_one(article)
             
             # Извлекаем сущности с помощью NER
-            ner_entities = self.neural_analyzer.extract_entities_ner(
-                f"{article.get('title', '')} {article.get('content', '')}",
-                language='ru'
+            ner_entities = await self.neural_analyzer.extract_entities_ner(
+                f"{article.get('title', '')} {article.get('content', '')}"
             )
             
             # Генерируем черновик с помощью нейросети
-            draft = self.neural_analyzer.generate_enhanced_draft(
+            draft = await self.neural_analyzer.generate_ai_draft(
                 article, 
                 ner_entities, 
                 importance_score
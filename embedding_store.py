@@ -0,0 +1,260 @@
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: остается только блокировка потоков процесса
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ID_WIDTH = 32  # md5 hex - формат id статей в raw_articles
+
+
+def embedding_text(article):
+    """Текст статьи, по которому строится эмбеддинг"""
+    title = article.get('title', '') or ''
+    content = (article.get('content', '') or '')[:500]
+    return f"{title}. {content}".strip()
+
+
+class EmbeddingStore:
+    """Хранилище эмбеддингов статей.
+
+    Векторы лежат в float16-матрице, отображенной в память (файл .f16),
+    id статей - в файле .ids фиксированной ширины, строка матрицы = позиция id.
+    Строки только дописываются: сначала вектор, затем id, поэтому оборванная
+    запись не портит индекс. Перечитывание при старте - два чтения файлов.
+    Дописывают несколько процессов (демон сбора, лидер веб-приложения), поэтому
+    add() держит flock на файле .lock и под ним перечитывает число строк.
+    """
+
+    def __init__(self, path='data/embeddings', dim=384, initial_capacity=4096):
+        self.matrix_path = f'{path}.f16'
+        self.ids_path = f'{path}.ids'
+        self.meta_path = f'{path}.json'
+        self.lock_path = f'{path}.lock'
+        self.dim = dim
+        self.initial_capacity = initial_capacity
+
+        self.matrix = None
+        self.ids = np.empty(0, dtype=f'S{ID_WIDTH}')
+        self.index = {}
+        self.count = 0
+        self.capacity = 0
+        self._ids_size = 0
+        self._lock = threading.RLock()
+
+        os.makedirs(os.path.dirname(self.matrix_path) or '.', exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """Загрузка матрицы и индекса id→строка"""
+        with self._lock:
+            if os.path.exists(self.meta_path):
+                with open(self.meta_path, 'r', encoding='utf-8') as f:
+                    self.dim = json.load(f).get('dim', self.dim)
+            else:
+                with open(self.meta_path, 'w', encoding='utf-8') as f:
+                    json.dump({'dim': self.dim, 'dtype': 'float16'}, f)
+
+            if not os.path.exists(self.matrix_path):
+                self._resize(self.initial_capacity)
+            else:
+                self._open_matrix()
+
+            self.ids = np.empty(0, dtype=f'S{ID_WIDTH}')
+            self.index = {}
+            self.count = 0
+            self._ids_size = 0
+            self._read_new_ids()
+
+            logger.info(f"✅ Хранилище эмбеддингов загружено: {self.count} статей")
+
+    def _open_matrix(self):
+        row_bytes = self.dim * 2
+        self.capacity = os.path.getsize(self.matrix_path) // row_bytes
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float16, mode='r+',
+                                shape=(max(self.capacity, 1), self.dim))
+
+    @contextmanager
+    def _file_lock(self):
+        """Межпроцессная блокировка дописывания (flock на отдельном файле)"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _resize(self, capacity):
+        """Увеличение файла матрицы (удвоением, чтобы дописывание было амортизированно O(1))"""
+        if self.matrix is not None:
+            self.matrix.flush()
+            self.matrix = None
+        with open(self.matrix_path, 'ab') as f:
+            f.truncate(capacity * self.dim * 2)
+        self._open_matrix()
+
+    def _read_new_ids(self):
+        """Дочитывает id, дописанные с прошлого чтения (в т.ч. другим процессом)"""
+        if not os.path.exists(self.ids_path):
+            return
+
+        size = os.path.getsize(self.ids_path)
+        size -= size % ID_WIDTH
+        if size <= self._ids_size:
+            return
+
+        with open(self.ids_path, 'rb') as f:
+            f.seek(self._ids_size)
+            raw = f.read(size - self._ids_size)
+
+        new_ids = np.frombuffer(raw, dtype=f'S{ID_WIDTH}')
+        start = self.count
+        for offset, article_id in enumerate(new_ids.tolist()):
+            self.index[article_id.decode('ascii')] = start + offset
+
+        self.ids = np.concatenate([self.ids, new_ids])
+        self.count = len(self.ids)
+        self._ids_size = size
+
+        if self.count > self.capacity:
+            self._open_matrix()
+
+    def refresh(self):
+        """Подхватывает строки, добавленные другим процессом"""
+        with self._lock:
+            try:
+                self._read_new_ids()
+            except Exception as e:
+                logger.error(f"❌ Ошибка обновления хранилища эмбеддингов: {e}")
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, article_id):
+        return article_id in self.index
+
+    def missing(self, article_ids):
+        """id статей, для которых ещё нет эмбеддинга"""
+        return [article_id for article_id in article_ids if article_id not in self.index]
+
+    def add(self, article_ids, vectors):
+        """Пакетное добавление векторов; уже известные id пропускаются"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dim:
+            raise ValueError(f"Ожидалась матрица (n, {self.dim}), получено {vectors.shape}")
+
+        with self._lock, self._file_lock():
+            # Под блокировкой: строки и размер файла, записанные другими процессами
+            self._read_new_ids()
+            if os.path.getsize(self.matrix_path) // (self.dim * 2) != self.capacity:
+                self._open_matrix()
+
+            rows = []
+            new_ids = []
+            seen = set()
+            for article_id, vector in zip(article_ids, vectors):
+                if article_id in self.index or article_id in seen or len(article_id) != ID_WIDTH:
+                    continue
+                seen.add(article_id)
+                rows.append(vector)
+                new_ids.append(article_id)
+
+            if not rows:
+                return 0
+
+            block = np.vstack(rows)
+            norms = np.linalg.norm(block, axis=1, keepdims=True)
+            block = block / np.maximum(norms, 1e-12)
+
+            needed = self.count + len(block)
+            if needed > self.capacity:
+                capacity = max(self.capacity, self.initial_capacity)
+                while capacity < needed:
+                    capacity *= 2
+                self._resize(capacity)
+
+            self.matrix[self.count:needed] = block.astype(np.float16)
+            self.matrix.flush()
+
+            raw = b''.join(article_id.encode('ascii') for article_id in new_ids)
+            with open(self.ids_path, 'ab') as f:
+                f.write(raw)
+
+            for offset, article_id in enumerate(new_ids):
+                self.index[article_id] = self.count + offset
+            self.ids = np.concatenate([self.ids, np.frombuffer(raw, dtype=f'S{ID_WIDTH}')])
+            self.count = needed
+            self._ids_size += len(raw)
+
+            return len(new_ids)
+
+    def get(self, article_id):
+        """Вектор статьи (float32) или None"""
+        row = self.index.get(article_id)
+        if row is None:
+            return None
+        return np.asarray(self.matrix[row], dtype=np.float32)
+
+    def scores(self, query, rows=None, chunk_size=65536):
+        """Косинусная близость запроса к строкам матрицы (векторизованно, блоками)"""
+        query = np.asarray(query, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        if rows is not None:
+            return np.asarray(self.matrix[rows], dtype=np.float32) @ query
+
+        count = self.count
+        result = np.empty(count, dtype=np.float32)
+        for start in range(0, count, chunk_size):
+            end = min(start + chunk_size, count)
+            result[start:end] = np.asarray(self.matrix[start:end], dtype=np.float32) @ query
+        return result
+
+    def search(self, query, k=10, exclude=None):
+        """Top-k ближайших статей к вектору: список (id, similarity)"""
+        with self._lock:
+            if not self.count:
+                return []
+
+            scores = self.scores(query)
+            if exclude is not None and exclude in self.index:
+                scores[self.index[exclude]] = -np.inf
+
+            k = min(k, self.count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            return [
+                (self.ids[row].decode('ascii'), float(scores[row]))
+                for row in top if np.isfinite(scores[row])
+            ]
+
+    def similar(self, article_id, k=10):
+        """Статьи, похожие на данную"""
+        vector = self.get(article_id)
+        if vector is None:
+            return []
+        return self.search(vector, k=k, exclude=article_id)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_embedding_store(path='data/embeddings'):
+    """Общее для процесса хранилище (одно на файл)"""
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = EmbeddingStore(path)
+        return _stores[path]
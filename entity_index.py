@@ -0,0 +1,246 @@
+import logging
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Словари сущностей сборщика (как в _fallback_entities нейросетей): канонические имена
+DICTIONARY = {
+    'organization': ['сбербанк', 'газпром', 'роснефть', 'лукойл', 'втб', 'яндекс', 'тинькофф', 'альфа-банк',
+                     'мосбиржа', 'цб', 'минфин', 'новатэк', 'норникель', 'apple', 'microsoft', 'google', 'amazon',
+                     'tesla', 'meta', 'nvidia', 'fed', 'ecb', 'imf', 'opec'],
+    'person': ['путин', 'мишустин', 'набиуллина', 'силуанов', 'греф', 'миллер', 'biden', 'trump', 'macron',
+               'scholz', 'powell', 'lagarde'],
+    'location': ['москва', 'россия', 'сша', 'европа', 'китай', 'лондон', 'нью-йорк']
+}
+# Варианты написания -> каноническое имя
+ALIASES = {
+    'sberbank': 'сбербанк', 'сбер': 'сбербанк', 'gazprom': 'газпром', 'rosneft': 'роснефть', 'lukoil': 'лукойл',
+    'vtb': 'втб', 'yandex': 'яндекс', 'tinkoff': 'тинькофф', 'т-банк': 'тинькофф', 'facebook': 'meta',
+    'банк россии': 'цб', 'центробанк': 'цб', 'центральный банк': 'цб', 'мосбиржа': 'мосбиржа',
+    'московская биржа': 'мосбиржа', 'moex': 'мосбиржа', 'federal reserve': 'fed', 'фрс': 'fed',
+    'ецб': 'ecb', 'european central bank': 'ecb', 'мвф': 'imf', 'опек': 'opec', 'опек+': 'opec',
+    'putin': 'путин', 'moscow': 'москва', 'russia': 'россия', 'usa': 'сша', 'united states': 'сша',
+    'europe': 'европа', 'china': 'китай', 'london': 'лондон', 'new york': 'нью-йорк'
+}
+TYPES = {name: entity_type for entity_type, names in DICTIONARY.items() for name in names}
+# Тип сущности NER -> тип в индексе (деньги и прочее не индексируются)
+NER_TYPES = {'organizations': 'organization', 'persons': 'person', 'locations': 'location'}
+
+
+def _pattern(terms):
+    return '|'.join(sorted((re.escape(term) for term in terms), key=len, reverse=True))
+
+
+_LATIN = [term for term in list(TYPES) + list(ALIASES) if re.search('[a-z]', term)]
+_CYRILLIC = [term for term in list(TYPES) + list(ALIASES) if not re.search('[a-z]', term)]
+# Латиница - целыми словами (meta не в metal), кириллица - с начала слова с любым окончанием (Сбербанка)
+_LATIN_RE = re.compile(rf'\b({_pattern(_LATIN)})\b')
+_CYRILLIC_RE = re.compile(rf'(?<!\w)({_pattern(_CYRILLIC)})[а-я]{{0,3}}(?!\w)')
+
+
+def normalize_entity(name):
+    text = str(name).lower().replace('ё', 'е')
+    text = re.sub(r'[«»"\'“”„()\[\].,;:!?]', ' ', text)
+    return ' '.join(text.split())
+
+
+def canonical_entity(name):
+    """Каноническое имя: нижний регистр, синонимы, падежные окончания известных сущностей"""
+    norm = normalize_entity(name)
+    norm = ALIASES.get(norm, norm)
+    match = _CYRILLIC_RE.fullmatch(norm)
+    if match:
+        norm = ALIASES.get(match.group(1), match.group(1))
+    return norm
+
+
+def display_name(canonical):
+    return canonical.upper() if len(canonical) <= 3 and canonical.isalpha() else canonical.title()
+
+
+def extract_entities(title, content='', chars=1000):
+    """Словарные сущности статьи: [(каноническое имя, тип)]"""
+    text = normalize_entity(f"{title} {(content or '')[:chars]}")
+    found = {}
+    for regex in (_LATIN_RE, _CYRILLIC_RE):
+        for match in regex.finditer(text):
+            canonical = ALIASES.get(match.group(1), match.group(1))
+            found.setdefault(canonical, TYPES.get(canonical, 'organization'))
+    return list(found.items())
+
+
+def ner_entities(ner):
+    """Сущности NER ({'organizations': [...], 'persons': [...], ...}) -> [(имя, тип)]"""
+    return [(name, entity_type) for key, entity_type in NER_TYPES.items() for name in (ner or {}).get(key, [])]
+
+
+class EntityIndex:
+    """Обратный индекс сущностей: какие статьи упоминают компанию, персону или место.
+
+    article_entities - WITHOUT ROWID с ключом (entity_norm, published_at,
+    article_id): выборка «все о Сбербанке за сутки» - один диапазон по
+    первичному ключу без обращения к другим индексам. entities - справочник
+    канонических имен с числом упоминаний для подсказок при вводе.
+    Статьи пишутся пачками: сборщик - словарные сущности, нейросетевой
+    воркер дополняет их сущностями NER.
+    """
+
+    def __init__(self, db_path="data/news.db"):
+        self.db_path = db_path
+        self._setup_database()
+
+    def _setup_database(self):
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS article_entities (
+                    entity_norm TEXT NOT NULL,
+                    published_at TIMESTAMP NOT NULL,
+                    article_id TEXT NOT NULL,
+                    entity_type TEXT,
+                    PRIMARY KEY (entity_norm, published_at, article_id)
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_article_entities_article
+                ON article_entities(article_id)
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS entities (
+                    entity_norm TEXT PRIMARY KEY,
+                    name TEXT,
+                    entity_type TEXT,
+                    mentions INTEGER DEFAULT 0,
+                    last_seen TIMESTAMP
+                ) WITHOUT ROWID
+            ''')
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания индекса сущностей: {e}")
+
+    def add_articles(self, items):
+        """items - (article_id, published_at, [(имя, тип)]); строки статьи дополняются"""
+        if not items:
+            return 0
+        rows = {}
+        names = {}
+        published_by_id = {}
+        for article_id, published_at, entities in items:
+            published = published_at.isoformat() if isinstance(published_at, datetime) else published_at
+            published_by_id[article_id] = published
+            for name, entity_type in entities or []:
+                canonical = canonical_entity(name)
+                if not canonical:
+                    continue
+                rows[(canonical, article_id)] = (canonical, published, article_id, entity_type)
+                names.setdefault(canonical, (display_name(canonical) if canonical in TYPES else str(name).strip(),
+                                             entity_type))
+
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            cursor = conn.cursor()
+            ids = list(published_by_id)
+            known = set()
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                known.update(cursor.execute(
+                    f"SELECT entity_norm, article_id FROM article_entities WHERE article_id IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall())
+            # Статья пересохранена с другим временем (лента без дат) - старые строки вне ключа
+            cursor.executemany("DELETE FROM article_entities WHERE article_id = ? AND published_at <> ?",
+                               list(published_by_id.items()))
+
+            cursor.executemany('''
+                INSERT OR REPLACE INTO article_entities (entity_norm, published_at, article_id, entity_type)
+                VALUES (?, ?, ?, ?)
+            ''', list(rows.values()))
+
+            # Справочник: упоминание засчитывается один раз на пару (сущность, статья)
+            mentions = {}
+            last_seen = {}
+            for (canonical, article_id), row in rows.items():
+                if (canonical, article_id) not in known:
+                    mentions[canonical] = mentions.get(canonical, 0) + 1
+                last_seen[canonical] = max(last_seen.get(canonical, ''), row[1] or '')
+            cursor.executemany('''
+                INSERT INTO entities (entity_norm, name, entity_type, mentions, last_seen)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (entity_norm) DO UPDATE SET
+                    mentions = mentions + excluded.mentions,
+                    last_seen = MAX(COALESCE(last_seen, ''), excluded.last_seen)
+            ''', [(canonical, names[canonical][0], names[canonical][1], mentions.get(canonical, 0),
+                   last_seen[canonical]) for canonical in last_seen])
+            conn.commit()
+        finally:
+            conn.close()
+        return len(rows)
+
+    def article_ids_query(self):
+        """Подзапрос id статей по сущности за период (параметры: сущность, published_at с)"""
+        return "SELECT article_id FROM article_entities WHERE entity_norm = ? AND published_at >= ?"
+
+    def suggest(self, prefix, limit=10):
+        """Подсказки по началу имени: самые упоминаемые сущности"""
+        norm = normalize_entity(prefix)
+        if not norm:
+            return []
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            rows = conn.execute('''
+                SELECT entity_norm, name, entity_type, mentions, last_seen FROM entities
+                WHERE entity_norm >= ? AND entity_norm < ?
+                ORDER BY mentions DESC LIMIT ?
+            ''', (norm, norm + '\U0010ffff', limit)).fetchall()
+            # Синоним (sberbank, центробанк) подсказывает каноническую сущность
+            canonical = canonical_entity(prefix)
+            if canonical != norm and canonical not in {row[0] for row in rows}:
+                rows += conn.execute('''
+                    SELECT entity_norm, name, entity_type, mentions, last_seen FROM entities WHERE entity_norm = ?
+                ''', (canonical,)).fetchall()
+        finally:
+            conn.close()
+        return [{'entity': row[0], 'name': row[1], 'type': row[2], 'mentions': row[3], 'last_seen': row[4]}
+                for row in rows[:limit]]
+
+    def backfill(self, hours=None, batch_size=5000, stop_event=None):
+        """Словарные сущности статей, сохраненных до появления индекса (stop_event - прервать между пачками)"""
+        since = (datetime.now() - timedelta(hours=hours)).isoformat() if hours else ''
+        last_rowid, added = 0, 0
+        while not (stop_event and stop_event.is_set()):
+            # Пачка читается целиком до записи: без открытого курсора во время вставок
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                rows = conn.execute('''
+                    SELECT rowid, id, title, content, published_at FROM raw_articles
+                    WHERE rowid > ? AND published_at >= ?
+                      AND id NOT IN (SELECT article_id FROM article_entities)
+                    ORDER BY rowid LIMIT ?
+                ''', (last_rowid, since, batch_size)).fetchall()
+            finally:
+                conn.close()
+            if not rows:
+                break
+            last_rowid = rows[-1][0]
+            added += self.add_articles([(row[1], row[4], extract_entities(row[2] or '', row[3]))
+                                        for row in rows])
+        if added:
+            logger.info(f"🏷️ Индекс сущностей дополнен: {added} упоминаний")
+        return added
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_entity_index(db_path="data/news.db"):
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = EntityIndex(db_path)
+        return _index
@@ -3,12 +3,19 @@ from bs4 import BeautifulSoup
 import json
 import logging
 
+from page_archive import PageArchive
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def test_selectors():
-    """Тестирование и поиск правильных селекторов для источников новостей"""
+def test_selectors(max_age_hours=24, offline=False):
+    """Тестирование и поиск правильных селекторов для источников новостей.
+
+    Страницы берутся из архива (data/archive), если там есть копия не старше
+    max_age_hours; иначе загружаются и сохраняются в архив. offline=True -
+    только архив, без сети.
+    """
     
     test_sources = [
         {
@@ -72,6 +79,7 @@ def test_selectors():
         'Upgrade-Insecure-Requests': '1',
     })
 
+    archive = PageArchive()
     results = {}
 
     for source in test_sources:
@@ -86,10 +94,19 @@ def test_selectors():
         }
 
         try:
-            response = session.get(source['url'], timeout=15, verify=False)
-            response.raise_for_status()
+            cached = archive.latest_by_url(source['url'], None if offline else max_age_hours)
+            if cached:
+                content, fetched_at = cached
+                print(f"🗄️ Копия из архива от {fetched_at}")
+            elif offline:
+                raise RuntimeError("в архиве нет копии страницы")
+            else:
+                response = session.get(source['url'], timeout=15, verify=False)
+                response.raise_for_status()
+                content = response.content
+                archive.store({'name': source['name'], 'type': 'html'}, source['url'], content)
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            soup = BeautifulSoup(content, 'html.parser')
             
             # Тестируем каждый селектор
             for selector in source['possible_selectors']:
@@ -177,6 +194,7 @@ def update_sources_config():
             with open('config/sources.json', 'w', encoding='utf-8') as f:
                 json.dump(sources_config, f, ensure_ascii=False, indent=2)
             print("💾 Конфигурация sources.json обновлена!")
+            print("🗄️ Проверить новые селекторы на архивных страницах: python data_collector.py --reparse --latest")
         else:
             print("ℹ️ Изменений не требуется")
             
@@ -191,15 +209,18 @@ if __name__ == "__main__":
         print("\nВыберите действие:")
         print("1. Тестировать селекторы источников")
         print("2. Обновить конфигурацию sources.json")
-        print("3. Выход")
+        print("3. Тестировать селекторы по архиву (без сети)")
+        print("4. Выход")
         
-        choice = input("\nВаш выбор (1/2/3): ").strip()
+        choice = input("\nВаш выбор (1/2/3/4): ").strip()
         
         if choice == '1':
             test_selectors()
         elif choice == '2':
             update_sources_config()
         elif choice == '3':
+            test_selectors(offline=True)
+        elif choice == '4':
             print("👋 Выход из программы")
             break
         else:
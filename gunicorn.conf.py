@@ -0,0 +1,23 @@
+import multiprocessing
+import os
+
+# Запуск: gunicorn -c gunicorn.conf.py wsgi:app
+bind = os.environ.get('RADAR_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('RADAR_WEB_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('RADAR_WEB_THREADS', 4))
+worker_class = 'gthread'
+timeout = 120
+graceful_timeout = 30
+
+
+def post_worker_init(worker):
+    """Инициализация в каждом воркере после fork: потоки не переживают fork из мастера"""
+    from app import startup_sequence
+    startup_sequence()
+
+
+def worker_exit(server, worker):
+    # Освобождаем аренду лидера сразу, не дожидаясь её истечения
+    import app
+    if app.leader_election:
+        app.leader_election.stop()
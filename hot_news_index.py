@@ -0,0 +1,255 @@
+import bisect
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Полосы приоритета - те же границы, что у фильтра priority в /api/news: (условие SQL, проверка)
+BANDS = {
+    'all': ('1=1', lambda importance: True),
+    'high': ('importance_score > 0.7', lambda importance: importance > 0.7),
+    'medium': ('importance_score BETWEEN 0.4 AND 0.7', lambda importance: 0.4 <= importance <= 0.7),
+    'low': ('importance_score < 0.4', lambda importance: importance < 0.4),
+}
+
+MISSING = object()
+
+COLUMNS = 'id, source_name, title, url, content, published_at, country, importance_score, duplicate_of, hot_key, scored_at'
+
+
+class HotNewsIndex:
+    """Топ-K горячих финансовых новостей в памяти процесса.
+
+    Для каждой пары (окно в часах, полоса приоритета) хранится список
+    статей по убыванию hot_key (hotness_engine.HotnessIndex) длиной не
+    больше K. Порядок по hot_key не зависит от текущего момента, поэтому
+    списки не пересортировываются со временем - только пополняются и
+    чистятся от статей, вышедших из окна.
+
+    Изменения подтягиваются из базы по водяному знаку scored_at: его
+    выставляют сборщик при сохранении и любые пересчеты важности (сюжеты,
+    нейросетевой воркер), в том числе из других процессов. Вытесненные
+    из списка статьи запоминаются через порог floor - максимальный ключ
+    среди вытесненных: все статьи окна с ключом выше порога гарантированно
+    в списке, и такую часть списка можно отдавать без базы. Если ее не
+    хватает на запрошенную страницу, top() возвращает None и вызывающий
+    идет в базу. Компактация HotnessIndex сдвигает все ключи сразу - при
+    смене опорного времени индекс перезагружается целиком.
+    """
+
+    def __init__(self, db_path="data/news.db", windows=(24, 168), k=None, refresh_interval=None, overlap=120):
+        self.db_path = db_path
+        self.windows = sorted(windows)
+        self.k = k or int(os.environ.get('RADAR_HOT_TOP_K', 200))
+        self.refresh_interval = refresh_interval if refresh_interval is not None else \
+            float(os.environ.get('RADAR_HOT_REFRESH_SECONDS', 2))
+        # Запись с ранним scored_at может закоммититься позже соседних - перечитываем хвост
+        self.overlap = overlap
+        self.seen = {}  # id -> scored_at уже примененных записей из хвоста (и записей без scored_at)
+        self.articles = {}  # id -> строка статьи (общая для всех списков)
+        self.lists = {}  # (окно, полоса) -> [(-hot_key, id)]
+        self.floors = {}  # (окно, полоса) -> максимальный ключ вытесненной статьи
+        self.watermark = None
+        self.ref_ts = None
+        self.refreshed_at = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Опорное время и ключи читаем в одной транзакции - согласованный снимок
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute("BEGIN")
+        return conn
+
+    @staticmethod
+    def _ref_ts(conn):
+        row = conn.execute("SELECT value FROM hotness_meta WHERE key = 'ref_ts'").fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _row(row):
+        return {
+            'id': row[0],
+            'source_name': row[1],
+            'title': row[2],
+            'url': row[3],
+            'content': row[4] or '',
+            'published_at': datetime.fromisoformat(row[5]) if row[5] else datetime.now(),
+            'country': row[6] or 'unknown',
+            'importance_score': row[7] or 0.5,
+            'duplicate_of': row[8],
+            'hot_key': row[9],
+        }
+
+    def load(self):
+        """Холодный старт: по K+1 лучших статей на каждую пару (окно, полоса) из базы"""
+        now = datetime.now()
+        conn = self._connect()
+        try:
+            ref_ts = self._ref_ts(conn)
+            watermark = conn.execute("SELECT MAX(scored_at) FROM raw_articles").fetchone()[0]
+            articles, lists, floors = {}, {}, {}
+            for window in self.windows:
+                since = (now - timedelta(hours=window)).isoformat()
+                for band, (condition, _) in BANDS.items():
+                    rows = conn.execute(f'''
+                        SELECT {COLUMNS} FROM raw_articles
+                        WHERE is_finance = 1 AND published_at >= ? AND hot_key IS NOT NULL AND {condition}
+                        ORDER BY hot_key DESC LIMIT ?
+                    ''', (since, self.k + 1)).fetchall()
+                    for row in rows[:self.k]:
+                        articles.setdefault(row[0], self._row(row))
+                    lists[(window, band)] = [(-row[9], row[0]) for row in rows[:self.k]]
+                    floors[(window, band)] = rows[self.k][9] if len(rows) > self.k else float('-inf')
+        finally:
+            conn.close()
+
+        with self._lock:
+            self.articles, self.lists, self.floors = articles, lists, floors
+            self.watermark = watermark if watermark is not None else time.time()
+            self.ref_ts = ref_ts
+            self.seen = {}
+            self.refreshed_at = time.time()
+        logger.info(f"🔥 Индекс горячих новостей загружен: {len(articles)} статей, K={self.k}")
+
+    def refresh(self, force=False):
+        """Догоняем базу: статьи, сохраненные или пересчитанные после водяного знака"""
+        if self.watermark is None:
+            self.load()
+            return
+        if not force and time.time() - self.refreshed_at < self.refresh_interval:
+            return
+        self.refreshed_at = time.time()
+        conn = self._connect()
+        try:
+            if self._ref_ts(conn) != self.ref_ts:
+                rows = None
+            else:
+                # Сначала только id и метки хвоста, полные строки - для еще не примененных.
+                # Строки без scored_at (сторонние писатели) тоже проверяем - иначе они не попадут в индекс
+                changed = [article_id for article_id, scored_at in conn.execute('''
+                    SELECT id, scored_at FROM raw_articles
+                    WHERE (scored_at > ? OR scored_at IS NULL) AND is_finance = 1 AND hot_key IS NOT NULL
+                ''', (self.watermark - self.overlap,)) if self.seen.get(article_id, MISSING) != scored_at]
+                rows = []
+                for start in range(0, len(changed), 500):
+                    batch = changed[start:start + 500]
+                    rows += conn.execute(
+                        f"SELECT {COLUMNS} FROM raw_articles WHERE id IN ({','.join('?' * len(batch))})", batch
+                    ).fetchall()
+        finally:
+            conn.close()
+        if rows is None:
+            logger.info("🔥 Опорное время горячести сменилось, индекс перезагружается")
+            self.load()
+            return
+        if rows:
+            self.update(rows)
+        horizon = self.watermark - self.overlap
+        self.seen = {article_id: scored_at for article_id, scored_at in self.seen.items()
+                     if scored_at is None or scored_at > horizon}
+
+    def update(self, rows):
+        """Вставка и переоценка статей (строки в порядке COLUMNS)"""
+        now = datetime.now()
+        with self._lock:
+            for row in rows:
+                article = self._row(row)
+                self._discard(article['id'])
+                for window in self.windows:
+                    if article['published_at'] < now - timedelta(hours=window):
+                        continue
+                    for band, (_, accepts) in BANDS.items():
+                        if accepts(article['importance_score']):
+                            self._insert((window, band), article)
+                if row[10] is not None:
+                    self.watermark = max(self.watermark, row[10])
+                self.seen[article['id']] = row[10]
+            self._prune(now)
+
+    def _insert(self, list_key, article):
+        entries = self.lists.setdefault(list_key, [])
+        entry = (-article['hot_key'], article['id'])
+        if len(entries) >= self.k and entry >= entries[-1]:
+            self.floors[list_key] = max(self.floors.get(list_key, float('-inf')), article['hot_key'])
+            return
+        bisect.insort(entries, entry)
+        self.articles[article['id']] = article
+        if len(entries) > self.k:
+            key, article_id = entries.pop()
+            self.floors[list_key] = max(self.floors.get(list_key, float('-inf')), -key)
+            self._forget(article_id)
+
+    def _discard(self, article_id):
+        article = self.articles.get(article_id)
+        if article is None:
+            return
+        entry = (-article['hot_key'], article_id)
+        for entries in self.lists.values():
+            index = bisect.bisect_left(entries, entry)
+            if index < len(entries) and entries[index] == entry:
+                del entries[index]
+        del self.articles[article_id]
+
+    def _forget(self, article_id):
+        """Статья больше не нужна ни одному списку"""
+        article = self.articles.get(article_id)
+        if article is None:
+            return
+        entry = (-article['hot_key'], article_id)
+        for entries in self.lists.values():
+            index = bisect.bisect_left(entries, entry)
+            if index < len(entries) and entries[index] == entry:
+                return
+        del self.articles[article_id]
+
+    def _prune(self, now):
+        """Убираем статьи, вышедшие из своих окон"""
+        for (window, band), entries in self.lists.items():
+            since = now - timedelta(hours=window)
+            kept = [entry for entry in entries if self.articles[entry[1]]['published_at'] >= since]
+            if len(kept) != len(entries):
+                expired = {entry[1] for entry in entries} - {entry[1] for entry in kept}
+                entries[:] = kept
+                for article_id in expired:
+                    self._forget(article_id)
+
+    def top(self, hours=24, limit=20, band='all'):
+        """Первые limit статей по горячести или None, если память не покрывает запрос"""
+        window = next((window for window in self.windows if window >= hours), None)
+        if window is None or band not in BANDS:
+            return None
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"❌ Ошибка обновления индекса горячих новостей: {e}")
+            return None
+
+        since = datetime.now() - timedelta(hours=hours)
+        with self._lock:
+            entries = self.lists.get((window, band), [])
+            floor = self.floors.get((window, band), float('-inf'))
+            result = []
+            for key, article_id in entries:
+                if -key <= floor or len(result) == limit:
+                    break
+                article = self.articles[article_id]
+                if article['published_at'] >= since:
+                    result.append(dict(article, collected_at=datetime.now()))
+        # Вытеснений не было - в списке все статьи окна; иначе короткую страницу отдает база
+        return result if len(result) == limit or floor == float('-inf') else None
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_hot_news_index(db_path="data/news.db"):
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = HotNewsIndex(db_path)
+        return _index
@@ -0,0 +1,426 @@
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOTNESS = {
+    'default_source_weight': 0.3,   # база для источника не из списка
+    'min_score': 0.1,
+    'max_score': 0.99,
+    'text_chars': 600,              # сколько символов заголовка и текста просматривать на срочные слова
+    'weights': {
+        'urgency': 1.0,             # множитель бонуса срочного слова
+        'sentiment': 1.0,           # множитель бонуса тональности
+        'length': 1.0,              # множитель бонуса за длинный текст
+        'cluster': 0.05,            # за каждое удвоение числа статей сюжета
+        'cluster_max': 0.2,
+        'velocity': 0.05,           # за каждое удвоение скорости сюжета (источников в час) + 1
+        'velocity_max': 0.15,
+        'burst': 0.15,              # всплеск упоминаний сущностей статьи (TrendDetector), 0..1
+        'time': 0.2,                # доля свежести в итоговой оценке (если задано now)
+        'time_floor': 0.2           # свежесть старых статей не опускается ниже
+    },
+    'half_life_hours': 6,
+    'compact_interval_hours': 24,   # как часто HotnessIndex переносит опорное время
+    # Подстрока названия источника (в нижнем регистре) -> базовая оценка
+    'source_weights': {
+        'reuters': 0.9, 'bloomberg': 0.95, 'financial times': 0.9,
+        'рбк': 0.85, 'коммерсант': 0.8, 'ведомости': 0.8, 'интерфакс': 0.85, 'тасс': 0.87,
+        'цб': 1.0, 'ecb': 0.9, 'imf': 0.9, 'world bank': 0.9,
+        'forbes': 0.85, 'риа новости': 0.8, 'банки.ру': 0.75, 'финам': 0.7, 'lenta.ru': 0.7
+    },
+    # Срочные слова: берется наибольший бонус из найденных
+    'urgency_terms': {
+        'срочн': 0.2, 'экстрен': 0.3, 'кризис': 0.25, 'важн': 0.15,
+        'urgent': 0.2, 'breaking': 0.3, 'crisis': 0.25, 'important': 0.15,
+        'санкц': 0.2, 'sanction': 0.2,
+        'цб': 0.3, 'central bank': 0.3, 'fed': 0.3,
+        'курс': 0.15, 'exchange rate': 0.15, 'currency': 0.15,
+        'нефть': 0.2, 'oil': 0.2, 'газ': 0.2, 'gas': 0.2,
+        'биткоин': 0.15, 'bitcoin': 0.15, 'крипто': 0.15, 'crypto': 0.15
+    },
+    'sentiment_boost': {'positive': 0.1, 'negative': 0.15, 'neutral': 0.0},
+    # (минимальная длина текста, бонус) - от большей к меньшей
+    'length_boost': [[1000, 0.1], [500, 0.05]]
+}
+
+
+def _merge(defaults, overrides):
+    merged = dict(defaults)
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict) and isinstance(defaults.get(key), dict):
+            merged[key] = dict(defaults[key], **value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _timestamp(value):
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            return np.nan
+    return np.nan
+
+
+def _sentiment_label(value):
+    # Тональность приходит строкой или словарем analyze_sentiment ({'sentiment': ..., 'confidence': ...})
+    if isinstance(value, dict):
+        return value.get('sentiment')
+    return value
+
+
+class HotnessEngine:
+    """Единая оценка горячести статей пакетом на массивах NumPy.
+
+    Признаки: вес источника, наибольший бонус срочного слова в заголовке и
+    начале текста, тональность, длина текста, размер и скорость сюжета и (если
+    передано now) свежесть с экспоненциальным затуханием; если переданы bursts - всплеск
+    упоминаний сущностей статьи (trend_detector.TrendDetector). Веса и словари - раздел
+    hotness файла config/sources.json поверх DEFAULT_HOTNESS.
+    """
+
+    def __init__(self, config=None):
+        self.config = _merge(DEFAULT_HOTNESS, config)
+        self.terms = list(self.config['urgency_terms'].items())
+        self.term_boosts = np.array([boost for _, boost in self.terms], dtype=np.float64)
+        self._source_cache = {}
+
+    def source_weight(self, source_name):
+        weight = self._source_cache.get(source_name)
+        if weight is None:
+            weight = self.config['default_source_weight']
+            name = (source_name or '').lower()
+            for source, source_weight in self.config['source_weights'].items():
+                if source in name:
+                    weight = source_weight
+                    break
+            self._source_cache[source_name] = weight
+        return weight
+
+    def features(self, articles, sentiments=None, cluster_sizes=None, now=None, bursts=None, velocities=None):
+        """Признаки пакета статей: словарь массивов длины len(articles)"""
+        config = self.config
+        count = len(articles)
+        if not count:
+            return {name: np.zeros(0)
+                    for name in ('source', 'urgency', 'sentiment', 'length', 'cluster', 'velocity', 'burst')}
+
+        # Вес источника считается один раз на уникальное имя
+        names, inverse = np.unique([article.get('source_name') or '' for article in articles], return_inverse=True)
+        source = np.array([self.source_weight(name) for name in names], dtype=np.float64)[inverse]
+
+        # Матрица попаданий (слово x статья) вместо цикла по словам для каждой статьи
+        chars = config['text_chars']
+        texts = np.char.lower(np.array(
+            [f"{article.get('title') or ''} {(article.get('content') or '')[:chars]}" for article in articles],
+            dtype=str
+        ))
+        urgency = np.zeros(count)
+        if self.terms:
+            hits = np.stack([np.char.find(texts, term) >= 0 for term, _ in self.terms])
+            urgency = (hits * self.term_boosts[:, None]).max(axis=0)
+
+        lengths = np.array([len(article.get('content') or '') for article in articles], dtype=np.float64)
+        length = np.zeros(count)
+        for threshold, boost in sorted(config['length_boost'], reverse=True):
+            length = np.where((length == 0) & (lengths > threshold), boost, length)
+
+        sentiment = np.zeros(count)
+        if sentiments is not None:
+            boosts = config['sentiment_boost']
+            sentiment = np.array([boosts.get(_sentiment_label(value), 0.0) for value in sentiments], dtype=np.float64)
+
+        cluster = np.zeros(count)
+        if cluster_sizes is not None:
+            sizes = np.maximum(np.asarray(cluster_sizes, dtype=np.float64), 1)
+            cluster = np.minimum(np.log2(sizes) * config['weights']['cluster'], config['weights']['cluster_max'])
+
+        # Скорость сюжета (story_clusterer.story_velocity) - источников в час, у одиночных статей 0
+        velocity = np.zeros(count)
+        if velocities is not None:
+            rates = np.maximum(np.array([value or 0.0 for value in velocities], dtype=np.float64), 0)
+            velocity = np.minimum(np.log2(1 + rates) * config['weights']['velocity'], config['weights']['velocity_max'])
+
+        burst = np.zeros(count)
+        if bursts is not None:
+            burst = np.array([value or 0.0 for value in bursts], dtype=np.float64) * config['weights']['burst']
+
+        features = {'source': source, 'urgency': urgency, 'sentiment': sentiment, 'length': length,
+                    'cluster': cluster, 'velocity': velocity, 'burst': burst}
+
+        if now is not None:
+            now_ts = now.timestamp() if isinstance(now, datetime) else float(now)
+            published = np.array([_timestamp(article.get('published_at')) for article in articles], dtype=np.float64)
+            ages = np.maximum(now_ts - published, 0) / 3600
+            freshness = np.maximum(0.5 ** (ages / config['half_life_hours']), config['weights']['time_floor'])
+            features['time'] = np.where(np.isnan(published), 0.5, freshness)
+        return features
+
+    def score(self, articles, sentiments=None, cluster_sizes=None, now=None, bursts=None, velocities=None):
+        """Горячесть пакета статей (np.ndarray float64)"""
+        if not articles:
+            return np.zeros(0)
+        weights = self.config['weights']
+        features = self.features(articles, sentiments, cluster_sizes, now, bursts, velocities)
+
+        score = (features['source']
+                 + weights['urgency'] * features['urgency']
+                 + weights['sentiment'] * features['sentiment']
+                 + weights['length'] * features['length']
+                 + features['cluster']
+                 + features['velocity']
+                 + features['burst'])
+        if 'time' in features:
+            score = (1 - weights['time']) * score + weights['time'] * features['time']
+        return np.clip(score, self.config['min_score'], self.config['max_score'])
+
+    def score_one(self, article, sentiment=None, cluster_size=None, now=None, burst=None, velocity=None):
+        return float(self.score(
+            [article],
+            sentiments=None if sentiment is None else [sentiment],
+            cluster_sizes=None if cluster_size is None else [cluster_size],
+            now=now,
+            bursts=None if burst is None else [burst],
+            velocities=None if velocity is None else [velocity]
+        )[0])
+
+    def assign(self, articles, key='importance_score', **kwargs):
+        """Записывает оценку в каждую статью (article[key]); возвращает массив оценок"""
+        scores = self.score(articles, **kwargs)
+        for article, value in zip(articles, scores):
+            article[key] = round(float(value), 4)
+        return scores
+
+
+class HotnessIndex:
+    """Затухающая горячесть в базе без ежеминутной перезаписи строк.
+
+    В raw_articles.hot_key хранится логарифм затухающей оценки на опорный
+    момент ref_ts: hot_key = ln(importance) + λ·(published_at − ref_ts),
+    λ = ln 2 / half_life. В любой момент now горячесть статьи равна
+    exp(hot_key − λ·(now − ref_ts)) - сдвиг одинаков для всех строк, поэтому
+    порядок по hot_key и есть порядок по текущей горячести, а индекс
+    (is_finance, hot_key) дает сортировку без вычислений. Опорное время и
+    период полураспада - в таблице hotness_meta; compact() переносит ref_ts
+    к текущему моменту одним сдвигом ключей (и пересчитывает их, если
+    сменился период полураспада). Колонка scored_at - время последней
+    записи оценки: по ней процессы догоняют чужие вставки и пересчеты.
+    Экземпляров много (сборщик, веб-процессы, нейросетевые воркеры), а
+    компактирует один из них, поэтому писатели ключей берут ref_ts через
+    reference() в той же транзакции BEGIN IMMEDIATE, что и запись.
+    """
+
+    def __init__(self, db_path="data/news.db", config=None):
+        config = _merge(DEFAULT_HOTNESS, config)
+        self.db_path = db_path
+        self.half_life_hours = config['half_life_hours']
+        self.compact_interval = config['compact_interval_hours'] * 3600
+        self.decay = math.log(2) / (self.half_life_hours * 3600)
+        self.ref_ts = None
+        self._lock = threading.Lock()
+        self._setup_database()
+
+    def key(self, importance, published_at, ref_ts=None):
+        """hot_key статьи (published_at - datetime или ISO-строка)"""
+        ref_ts = self.ref_ts if ref_ts is None else ref_ts
+        published = _timestamp(published_at)
+        if math.isnan(published):
+            published = ref_ts
+        return math.log(max(importance if importance is not None else 0.5, 1e-3)) + self.decay * (published - ref_ts)
+
+    def reference(self, conn):
+        """Опорное время из hotness_meta (внутри транзакции записи - компактация не вклинится)"""
+        row = conn.execute("SELECT value FROM hotness_meta WHERE key = 'ref_ts'").fetchone()
+        if row:
+            self.ref_ts = row[0]
+        return self.ref_ts
+
+    def current(self, hot_key, now=None):
+        """Горячесть на момент now по сохраненному ключу"""
+        if hot_key is None:
+            return None
+        now = now or time.time()
+        return math.exp(hot_key - self.decay * (now - self.ref_ts))
+
+    def _setup_database(self):
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS hotness_meta (
+                    key TEXT PRIMARY KEY,
+                    value REAL
+                )
+            ''')
+            cursor.execute("PRAGMA table_info(raw_articles)")
+            existing_columns = [column[1] for column in cursor.fetchall()]
+            for column in ('hot_key', 'scored_at'):
+                if existing_columns and column not in existing_columns:
+                    cursor.execute(f"ALTER TABLE raw_articles ADD COLUMN {column} REAL")
+            if existing_columns:
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_finance_hot_key
+                    ON raw_articles(is_finance, hot_key)
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_scored_at
+                    ON raw_articles(scored_at)
+                ''')
+
+            meta = dict(cursor.execute("SELECT key, value FROM hotness_meta").fetchall())
+            if 'ref_ts' not in meta:
+                cursor.executemany("INSERT OR REPLACE INTO hotness_meta (key, value) VALUES (?, ?)",
+                                   [('ref_ts', time.time()), ('half_life_hours', self.half_life_hours)])
+                meta = dict(cursor.execute("SELECT key, value FROM hotness_meta").fetchall())
+            self.ref_ts = meta['ref_ts']
+            conn.commit()
+            conn.close()
+
+            if existing_columns:
+                if meta.get('half_life_hours') != self.half_life_hours:
+                    self.compact(force=True)
+                else:
+                    self.backfill()
+        except Exception as e:
+            logger.error(f"❌ Ошибка подготовки индекса горячести: {e}")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.create_function('hot_key', 3, lambda importance, published_at, ref_ts:
+                             self.key(importance, published_at, ref_ts), deterministic=True)
+        return conn
+
+    def backfill(self):
+        """Ключи для строк, сохраненных без hot_key (старые базы, демо-данные, генераторы)"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                # scored_at - чтобы индекс горячих новостей подхватил строки без перезагрузки
+                cursor = conn.execute('''
+                    UPDATE raw_articles SET hot_key = hot_key(importance_score, published_at, ?), scored_at = ?
+                    WHERE hot_key IS NULL
+                ''', (self.reference(conn), time.time()))
+                conn.commit()
+                if cursor.rowcount:
+                    logger.info(f"🔥 Ключи горячести построены для {cursor.rowcount} статей")
+                return cursor.rowcount
+            finally:
+                conn.close()
+
+    def rescore(self, items):
+        """Новая важность уже сохраненных статей: items - (id, importance, published_at)"""
+        if not items:
+            return 0
+        scored_at = time.time()
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            ref_ts = self.reference(conn)
+            rows = [(importance, self.key(importance, published_at, ref_ts), scored_at, article_id)
+                    for article_id, importance, published_at in items]
+            conn.executemany(
+                "UPDATE raw_articles SET importance_score = ?, hot_key = ?, scored_at = ? WHERE id = ?", rows
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return len(rows)
+
+    def compact(self, now=None, force=False):
+        """Перенос опорного времени к now: все ключи сдвигаются на λ·(ref_ts − now) одной транзакцией.
+
+        Без force интервал compact_interval перепроверяется под блокировкой записи:
+        если другой процесс уже перенес ref_ts, компактация пропускается (False).
+        """
+        now = now or time.time()
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                meta = dict(conn.execute("SELECT key, value FROM hotness_meta").fetchall())
+                old_ref = meta.get('ref_ts', now)
+                if not force and meta.get('half_life_hours') == self.half_life_hours \
+                        and now - old_ref < self.compact_interval:
+                    conn.rollback()
+                    self.ref_ts = old_ref
+                    return False
+                scored_at = time.time()
+                if meta.get('half_life_hours') != self.half_life_hours:
+                    # Сменился период полураспада - сдвигом не обойтись, пересчитываем ключи
+                    conn.execute(
+                        "UPDATE raw_articles SET hot_key = hot_key(importance_score, published_at, ?), scored_at = ?",
+                        (now, scored_at)
+                    )
+                else:
+                    conn.execute("UPDATE raw_articles SET hot_key = hot_key + ?, scored_at = ? WHERE hot_key IS NOT NULL",
+                                 (self.decay * (old_ref - now), scored_at))
+                    conn.execute('''
+                        UPDATE raw_articles SET hot_key = hot_key(importance_score, published_at, ?), scored_at = ?
+                        WHERE hot_key IS NULL
+                    ''', (now, scored_at))
+                conn.executemany("INSERT OR REPLACE INTO hotness_meta (key, value) VALUES (?, ?)",
+                                 [('ref_ts', now), ('half_life_hours', self.half_life_hours)])
+                conn.commit()
+                self.ref_ts = now
+                logger.info(f"🔥 Опорное время горячести перенесено на {(now - old_ref) / 3600:.1f} ч")
+                return True
+            finally:
+                conn.close()
+
+    def compact_if_due(self, now=None):
+        """Компактация не чаще compact_interval (вызывается после прогонов сбора)"""
+        now = now or time.time()
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            ref_ts = conn.execute("SELECT value FROM hotness_meta WHERE key = 'ref_ts'").fetchone()
+            conn.close()
+            # Ссылка могла смениться в другом процессе
+            self.ref_ts = ref_ts[0] if ref_ts else self.ref_ts
+            if now - self.ref_ts >= self.compact_interval:
+                return self.compact(now)
+        except Exception as e:
+            logger.error(f"❌ Ошибка компактации горячести: {e}")
+        return False
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_hotness_engine(config_path="config/sources.json"):
+    """Общий для процесса движок с весами из раздела hotness конфига источников"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            config = None
+            try:
+                with open(config_path, 'r', encoding='utf-8') as f:
+                    config = json.load(f).get('hotness')
+            except Exception as e:
+                logger.warning(f"⚠️ Веса горячести по умолчанию: {e}")
+            _engine = HotnessEngine(config)
+        return _engine
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_hotness_index(db_path="data/news.db"):
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = HotnessIndex(db_path, get_hotness_engine().config)
+        return _index
@@ -0,0 +1,148 @@
+import base64
+import logging
+import threading
+import time
+
+import numpy as np
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+def encode_payload(obj):
+    """JSON-совместимое представление ответов моделей (numpy-массивы - base64)"""
+    if isinstance(obj, np.ndarray):
+        array = np.ascontiguousarray(obj)
+        return {
+            '__ndarray__': base64.b64encode(array.tobytes()).decode('ascii'),
+            'dtype': str(array.dtype),
+            'shape': list(array.shape)
+        }
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, dict):
+        return {key: encode_payload(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [encode_payload(value) for value in obj]
+    return obj
+
+
+def decode_payload(obj):
+    if isinstance(obj, dict):
+        if '__ndarray__' in obj:
+            data = base64.b64decode(obj['__ndarray__'])
+            return np.frombuffer(data, dtype=obj['dtype']).reshape(obj['shape']).copy()
+        return {key: decode_payload(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [decode_payload(value) for value in obj]
+    return obj
+
+
+class InferenceClient:
+    """HTTP-клиент сервера инференса (inference_server.py)"""
+
+    def __init__(self, url, timeout=120):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        # requests.Session не потокобезопасен - своя сессия на поток
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def run(self, model, inputs, **kwargs):
+        """Вызов модели на сервере: список результатов по одному на вход"""
+        response = self.session.post(
+            f"{self.url}/models/{model}",
+            json={'inputs': list(inputs), 'kwargs': encode_payload(kwargs)},
+            timeout=self.timeout
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Сервер инференса ({model}): HTTP {response.status_code} {response.text[:200]}")
+        return decode_payload(response.json()['outputs'])
+
+    def status(self):
+        response = self.session.get(f"{self.url}/status", timeout=5)
+        response.raise_for_status()
+        return response.json()
+
+
+class RemotePipeline:
+    """Заместитель transformers.pipeline: вызов уходит на сервер инференса"""
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def __call__(self, inputs, **kwargs):
+        if isinstance(inputs, str):
+            # pipeline(str): классификация отдает [dict], NER и генерация - список результатов входа
+            result = self.client.run(self.name, [inputs], **kwargs)[0]
+            return [result] if isinstance(result, dict) else result
+        return self.client.run(self.name, inputs, **kwargs)
+
+
+class RemoteEmbeddingModel:
+    """Заместитель SentenceTransformer: encode() на сервере инференса"""
+
+    def __init__(self, client, name='embedding'):
+        self.client = client
+        self.name = name
+
+    def encode(self, sentences, batch_size=64, normalize_embeddings=False, **kwargs):
+        vectors = self.client.run(self.name, sentences, batch_size=batch_size,
+                                  normalize_embeddings=normalize_embeddings)
+        return np.stack(vectors) if len(vectors) else np.empty((0, 0), dtype=np.float32)
+
+
+class RemoteModelManager:
+    """Реестр моделей, обслуживаемых отдельным процессом (inference_server.py).
+
+    Подставляется в NeuralNewsAnalyzer вместо локального ModelManager: вся
+    логика анализа остается в анализаторе, а вызовы моделей уходят на сервер,
+    где склеиваются в пакеты с запросами других процессов.
+    """
+
+    def __init__(self, url, timeout=120, status_ttl=5):
+        self.client = InferenceClient(url, timeout=timeout)
+        self.status_ttl = status_ttl
+        self._names = set()
+        self._status = None
+        self._status_at = 0
+
+    def register(self, name, loader, size_hint_mb=None, pinned=False):
+        # Загрузчики выполняются на сервере; здесь запоминаем только имя
+        self._names.add(name)
+
+    def is_registered(self, name):
+        return name in self._names
+
+    def get(self, name):
+        if name not in self._names:
+            logger.warning(f"⚠️ Модель не зарегистрирована: {name}")
+            return None
+        if name == 'embedding':
+            return RemoteEmbeddingModel(self.client, name)
+        return RemotePipeline(self.client, name)
+
+    def _server_status(self):
+        if self._status is None or time.time() - self._status_at > self.status_ttl:
+            try:
+                self._status = self.client.status()
+            except Exception as e:
+                self._status = {'error': str(e)}
+            self._status_at = time.time()
+        return self._status
+
+    def is_loaded(self, name):
+        models = self._server_status().get('models', {}).get('models', {})
+        return bool(models.get(name, {}).get('loaded'))
+
+    def status(self):
+        status = dict(self._server_status())
+        status['remote'] = self.client.url
+        return status
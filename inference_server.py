@@ -0,0 +1,196 @@
+import argparse
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from aiohttp import web
+
+from inference_client import encode_payload, decode_payload
+from model_manager import get_model_manager
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class RequestCoalescer:
+    """Склейка одновременных запросов к модели в один пакетный вызов.
+
+    Входы запросов с одинаковыми параметрами копятся до max_batch штук или
+    max_wait_ms с момента первого входа, затем модель вызывается один раз в
+    собственном потоке (модели не вызываются параллельно сами с собой), и
+    результаты раздаются по запросам. Пока модель занята, следующий пакет
+    продолжает накапливаться.
+    """
+
+    def __init__(self, name, run_batch, max_batch=64, max_wait_ms=10):
+        self.name = name
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'model-{name}')
+        self.pending = {}
+
+        self.requests = 0
+        self.batches = 0
+        self.items = 0
+        self.busy_seconds = 0.0
+
+    async def submit(self, inputs, key=(), kwargs=None):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.requests += 1
+
+        group = self.pending.get(key)
+        if group is None:
+            group = self.pending[key] = {'items': [], 'size': 0, 'kwargs': kwargs or {}, 'timer': None}
+            group['timer'] = loop.call_later(self.max_wait, self._flush, key)
+        group['items'].append((inputs, future))
+        group['size'] += len(inputs)
+
+        if group['size'] >= self.max_batch:
+            self._flush(key)
+
+        return await future
+
+    def _flush(self, key):
+        group = self.pending.pop(key, None)
+        if group is None:
+            return
+        group['timer'].cancel()
+        asyncio.ensure_future(self._run(group))
+
+    async def _run(self, group):
+        loop = asyncio.get_running_loop()
+        flat = [value for inputs, _ in group['items'] for value in inputs]
+
+        started = time.time()
+        try:
+            outputs = await loop.run_in_executor(self.executor, self.run_batch, flat, group['kwargs'])
+        except Exception as e:
+            logger.error(f"❌ Ошибка пакетного вызова {self.name}: {e}")
+            for _, future in group['items']:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.busy_seconds += time.time() - started
+
+        self.batches += 1
+        self.items += len(flat)
+
+        offset = 0
+        for inputs, future in group['items']:
+            if not future.done():
+                future.set_result(outputs[offset:offset + len(inputs)])
+            offset += len(inputs)
+
+    def get_stats(self):
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0,
+            'busy_seconds': round(self.busy_seconds, 2),
+            'pending': sum(group['size'] for group in self.pending.values())
+        }
+
+
+class InferenceServer:
+    """Локальный сервер инференса: модели грузятся один раз на машину"""
+
+    def __init__(self, max_batch=64, max_wait_ms=10):
+        # Регистрация загрузчиков; сами модели поднимаются по первому запросу
+        from neural_analyzer import NeuralNewsAnalyzer
+        self.models = get_model_manager()
+        self.analyzer = NeuralNewsAnalyzer(self.models)
+
+        batch_sizes = {'embedding': max_batch, 'sentiment': max_batch, 'ner': max_batch // 2, 'generator': 4}
+        self.coalescers = {
+            name: RequestCoalescer(name, self._runner(name), max_batch=size, max_wait_ms=max_wait_ms)
+            for name, size in batch_sizes.items()
+        }
+
+    def _runner(self, name):
+        def run_batch(inputs, kwargs):
+            model = self.models.get(name)
+            if model is None:
+                raise RuntimeError(f"модель {name} недоступна")
+
+            if name == 'embedding':
+                vectors = model.encode(
+                    inputs,
+                    batch_size=kwargs.get('batch_size', 64),
+                    normalize_embeddings=kwargs.get('normalize_embeddings', False),
+                    convert_to_numpy=True,
+                    show_progress_bar=False
+                ).astype(np.float32)
+                return list(vectors)
+
+            outputs = model(inputs, **kwargs)
+            if len(inputs) == 1 and len(outputs) != 1:
+                # pipeline([x]) у генерации и NER может вернуть результаты без обертки
+                outputs = [outputs]
+            return outputs
+
+        return run_batch
+
+    async def handle_model(self, request):
+        name = request.match_info['name']
+        coalescer = self.coalescers.get(name)
+        if coalescer is None or not self.models.is_registered(name):
+            return web.json_response({'error': f'unknown model {name}'}, status=404)
+
+        payload = await request.json()
+        inputs = payload.get('inputs') or []
+        kwargs = decode_payload(payload.get('kwargs') or {})
+        if not inputs:
+            return web.json_response({'outputs': []})
+
+        key = tuple(sorted((k, repr(v)) for k, v in kwargs.items()))
+        try:
+            outputs = await coalescer.submit(inputs, key, kwargs)
+        except Exception as e:
+            return web.json_response({'error': str(e)}, status=503)
+
+        return web.json_response({'outputs': encode_payload(outputs)})
+
+    async def handle_status(self, request):
+        return web.json_response({
+            'models_loaded': self.analyzer.models_loaded,
+            'device': str(self.analyzer.device),
+            'models': self.models.status(),
+            'coalescing': {name: c.get_stats() for name, c in self.coalescers.items()}
+        })
+
+    async def handle_preload(self, request):
+        loop = asyncio.get_running_loop()
+        names = (await request.json()).get('models') or list(self.coalescers)
+        await loop.run_in_executor(None, self.analyzer.preload, names)
+        return await self.handle_status(request)
+
+    def create_app(self):
+        app = web.Application(client_max_size=32 * 1024 * 1024)
+        app.router.add_post('/models/{name}', self.handle_model)
+        app.router.add_get('/status', self.handle_status)
+        app.router.add_post('/preload', self.handle_preload)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальный сервер инференса для веб-воркеров и фоновых воркеров')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-batch', type=int, default=64, help='Максимальный размер склеенного пакета')
+    parser.add_argument('--max-wait-ms', type=int, default=10, help='Сколько ждать попутные запросы, мс')
+    args = parser.parse_args()
+
+    server = InferenceServer(max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    logger.info(f"🧠 Сервер инференса: http://{args.host}:{args.port}")
+    web.run_app(server.create_app(), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
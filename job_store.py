@@ -0,0 +1,439 @@
+import logging
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+ARTICLE_COLUMNS = 'id, source_name, title, url, content, published_at, importance_score, duplicate_of'
+
+
+def decayed_priority(importance, published_ts, now, recency_weight=0.3, half_life_hours=6):
+    """Приоритет обработки на момент now: важность плюс затухающий бонус свежести.
+
+    Считается при захвате (SQL-функция job_priority), поэтому в базе хранятся
+    только важность и время публикации, и старые задачи бонус теряют сами.
+    """
+    importance = importance or 0.5
+    if not published_ts:
+        return importance
+
+    age_hours = max((now - published_ts) / 3600, 0)
+    return importance + recency_weight * math.pow(2, -age_hours / half_life_hours)
+
+
+def job_inputs(article):
+    """(importance, published_ts) статьи для ai_jobs"""
+    published_at = article.get('published_at')
+    if isinstance(published_at, str):
+        try:
+            published_at = datetime.fromisoformat(published_at)
+        except ValueError:
+            published_at = None
+    return article.get('importance_score', 0.5) or 0.5, published_at.timestamp() if published_at else None
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+class JobStore:
+    """Персистентная очередь нейросетевой обработки в таблице ai_jobs.
+
+    Одна строка на статью (повторная постановка только поднимает важность
+    ожидающей задачи); очередность - decayed_priority на момент захвата.
+    Воркер - поток веб-процесса или отдельный процесс - захватывает задачи
+    в транзакции BEGIN IMMEDIATE и получает аренду на lease_seconds; задача с истекшей арендой (воркер упал) снова доступна.
+    После max_attempts неудачных попыток задача переходит в failed.
+
+    Очередь ограничена max_pending ожидающими задачами: при заполнении новая
+    статья принимается, только если она важнее самой неважной ожидающей -
+    та вытесняется, иначе новая отклоняется ('rejected', в UI - 'deferred').
+    Счетчики постановок, повторов, отклонений и вытеснений - в ai_job_counters,
+    общие для всех процессов (повторы и отклонения без постановки копятся в
+    процессе до ближайшей записи, чтобы опрос UI не брал блокировку).
+    Выполненные задачи старше retention_days удаляются.
+
+    Статусы: pending -> leased -> done | failed.
+    """
+
+    def __init__(self, db_path="data/news.db", lease_seconds=600, max_attempts=3, max_pending=None,
+                 retention_days=None, prune_interval=3600):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.max_pending = max_pending or int(os.environ.get('RADAR_JOB_MAX_PENDING', 500))
+        self.retention_days = retention_days or float(os.environ.get('RADAR_JOB_RETENTION_DAYS', 7))
+        self.prune_interval = prune_interval
+        self._pruned_at = 0
+        self._counters = {}
+        self._counters_lock = threading.Lock()
+        self._setup_database()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA busy_timeout = 30000')
+        conn.create_function('job_priority', 3, decayed_priority, deterministic=True)
+        return conn
+
+    def _setup_database(self):
+        try:
+            conn = self._connect()
+            # WAL: читатели не блокируют захват задач воркерами
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS ai_jobs (
+                    article_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    importance REAL DEFAULT 0.5,
+                    published_ts REAL,
+                    attempts INTEGER DEFAULT 0,
+                    lease_owner TEXT,
+                    lease_expires REAL,
+                    model_version TEXT,
+                    last_error TEXT,
+                    enqueued_at REAL,
+                    updated_at REAL,
+                    finished_at REAL
+                )
+            ''')
+            columns = [column[1] for column in conn.execute("PRAGMA table_info(ai_jobs)")]
+            if 'importance' not in columns:
+                # Старая схема хранила готовый приоритет: берем его как важность
+                conn.execute("ALTER TABLE ai_jobs ADD COLUMN importance REAL DEFAULT 0.5")
+                conn.execute("ALTER TABLE ai_jobs ADD COLUMN published_ts REAL")
+                conn.execute("UPDATE ai_jobs SET importance = MIN(priority, 1.0)")
+                conn.execute("DROP INDEX IF EXISTS idx_ai_jobs_claim")
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_ai_jobs_status
+                ON ai_jobs(status)
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS ai_job_counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER DEFAULT 0
+                )
+            ''')
+            conn.close()
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания таблицы задач: {e}")
+
+    def enqueue_many(self, articles):
+        """Ставит статьи в очередь; возвращает {article_id: статус задачи или 'rejected'}"""
+        if not articles:
+            return {}
+
+        now = time.time()
+        inputs = {article['id']: job_inputs(article) for article in articles}
+        priorities = {article_id: decayed_priority(*values, now) for article_id, values in inputs.items()}
+        article_ids = list(priorities)
+        placeholders = ','.join('?' * len(article_ids))
+
+        conn = self._connect()
+        try:
+            # Опрос UI обычно ставит уже известные статьи: сначала чтение без блокировки записи
+            existing = {article_id: (status, importance) for article_id, status, importance in conn.execute(
+                f"SELECT article_id, status, importance FROM ai_jobs WHERE article_id IN ({placeholders})", article_ids
+            )}
+            counters = {
+                'dedup_hits': sum(1 for status, _ in existing.values() if status in ('pending', 'leased')),
+                'enqueued_total': 0, 'rejected': 0, 'evicted': 0
+            }
+            raised = [article_id for article_id, (status, importance) in existing.items()
+                      if status == 'pending' and (importance or 0) < inputs[article_id][0]]
+            new_ids = [article_id for article_id in article_ids if article_id not in existing]
+
+            if new_ids:
+                # Заведомо не проходящие в заполненную очередь отклоняем тоже без записи
+                depth, lowest = conn.execute(
+                    "SELECT COUNT(*), MIN(job_priority(importance, published_ts, ?)) FROM ai_jobs WHERE status = 'pending'",
+                    (now,)
+                ).fetchone()
+                if depth >= self.max_pending:
+                    admitted = [article_id for article_id in new_ids
+                                if lowest is not None and priorities[article_id] > lowest]
+                    counters['rejected'] += len(new_ids) - len(admitted)
+                    new_ids = admitted
+
+            if not new_ids and not raised:
+                self._add_counters(counters)
+                statuses = {article_id: status for article_id, (status, _) in existing.items()}
+            else:
+                statuses = self._write_jobs(conn, new_ids, raised, inputs, priorities, counters, now)
+                statuses.update((article_id, status) for article_id, (status, _) in existing.items()
+                                if article_id not in statuses)
+
+            # Отклоненные и вытесненные этой же пачкой
+            for article_id in article_ids:
+                statuses.setdefault(article_id, 'rejected')
+            return statuses
+        finally:
+            conn.close()
+
+    def _write_jobs(self, conn, new_ids, raised, inputs, priorities, counters, now):
+        """Запись постановки в транзакции BEGIN IMMEDIATE; возвращает статусы записанных id"""
+        with self._counters_lock:
+            counters = {name: value + self._counters.get(name, 0) for name, value in counters.items()}
+            self._counters = {}
+
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            # Между чтением и блокировкой статью мог поставить другой процесс
+            placeholders = ','.join('?' * len(new_ids))
+            taken = {row[0] for row in conn.execute(
+                f"SELECT article_id FROM ai_jobs WHERE article_id IN ({placeholders})", new_ids
+            )} if new_ids else set()
+
+            # Повторная постановка только поднимает важность ожидающей задачи (пересчет по сюжетам)
+            conn.executemany('''
+                UPDATE ai_jobs SET importance = ?, updated_at = ?
+                WHERE article_id = ? AND status = 'pending' AND importance < ?
+            ''', [(inputs[article_id][0], now, article_id, inputs[article_id][0]) for article_id in raised])
+
+            # Новые - по убыванию приоритета, пока есть место или есть кого вытеснить
+            depth = conn.execute("SELECT COUNT(*) FROM ai_jobs WHERE status = 'pending'").fetchone()[0]
+            for article_id in sorted(set(new_ids) - taken, key=priorities.get, reverse=True):
+                priority = priorities[article_id]
+                if depth >= self.max_pending:
+                    lowest = conn.execute('''
+                        SELECT article_id, job_priority(importance, published_ts, ?) AS priority
+                        FROM ai_jobs WHERE status = 'pending'
+                        ORDER BY priority LIMIT 1
+                    ''', (now,)).fetchone()
+                    if not lowest or priority <= lowest[1]:
+                        counters['rejected'] += 1
+                        continue
+                    conn.execute("DELETE FROM ai_jobs WHERE article_id = ?", (lowest[0],))
+                    counters['evicted'] += 1
+                    depth -= 1
+                conn.execute('''
+                    INSERT INTO ai_jobs (article_id, status, importance, published_ts, enqueued_at, updated_at)
+                    VALUES (?, 'pending', ?, ?, ?, ?)
+                ''', (article_id, *inputs[article_id], now, now))
+                counters['enqueued_total'] += 1
+                depth += 1
+
+            conn.executemany('''
+                INSERT INTO ai_job_counters (name, value) VALUES (?, ?)
+                ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+            ''', [item for item in counters.items() if item[1]])
+            conn.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            self._add_counters(counters)
+            raise
+
+        written = new_ids + raised
+        placeholders = ','.join('?' * len(written))
+        return dict(conn.execute(
+            f"SELECT article_id, status FROM ai_jobs WHERE article_id IN ({placeholders})", written
+        ).fetchall())
+
+    def _add_counters(self, counters):
+        """Счетчики без записи в базу копятся в процессе до ближайшей транзакции постановки"""
+        with self._counters_lock:
+            for name, value in counters.items():
+                if value:
+                    self._counters[name] = self._counters.get(name, 0) + value
+
+    def enqueue(self, article):
+        return self.enqueue_many([article]).get(article['id'])
+
+    def claim(self, worker_id=None, limit=1):
+        """Атомарно захватывает до limit задач: список статей (dict) из raw_articles"""
+        worker_id = worker_id or default_worker_id()
+        now = time.time()
+
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+
+            # Аренды упавших воркеров: исчерпавшие попытки - в failed, остальные снова в работу
+            conn.execute('''
+                UPDATE ai_jobs SET status = 'failed', lease_owner = NULL, finished_at = ?,
+                    last_error = COALESCE(last_error, 'lease expired')
+                WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?
+            ''', (now, now, self.max_attempts))
+
+            cursor = conn.execute('''
+                SELECT article_id FROM ai_jobs
+                WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+                ORDER BY job_priority(importance, published_ts, ?) DESC
+                LIMIT ?
+            ''', (now, now, limit))
+            article_ids = [row[0] for row in cursor.fetchall()]
+
+            if article_ids:
+                conn.executemany('''
+                    UPDATE ai_jobs SET status = 'leased', lease_owner = ?, lease_expires = ?,
+                        attempts = attempts + 1, updated_at = ?
+                    WHERE article_id = ?
+                ''', [(worker_id, now + self.lease_seconds, now, article_id) for article_id in article_ids])
+            conn.execute('COMMIT')
+
+            if not article_ids:
+                self.prune_if_due(now)
+                return []
+
+            placeholders = ','.join('?' * len(article_ids))
+            cursor = conn.execute(
+                f"SELECT {ARTICLE_COLUMNS} FROM raw_articles WHERE id IN ({placeholders})", article_ids)
+            articles = {row[0]: {
+                'id': row[0],
+                'source_name': row[1],
+                'title': row[2],
+                'url': row[3],
+                'content': row[4] or '',
+                'published_at': datetime.fromisoformat(row[5]) if row[5] else datetime.now(),
+                'importance_score': row[6] or 0.5,
+                'duplicate_of': row[7]
+            } for row in cursor.fetchall()}
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+        missing = [article_id for article_id in article_ids if article_id not in articles]
+        for article_id in missing:
+            self.fail(article_id, worker_id, 'article not found', retry=False)
+
+        return [articles[article_id] for article_id in article_ids if article_id in articles]
+
+    def extend_lease(self, article_id, worker_id):
+        """Продление аренды для долгой обработки; False - аренда уже потеряна"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute('''
+                UPDATE ai_jobs SET lease_expires = ?, updated_at = ?
+                WHERE article_id = ? AND status = 'leased' AND lease_owner = ?
+            ''', (now + self.lease_seconds, now, article_id, worker_id))
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def complete(self, article_id, worker_id, model_version=None):
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute('''
+                UPDATE ai_jobs SET status = 'done', lease_owner = NULL, lease_expires = NULL,
+                    model_version = ?, last_error = NULL, updated_at = ?, finished_at = ?
+                WHERE article_id = ? AND lease_owner = ?
+            ''', (model_version, now, now, article_id, worker_id))
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def fail(self, article_id, worker_id, error, retry=True):
+        """Неудачная попытка: задача возвращается в pending, пока есть попытки"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute('''
+                UPDATE ai_jobs SET
+                    status = CASE WHEN ? AND attempts < ? THEN 'pending' ELSE 'failed' END,
+                    lease_owner = NULL, lease_expires = NULL,
+                    last_error = ?, updated_at = ?,
+                    finished_at = CASE WHEN ? AND attempts < ? THEN NULL ELSE ? END
+                WHERE article_id = ? AND lease_owner = ?
+            ''', (retry, self.max_attempts, str(error)[:500], now, retry, self.max_attempts, now,
+                  article_id, worker_id))
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def requeue(self, status='failed', model_version=None):
+        """Возвращает в очередь упавшие задачи или обработанные другой версией моделей"""
+        conn = self._connect()
+        try:
+            if model_version is not None:
+                cursor = conn.execute('''
+                    UPDATE ai_jobs SET status = 'pending', attempts = 0, updated_at = ?
+                    WHERE status = 'done' AND model_version IS NOT ?
+                ''', (time.time(), model_version))
+            else:
+                cursor = conn.execute('''
+                    UPDATE ai_jobs SET status = 'pending', attempts = 0, last_error = NULL, updated_at = ?
+                    WHERE status = ?
+                ''', (time.time(), status))
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    def prune(self, days=None):
+        """Удаляет выполненные задачи старше days дней (по умолчанию retention_days)"""
+        cutoff = time.time() - (days or self.retention_days) * 86400
+        conn = self._connect()
+        try:
+            cursor = conn.execute("DELETE FROM ai_jobs WHERE status = 'done' AND finished_at < ?", (cutoff,))
+            if cursor.rowcount:
+                logger.info(f"🧹 Удалено выполненных задач: {cursor.rowcount}")
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    def prune_if_due(self, now=None):
+        """Чистка не чаще prune_interval (вызывается воркерами в простое)"""
+        now = now or time.time()
+        if now - self._pruned_at < self.prune_interval:
+            return 0
+        self._pruned_at = now
+        try:
+            return self.prune()
+        except Exception as e:
+            logger.error(f"❌ Ошибка чистки задач: {e}")
+            return 0
+
+    def get_stats(self):
+        now = time.time()
+        stats = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        try:
+            conn = self._connect()
+            for status, count in conn.execute("SELECT status, COUNT(*) FROM ai_jobs GROUP BY status"):
+                stats[status] = count
+
+            oldest, expired, workers = conn.execute('''
+                SELECT
+                    (SELECT MIN(enqueued_at) FROM ai_jobs WHERE status = 'pending'),
+                    (SELECT COUNT(*) FROM ai_jobs WHERE status = 'leased' AND lease_expires < ?),
+                    (SELECT COUNT(DISTINCT lease_owner) FROM ai_jobs WHERE status = 'leased' AND lease_expires >= ?)
+            ''', (now, now)).fetchone()
+            stats['versions'] = dict(conn.execute(
+                "SELECT COALESCE(model_version, ''), COUNT(*) FROM ai_jobs WHERE status = 'done' GROUP BY model_version"
+            ).fetchall())
+            counters = dict(conn.execute("SELECT name, value FROM ai_job_counters").fetchall())
+            conn.close()
+            with self._counters_lock:
+                for name, value in self._counters.items():
+                    counters[name] = counters.get(name, 0) + value
+
+            stats['max_pending'] = self.max_pending
+            for name in ('enqueued_total', 'dedup_hits', 'rejected', 'evicted'):
+                stats[name] = counters.get(name, 0)
+
+            stats['oldest_pending_seconds'] = round(now - oldest, 1) if oldest else 0
+            stats['expired_leases'] = expired
+            stats['active_workers'] = workers
+        except Exception as e:
+            logger.error(f"❌ Ошибка статистики задач: {e}")
+        return stats
+
+
+_job_store = None
+_job_store_lock = threading.Lock()
+
+
+def get_job_store(db_path="data/news.db"):
+    """Общая для процесса очередь задач (состояние - в базе, объект без кэша)"""
+    global _job_store
+    with _job_store_lock:
+        if _job_store is None:
+            _job_store = JobStore(db_path)
+        return _job_store
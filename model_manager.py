@@ -0,0 +1,234 @@
+import gc
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ModelManager:
+    """Процессный реестр нейросетевых моделей.
+
+    Каждая модель регистрируется как загрузчик и поднимается только при первом
+    обращении. Экземпляры общие для всех потребителей процесса, реестр следит
+    за бюджетом памяти (вытесняет давно не использованные модели) и выгружает
+    модели, простаивающие дольше idle_timeout секунд.
+    """
+
+    def __init__(self, memory_budget_mb=None, idle_timeout=None, check_interval=60):
+        if memory_budget_mb is None:
+            memory_budget_mb = float(os.environ.get('RADAR_MODEL_MEMORY_MB', 4096))
+        if idle_timeout is None:
+            idle_timeout = float(os.environ.get('RADAR_MODEL_IDLE_SECONDS', 1800))
+
+        self.memory_budget_mb = memory_budget_mb
+        self.idle_timeout = idle_timeout  # 0 - не выгружать по простою
+        self.check_interval = check_interval
+
+        self._loaders = {}
+        self._models = {}
+        self._failed = {}
+        self._lock = threading.RLock()
+        self._load_locks = {}
+        self._janitor = None
+
+    def register(self, name, loader, size_hint_mb=None, pinned=False):
+        """Регистрация загрузчика модели (повторная регистрация игнорируется)"""
+        with self._lock:
+            if name in self._loaders:
+                return
+            self._loaders[name] = {
+                'loader': loader,
+                'size_hint_mb': size_hint_mb,
+                'pinned': pinned
+            }
+            self._load_locks[name] = threading.Lock()
+
+    def is_registered(self, name):
+        return name in self._loaders
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def get(self, name):
+        """Возвращает модель, загружая её при первом обращении"""
+        entry = self._models.get(name)
+        if entry:
+            entry['last_used'] = time.time()
+            entry['uses'] += 1
+            return entry['model']
+
+        if name not in self._loaders:
+            logger.warning(f"⚠️ Модель не зарегистрирована: {name}")
+            return None
+
+        if name in self._failed:
+            return None
+
+        # Отдельная блокировка на модель: параллельные запросы ждут одну загрузку
+        with self._load_locks[name]:
+            entry = self._models.get(name)
+            if entry:
+                entry['last_used'] = time.time()
+                entry['uses'] += 1
+                return entry['model']
+
+            spec = self._loaders[name]
+            if spec['size_hint_mb']:
+                self._ensure_budget(spec['size_hint_mb'], exclude=name)
+
+            try:
+                logger.info(f"🔄 Ленивая загрузка модели: {name}")
+                started = time.time()
+                model = spec['loader']()
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось загрузить модель {name}: {e}")
+                self._failed[name] = str(e)
+                return None
+
+            size_mb = self._estimate_size_mb(model) or spec['size_hint_mb'] or 0
+            now = time.time()
+            with self._lock:
+                self._models[name] = {
+                    'model': model,
+                    'size_mb': size_mb,
+                    'loaded_at': now,
+                    'last_used': now,
+                    'uses': 1,
+                    'pinned': spec['pinned']
+                }
+            logger.info(f"✅ Модель {name} загружена за {now - started:.1f}с (~{size_mb:.0f} МБ)")
+
+            self._ensure_budget(0, exclude=name)
+            self._start_janitor()
+            return model
+
+    def unload(self, name):
+        """Выгрузка модели из реестра"""
+        with self._lock:
+            entry = self._models.pop(name, None)
+        if not entry:
+            return False
+
+        del entry
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+        logger.info(f"🧹 Модель {name} выгружена")
+        return True
+
+    def reset_failures(self, name=None):
+        """Разрешает повторную попытку загрузки ранее упавших моделей"""
+        with self._lock:
+            if name:
+                self._failed.pop(name, None)
+            else:
+                self._failed.clear()
+
+    def evict_idle(self):
+        """Выгружает модели, простаивающие дольше idle_timeout"""
+        if not self.idle_timeout:
+            return []
+
+        now = time.time()
+        with self._lock:
+            idle = [
+                name for name, entry in self._models.items()
+                if not entry['pinned'] and now - entry['last_used'] > self.idle_timeout
+            ]
+
+        for name in idle:
+            self.unload(name)
+        return idle
+
+    def loaded_size_mb(self):
+        with self._lock:
+            return sum(entry['size_mb'] for entry in self._models.values())
+
+    def _ensure_budget(self, incoming_mb, exclude=None):
+        """Вытесняет давно не использованные модели, пока не уложимся в бюджет"""
+        if not self.memory_budget_mb:
+            return
+
+        while self.loaded_size_mb() + incoming_mb > self.memory_budget_mb:
+            with self._lock:
+                candidates = [
+                    (entry['last_used'], name) for name, entry in self._models.items()
+                    if name != exclude and not entry['pinned']
+                ]
+            if not candidates:
+                logger.warning(
+                    f"⚠️ Бюджет памяти моделей превышен: "
+                    f"{self.loaded_size_mb() + incoming_mb:.0f}/{self.memory_budget_mb:.0f} МБ"
+                )
+                return
+            _, victim = min(candidates)
+            self.unload(victim)
+
+    def _estimate_size_mb(self, model):
+        """Оценка памяти модели по параметрам и буферам torch"""
+        module = getattr(model, 'model', model)  # pipeline хранит модель в .model
+        try:
+            total = 0
+            for tensor in list(module.parameters()) + list(module.buffers()):
+                total += tensor.numel() * tensor.element_size()
+            return total / (1024 * 1024)
+        except Exception:
+            return 0
+
+    def _start_janitor(self):
+        """Фоновый поток для выгрузки простаивающих моделей"""
+        if not self.idle_timeout or (self._janitor and self._janitor.is_alive()):
+            return
+
+        def janitor():
+            while True:
+                time.sleep(self.check_interval)
+                try:
+                    self.evict_idle()
+                except Exception as e:
+                    logger.error(f"❌ Ошибка выгрузки моделей: {e}")
+
+        self._janitor = threading.Thread(target=janitor, daemon=True)
+        self._janitor.start()
+
+    def status(self):
+        """Состояние реестра для API"""
+        now = time.time()
+        with self._lock:
+            models = {}
+            for name in self._loaders:
+                entry = self._models.get(name)
+                models[name] = {
+                    'loaded': entry is not None,
+                    'size_mb': round(entry['size_mb'], 1) if entry else 0,
+                    'idle_seconds': round(now - entry['last_used'], 1) if entry else None,
+                    'uses': entry['uses'] if entry else 0,
+                    'error': self._failed.get(name)
+                }
+
+        return {
+            'memory_budget_mb': self.memory_budget_mb,
+            'memory_used_mb': round(self.loaded_size_mb(), 1),
+            'idle_timeout': self.idle_timeout,
+            'models': models
+        }
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_model_manager():
+    """Общий для процесса реестр моделей"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ModelManager()
+        return _manager
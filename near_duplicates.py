@@ -0,0 +1,205 @@
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_NON_WORD_RE = re.compile(r'[^\w\s]+')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """Нормализация перед шинглированием: без HTML, пунктуации, регистра и ё"""
+    text = _TAG_RE.sub(' ', text or '').lower().replace('ё', 'е')
+    text = _NON_WORD_RE.sub(' ', text)
+    return _SPACE_RE.sub(' ', text).strip()
+
+
+def shingles(text, size=5):
+    """Символьные шинглы: устойчивы к мелким правкам слов и порядку знаков"""
+    if len(text) <= size:
+        return [text] if text else []
+    return [text[i:i + size] for i in range(len(text) - size + 1)]
+
+
+def simhash(text, size=5):
+    """64-битный SimHash по шинглам нормализованного текста"""
+    features = shingles(normalize_text(text), size)
+    if not features:
+        return 0
+
+    digests = b''.join(hashlib.blake2b(f.encode('utf-8'), digest_size=8).digest() for f in features)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(-1, 8), axis=1)
+    weights = bits.sum(axis=0).astype(np.int64) * 2 - len(features)
+    fingerprint = np.packbits(weights > 0)
+    return int.from_bytes(fingerprint.tobytes(), 'big')
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class NearDuplicateDetector:
+    """Поиск почти-дубликатов (перепечатки, слегка отредактированные заголовки).
+
+    SimHash заголовка и начала текста раскладывается на bands полос по 64/bands
+    бит; отпечатки, отличающиеся не более чем на bands-1 бит, гарантированно
+    совпадают хотя бы в одной полосе. Индекс полос хранится в памяти и
+    ограничен скользящим окном window_hours; перед каждым прогоном в него
+    дочитываются статьи, сохраненные с прошлого раза (в т.ч. другим процессом).
+    """
+
+    def __init__(self, db_path="data/news.db", window_hours=48, max_distance=7, bands=8, overlap_minutes=30):
+        self.db_path = db_path
+        self.window = timedelta(hours=window_hours)
+        # Статьи пишутся в базу позже времени сбора: дочитываем с перекрытием
+        self.overlap = timedelta(minutes=overlap_minutes)
+        self.max_distance = max_distance
+        self.bands = bands
+        self.band_bits = 64 // bands
+        self.band_mask = (1 << self.band_bits) - 1
+
+        self.buckets = {}
+        self.entries = deque()
+        self.known_ids = set()
+        self.duplicates = {}  # id дубликата -> id оригинала
+        self.checked = 0
+        self.duplicates_found = 0
+
+        self._watermark = None  # collected_at последней прочитанной из базы статьи
+        self._lock = threading.Lock()
+
+    def _bands(self, fingerprint):
+        return [(band, (fingerprint >> (band * self.band_bits)) & self.band_mask) for band in range(self.bands)]
+
+    @staticmethod
+    def fingerprint_text(article):
+        content = (article.get('content', '') or '')[:300]
+        return f"{article.get('title', '')} {content}"
+
+    def _add(self, article_id, fingerprint, seen_at):
+        entry = (seen_at, fingerprint, article_id)
+        self.entries.append(entry)
+        self.known_ids.add(article_id)
+        for key in self._bands(fingerprint):
+            self.buckets.setdefault(key, []).append(entry)
+
+    def _expire(self, now):
+        cutoff = now - self.window
+        while self.entries and self.entries[0][0] < cutoff:
+            entry = self.entries.popleft()
+            if entry[1] is None:
+                self.duplicates.pop(entry[2], None)
+                continue
+            self.known_ids.discard(entry[2])
+            for key in self._bands(entry[1]):
+                bucket = self.buckets.get(key)
+                if bucket:
+                    bucket.remove(entry)
+                    if not bucket:
+                        del self.buckets[key]
+
+    def _find(self, fingerprint, article_id):
+        best = None
+        for key in self._bands(fingerprint):
+            for _, candidate, candidate_id in self.buckets.get(key, ()):
+                if candidate_id == article_id:
+                    continue
+                distance = hamming(fingerprint, candidate)
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (candidate_id, distance)
+        return best
+
+    def warm_up(self):
+        """Дочитывает в окно оригиналы из базы, сохраненные после прошлого чтения"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            since_time = datetime.now() - self.window
+            if self._watermark is not None:
+                since_time = max(since_time, self._watermark - self.overlap)
+            cursor.execute('''
+                SELECT id, title, content, collected_at FROM raw_articles
+                WHERE collected_at >= ? AND duplicate_of IS NULL
+                ORDER BY collected_at
+            ''', (since_time.isoformat(),))
+            rows = cursor.fetchall()
+            conn.close()
+
+            added = 0
+            for article_id, title, content, collected_at in rows:
+                seen_at = datetime.fromisoformat(collected_at)
+                self._watermark = max(self._watermark or seen_at, seen_at)
+                if article_id in self.known_ids or article_id in self.duplicates:
+                    continue
+                fingerprint = simhash(self.fingerprint_text({'title': title, 'content': content}))
+                self._add(article_id, fingerprint, seen_at)
+                added += 1
+
+            if added:
+                logger.info(f"✅ Детектор дубликатов: из базы добавлено {added} статей")
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось прогреть детектор дубликатов: {e}")
+
+    def flag_duplicates(self, articles):
+        """Помечает почти-дубликаты полем duplicate_of; оригиналы добавляет в индекс"""
+        with self._lock:
+            self.warm_up()
+
+            now = datetime.now()
+            self._expire(now)
+
+            flagged = 0
+            for article in articles:
+                article_id = article['id']
+                if article_id in self.duplicates:
+                    # Повторно встреченный дубликат сохраняет пометку
+                    article['duplicate_of'] = self.duplicates[article_id]
+                    continue
+                if article_id in self.known_ids:
+                    continue
+
+                fingerprint = simhash(self.fingerprint_text(article))
+                self.checked += 1
+                match = self._find(fingerprint, article_id)
+
+                if match:
+                    article['duplicate_of'] = match[0]
+                    article['duplicate_distance'] = match[1]
+                    # Дубликат в полосы не попадает, но помним его id до конца окна
+                    self.entries.append((article.get('collected_at') or now, None, article_id))
+                    self.duplicates[article_id] = match[0]
+                    flagged += 1
+                else:
+                    self._add(article_id, fingerprint, article.get('collected_at') or now)
+
+            self.duplicates_found += flagged
+            return flagged
+
+    def get_stats(self):
+        return {
+            'window_entries': len(self.entries),
+            'buckets': len(self.buckets),
+            'checked': self.checked,
+            'duplicates_found': self.duplicates_found
+        }
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_duplicate_detector(db_path="data/news.db"):
+    """Общий для процесса детектор: окно переживает отдельные прогоны сборщика"""
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            _detector = NearDuplicateDetector(db_path)
+        return _detector
@@ -1,91 +1,132 @@
 import torch
 import numpy as np
 import logging
-from transformers import pipeline
-from sentence_transformers import SentenceTransformer
 import re
+import threading
 from datetime import datetime, timedelta
 import asyncio
+import os
+
+from hotness_engine import get_hotness_engine
+from trend_detector import get_trend_detector
+from model_manager import get_model_manager
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Меняется при замене любой из моделей: задачи с другой версией можно переобработать
+MODEL_VERSION = "minilm-l12-v2+rubert-sentiment+bert-ner-hrl+rugpt3small"
+
 class NeuralNewsAnalyzer:
-    def __init__(self):
+    def __init__(self, model_manager=None):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         logger.info(f"🧠 Инициализация нейросетей на устройстве: {self.device}")
         
+        self.models = model_manager or get_model_manager()
         self.models_loaded = False
-        self.embedding_model = None
-        self.sentiment_model = None
-        self.text_generator = None
-        self.ner_pipeline = None
         
-        self._load_models()
+        self._register_models()
 
-    def _load_models(self):
-        """Загрузка нейросетевых моделей с улучшенной обработкой ошибок"""
+    def _register_models(self):
+        """Регистрация моделей в общем реестре (загрузка - при первом обращении)"""
         try:
-            logger.info("🔄 Загрузка моделей машинного обучения...")
+            pipeline_device = 0 if torch.cuda.is_available() else -1
             
             # 1. Модель для эмбеддингов (легкая и быстрая)
-            self.embedding_model = SentenceTransformer(
-                'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2',
-                device=self.device
-            )
-            logger.info("✅ Модель для эмбеддингов загружена")
-
+            def load_embedding_model():
+                from sentence_transformers import SentenceTransformer
+                return SentenceTransformer(
+                    'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2',
+                    device=self.device
+                )
+            
             # 2. Модель для анализа тональности
-            try:
-                self.sentiment_model = pipeline(
+            def load_sentiment_model():
+                from transformers import pipeline
+                return pipeline(
                     "sentiment-analysis",
                     model="blanchefort/rubert-base-cased-sentiment",
-                    device=0 if torch.cuda.is_available() else -1,
+                    device=pipeline_device,
                 )
-                logger.info("✅ Модель для анализа тональности загружена")
-            except Exception as e:
-                logger.warning(f"⚠️ Не удалось загрузить модель тональности: {e}")
-                self.sentiment_model = None
-
+            
             # 3. NER модель для извлечения сущностей
-            try:
-                self.ner_pipeline = pipeline(
+            def load_ner_pipeline():
+                from transformers import pipeline
+                return pipeline(
                     "ner",
                     model="Davlan/bert-base-multilingual-cased-ner-hrl",
                     aggregation_strategy="simple",
-                    device=0 if torch.cuda.is_available() else -1,
+                    device=pipeline_device,
                 )
-                logger.info("✅ Модель для NER загружена")
-            except Exception as e:
-                logger.warning(f"⚠️ Не удалось загрузить NER модель: {e}")
-                self.ner_pipeline = None
-
-            # 4. Генератор текста (опционально)
-            try:
-                self.text_generator = pipeline(
+            
+            # 4. Генератор текста (самый тяжелый, грузится только под черновики)
+            def load_text_generator():
+                from transformers import pipeline
+                return pipeline(
                     "text-generation",
                     model="sberbank-ai/rugpt3small_based_on_gpt2",
-                    device=0 if torch.cuda.is_available() else -1,
+                    device=pipeline_device,
                 )
-                logger.info("✅ Генератор текста загружен")
-            except Exception as e:
-                logger.warning(f"⚠️ Не удалось загрузить генератор текста: {e}")
-                self.text_generator = None
-
+            
+            self.models.register('embedding', load_embedding_model, size_hint_mb=480)
+            self.models.register('sentiment', load_sentiment_model, size_hint_mb=700)
+            self.models.register('ner', load_ner_pipeline, size_hint_mb=710)
+            self.models.register('generator', load_text_generator, size_hint_mb=530)
+            
             self.models_loaded = True
-            logger.info("🎉 Все модели успешно загружены!")
+            logger.info("✅ Модели зарегистрированы, загрузка - по первому обращению")
 
         except Exception as e:
-            logger.error(f"❌ Критическая ошибка загрузки моделей: {e}")
+            logger.error(f"❌ Критическая ошибка регистрации моделей: {e}")
             self.models_loaded = False
 
+    @property
+    def embedding_model(self):
+        return self.models.get('embedding')
+
+    @property
+    def sentiment_model(self):
+        return self.models.get('sentiment')
+
+    @property
+    def ner_pipeline(self):
+        return self.models.get('ner')
+
+    @property
+    def text_generator(self):
+        return self.models.get('generator')
+
+    def preload(self, names=('embedding', 'sentiment', 'ner', 'generator')):
+        """Принудительная загрузка моделей (например, для прогрева воркера)"""
+        for name in names:
+            self.models.get(name)
+
+    def embed_texts(self, texts, batch_size=64):
+        """Пакетное построение нормированных эмбеддингов (float32) или None"""
+        embedding_model = self.embedding_model if texts else None
+        if not embedding_model:
+            return None
+
+        try:
+            return embedding_model.encode(
+                list(texts),
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            ).astype(np.float32)
+        except Exception as e:
+            logger.error(f"Ошибка построения эмбеддингов: {e}")
+            return None
+
     async def analyze_sentiment(self, text):
         """Анализ тональности текста"""
-        if not self.sentiment_model or not text:
+        sentiment_model = self.sentiment_model if text else None
+        if not sentiment_model:
             return await self._fallback_sentiment(text)
         
         try:
-            result = self.sentiment_model(text[:512])[0]
+            result = sentiment_model(text[:512])[0]
             
             sentiment_map = {
                 'POSITIVE': 'positive',
@@ -128,12 +169,13 @@ class NeuralNewsAnalyzer:
 
     async def extract_entities_ner(self, text):
         """Извлечение сущностей с помощью NER"""
-        if not self.ner_pipeline or not text:
+        ner_pipeline = self.ner_pipeline if text else None
+        if not ner_pipeline:
             return await self._fallback_entities(text)
         
         try:
             truncated_text = text[:1000]
-            entities = self.ner_pipeline(truncated_text)
+            entities = ner_pipeline(truncated_text)
             
             organized_entities = {
                 'organizations': [],
@@ -207,59 +249,18 @@ class NeuralNewsAnalyzer:
             'misc': []
         }
 
-    async def analyze_importance(self, title, content, source_name):
-        """Анализ важности статьи с использованием нейросетей"""
+    async def analyze_importance(self, title, content, source_name, cluster_size=None):
+        """Анализ важности статьи: тональность от нейросети, остальные признаки - HotnessEngine"""
         try:
             text = f"{title}. {content[:500]}"
             
             # Анализ тональности
             sentiment_result = await self.analyze_sentiment(text)
             
-            # Базовый скоринг на основе различных факторов
-            base_score = 0.3
-            
-            # Фактор источника
-            source_weights = {
-                'reuters': 0.9, 'bloomberg': 0.95, 'financial times': 0.9,
-                'рбк': 0.85, 'коммерсант': 0.8, 'ведомости': 0.8,
-                'цб': 1.0, 'ecb': 0.9, 'imf': 0.9, 'world bank': 0.9
-            }
-            
-            for source, weight in source_weights.items():
-                if source in source_name.lower():
-                    base_score = weight
-                    break
-            
-            # Фактор тональности
-            sentiment_boost = {
-                'positive': 0.1,
-                'negative': 0.15,  # Негативные новости часто важнее
-                'neutral': 0.0
-            }
-            base_score += sentiment_boost.get(sentiment_result['sentiment'], 0)
-            
-            # Фактор ключевых слов
-            urgency_indicators = {
-                'срочн': 0.2, 'экстрен': 0.3, 'кризис': 0.25, 'важн': 0.15,
-                'urgent': 0.2, 'breaking': 0.3, 'crisis': 0.25, 'important': 0.15,
-                'санкц': 0.2, 'санкции': 0.2, 'sanction': 0.2,
-                'цб': 0.3, 'central bank': 0.3, 'fed': 0.3
-            }
-            
-            text_lower = text.lower()
-            for indicator, boost in urgency_indicators.items():
-                if indicator in text_lower:
-                    base_score += boost
-                    break
-            
-            # Фактор длины контента (более длинные статьи часто важнее)
-            content_length = len(content)
-            if content_length > 1000:
-                base_score += 0.1
-            elif content_length > 500:
-                base_score += 0.05
-            
-            final_score = min(max(base_score, 0.1), 0.99)
+            article = {'title': title, 'content': content, 'source_name': source_name}
+            final_score = get_hotness_engine().score_one(
+                article, sentiment=sentiment_result['sentiment'], cluster_size=cluster_size
+            )
             
             logger.debug(f"📊 Оценка важности '{title[:30]}...': {final_score:.3f}")
             return final_score
@@ -287,7 +288,8 @@ class NeuralNewsAnalyzer:
 
     async def generate_ai_draft(self, article, entities, importance_score):
         """Генерация черновика с помощью AI"""
-        if not self.text_generator:
+        text_generator = self.text_generator
+        if not text_generator:
             return await self._generate_fallback_draft(article, entities)
         
         try:
@@ -309,7 +311,7 @@ class NeuralNewsAnalyzer:
             Тон: профессиональный, аналитический
             """
             
-            result = self.text_generator(
+            result = text_generator(
                 prompt,
                 max_length=400,
                 num_return_sequences=1,
@@ -446,6 +448,14 @@ class NeuralNewsAnalyzer:
         
         processed_articles = []
         
+        # Размер и скорость сюжетов - те же признаки, что при пересчете сборщика по сюжетам
+        try:
+            from story_clusterer import get_article_story_stats
+            story_stats = get_article_story_stats([article['id'] for article in articles if article.get('id')])
+        except Exception as e:
+            logger.warning(f"⚠️ Признаки сюжетов недоступны: {e}")
+            story_stats = {}
+        
         for article in articles:
             try:
                 full_text = f"{article['title']} {article.get('content', '')}"
@@ -453,16 +463,23 @@ class NeuralNewsAnalyzer:
                 # Извлекаем сущности с помощью NER
                 entities = await self.extract_entities_ner(full_text)
                 
-                # Анализируем важность с помощью нейросети
-                importance = await self.analyze_importance(
-                    article['title'],
-                    article.get('content', ''),
-                    article['source_name']
-                )
-                
                 # Анализируем тональность
                 sentiment = await self.analyze_sentiment(full_text)
                 
+                # Сущности NER -> счетчики трендов, всплеск их упоминаний - признак горячести
+                trends = get_trend_detector()
+                terms = self._flatten_entities(entities)
+                trends.observe([(terms, article.get('published_at'))])
+                burst = trends.burst_scores([terms])[0]
+                
+                # Важность: тональность уже есть, остальные признаки - HotnessEngine (без второго вызова модели).
+                # Без размера сюжета пересчет воркера затер бы оценку сборщика с учетом сюжета
+                story = story_stats.get(article.get('id'), {})
+                importance = get_hotness_engine().score_one(
+                    article, sentiment=sentiment['sentiment'], burst=burst,
+                    cluster_size=story.get('size', 1), velocity=story.get('velocity', 0.0)
+                )
+                
                 # Генерируем AI черновик
                 draft = await self.generate_ai_draft(article, entities, importance)
                 
@@ -492,6 +509,8 @@ class NeuralNewsAnalyzer:
                 logger.error(f"❌ Ошибка обработки статьи: {e}")
                 continue
 
+        get_trend_detector().flush_if_due()
+        
         # Сортируем по важности
         processed_articles.sort(key=lambda x: x['hotness'], reverse=True)
         
@@ -572,12 +591,36 @@ class NeuralNewsAnalyzer:
             return "базовый"
 
     def get_models_status(self):
-        """Получение статуса загруженных моделей"""
+        """Получение статуса моделей (без загрузки незагруженных)"""
         return {
             'models_loaded': self.models_loaded,
-            'embedding_model': self.embedding_model is not None,
-            'sentiment_model': self.sentiment_model is not None,
-            'text_generator': self.text_generator is not None,
-            'ner_pipeline': self.ner_pipeline is not None,
-            'device': str(self.device)
-        }
\ No newline at end of file
+            'embedding_model': self.models.is_loaded('embedding'),
+            'sentiment_model': self.models.is_loaded('sentiment'),
+            'text_generator': self.models.is_loaded('generator'),
+            'ner_pipeline': self.models.is_loaded('ner'),
+            'device': str(self.device),
+            'model_manager': self.models.status()
+        }
+
+
+_shared_analyzer = None
+_shared_lock = threading.Lock()
+
+
+def get_neural_analyzer():
+    """Общий для процесса анализатор (модели в любом случае берутся из реестра).
+
+    Если задан RADAR_INFERENCE_URL, модели не грузятся в процесс: вызовы уходят
+    на сервер инференса (inference_server.py), общий для всех процессов машины.
+    """
+    global _shared_analyzer
+    with _shared_lock:
+        if _shared_analyzer is None:
+            inference_url = os.environ.get('RADAR_INFERENCE_URL')
+            if inference_url:
+                from inference_client import RemoteModelManager
+                _shared_analyzer = NeuralNewsAnalyzer(RemoteModelManager(inference_url))
+                logger.info(f"🔌 Модели обслуживает сервер инференса: {inference_url}")
+            else:
+                _shared_analyzer = NeuralNewsAnalyzer()
+        return _shared_analyzer
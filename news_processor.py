@@ -1,80 +1,119 @@
 import sqlite3
 from datetime import datetime, timedelta
 import hashlib
+import heapq
+import itertools
 import logging
 
+from hotness_engine import get_hotness_engine
+
 logger = logging.getLogger(__name__)
 
 class NewsProcessor:
-    def __init__(self, db_path="data/news.db"):
+    """Конвейер генераторов над курсором: строки -> пачки статей -> оценки -> топ-K.
+
+    Статьи читаются пачками по chunk_size через fetchmany, горячесть
+    считается движком на всю пачку сразу, а наружу выходит только то, что
+    нужно: итератор (iter_scored) или K лучших через ограниченную кучу
+    (top_news). Памяти нужно на одну пачку и K статей, сколько бы часов
+    истории ни запросили.
+    """
+
+    def __init__(self, db_path="data/news.db", chunk_size=500):
         self.db_path = db_path
-    
-    def get_recent_news(self, hours=24, limit=10):
-        """Получение последних новостей из базы"""
+        self.chunk_size = chunk_size
+        self.hotness = get_hotness_engine()
+
+    def iter_articles(self, hours=24, order_by=None, limit=None):
+        """Пачки статей за последние hours часов (published_at - строкой, разбирается по надобности)"""
+        conn = sqlite3.connect(self.db_path)
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             since_time = datetime.now() - timedelta(hours=hours)
-            
-            cursor.execute('''
-                SELECT id, source_name, title, url, content, published_at, collected_at 
-                FROM raw_articles 
+            cursor = conn.execute(f'''
+                SELECT id, source_name, title, url, content, published_at, collected_at
+                FROM raw_articles
                 WHERE published_at >= ? AND is_finance = 1
-                ORDER BY published_at DESC
-                LIMIT ?
-            ''', (since_time.isoformat(), limit))
-            
-            articles = []
-            for row in cursor.fetchall():
-                articles.append({
+                {f'ORDER BY {order_by}' if order_by else ''}
+                {'LIMIT ?' if limit is not None else ''}
+            ''', (since_time.isoformat(),) + ((limit,) if limit is not None else ()))
+
+            while True:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                yield [{
                     'id': row[0],
                     'source_name': row[1],
                     'title': row[2],
                     'url': row[3],
                     'content': row[4],
-                    'published_at': datetime.fromisoformat(row[5]),
-                    'collected_at': datetime.fromisoformat(row[6])
-                })
-            
+                    'published_at': row[5],
+                    'collected_at': row[6]
+                } for row in rows]
+        finally:
             conn.close()
+
+    def iter_scored(self, hours=24, now=None):
+        """Итератор (горячесть, статья) по всем статьям окна"""
+        now = now or datetime.now()
+        for chunk in self.iter_articles(hours):
+            scores = self.hotness.score(chunk, now=now)
+            yield from zip(scores.tolist(), chunk)
+
+    def top_news(self, hours=24, limit=10, now=None):
+        """limit самых горячих статей окна: куча из limit элементов поверх потока"""
+        if limit <= 0:
+            return []
+        counter = itertools.count()  # при равной горячести сравнение не доходит до словарей
+        heap = []
+        for hotness, article in self.iter_scored(hours, now):
+            item = (hotness, next(counter), article)
+            if len(heap) < limit:
+                heapq.heappush(heap, item)
+            elif hotness > heap[0][0]:
+                heapq.heapreplace(heap, item)
+        heap.sort(key=lambda item: (-item[0], item[1]))
+        return [self._format(article, hotness) for hotness, _, article in heap]
+
+    def get_recent_news(self, hours=24, limit=10):
+        """Получение последних новостей из базы"""
+        try:
+            # LIMIT в запросе: SQLite берет первые limit строк по порядку без полной сортировки окна
+            articles = [article for chunk in self.iter_articles(hours, order_by='published_at DESC', limit=max(limit, 0))
+                        for article in chunk]
+            for article in articles:
+                article['published_at'] = self._datetime(article['published_at'])
+                article['collected_at'] = self._datetime(article['collected_at'])
             return articles
         except Exception as e:
             logger.error(f"Ошибка при получении новостей: {e}")
             return []
-    
+
     def calculate_hotness(self, article):
         """Расчет показателя горячести для статьи"""
-        score = 0.5
-        
-        # Веса источников
-        source_scores = {
-            'РБК': 0.9,
-            'Reuters': 0.95,
-            'Коммерсант': 0.85,
-            'Интерфакс': 0.8
+        return float(self.hotness.score([article], now=datetime.now())[0])
+
+    def process_news_batch(self, articles, limit=None):
+        """Обработка батча новостей (limit - оставить только самые горячие)"""
+        # Горячесть всего батча - одним вызовом движка
+        scored = zip(self.hotness.score(articles, now=datetime.now()).tolist(), articles)
+        by_hotness = lambda item: item[0]
+        best = heapq.nlargest(limit, scored, key=by_hotness) if limit else sorted(scored, key=by_hotness, reverse=True)
+        return [self._format(article, hotness) for hotness, article in best]
+
+    @staticmethod
+    def _datetime(value):
+        return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+    def _format(self, article, hotness):
+        # id статьи - уже md5 заголовка и ссылки, повторно хешируем только статьи без id
+        article_id = article.get('id') or hashlib.md5(article['title'].encode()).hexdigest()
+        return {
+            'id': article_id[:8],
+            'headline': article['title'],
+            'hotness': float(hotness),
+            'source': article['source_name'],
+            'url': article['url'],
+            'content': article['content'],
+            'timestamp': self._datetime(article['published_at'])
         }
-        
-        for source, weight in source_scores.items():
-            if source in article['source_name']:
-                score = weight
-                break
-        
-        return min(max(score, 0.1), 0.99)
-    
-    def process_news_batch(self, articles):
-        """Обработка батча новостей"""
-        processed = []
-        
-        for article in articles:
-            processed.append({
-                'id': hashlib.md5(article['title'].encode()).hexdigest()[:8],
-                'headline': article['title'],
-                'hotness': self.calculate_hotness(article),
-                'source': article['source_name'],
-                'url': article['url'],
-                'content': article['content'],
-                'timestamp': article['published_at']
-            })
-        
-        return sorted(processed, key=lambda x: x['hotness'], reverse=True)
\ No newline at end of file
@@ -0,0 +1,215 @@
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+class PageArchive:
+    """Архив загруженных страниц и лент для повторного разбора без сети.
+
+    Тела ответов хранятся сжатыми (gzip) под своим SHA-256:
+    data/archive/ab/cd/<sha256>.gz - одинаковая страница лежит на диске один
+    раз, сколько бы раз ее ни загружали. Индекс page_archive в news.db
+    связывает загрузки (источник, URL, время, прогон) с содержимым. Записи
+    старше retention_days удаляются вместе с файлами, на которые больше
+    никто не ссылается.
+    """
+
+    def __init__(self, root="data/archive", db_path="data/news.db", retention_days=None):
+        if retention_days is None:
+            retention_days = float(os.environ.get('RADAR_ARCHIVE_RETENTION_DAYS', 30))
+
+        self.root = root
+        self.db_path = db_path
+        self.retention_days = retention_days
+        os.makedirs(root, exist_ok=True)
+        self._setup_database()
+
+    def _setup_database(self):
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS page_archive (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sha256 TEXT,
+                    source_name TEXT,
+                    source_type TEXT,
+                    url TEXT,
+                    fetched_at TIMESTAMP,
+                    run_id TEXT,
+                    bytes INTEGER,
+                    stored_bytes INTEGER
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_page_archive_source_time
+                ON page_archive(source_name, fetched_at)
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_page_archive_sha ON page_archive(sha256)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_page_archive_url ON page_archive(url, fetched_at)')
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания индекса архива страниц: {e}")
+
+    def _path(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256[2:4], f"{sha256}.gz")
+
+    def store(self, source, url, body, run_id=None, fetched_at=None):
+        """Сохранение тела ответа; возвращает sha256 содержимого"""
+        sha256 = hashlib.sha256(body).hexdigest()
+        path = self._path(sha256)
+
+        if os.path.exists(path):
+            stored_bytes = os.path.getsize(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Пишем во временный файл и переименовываем: параллельные загрузки не увидят половину файла
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(gzip.compress(body, compresslevel=6))
+            os.replace(temp_path, path)
+            stored_bytes = os.path.getsize(path)
+
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute('''
+                INSERT INTO page_archive
+                (sha256, source_name, source_type, url, fetched_at, run_id, bytes, stored_bytes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (sha256, source['name'], source.get('type'), url,
+                  (fetched_at or datetime.now()).isoformat(), run_id, len(body), stored_bytes))
+            conn.commit()
+        finally:
+            conn.close()
+        return sha256
+
+    def load(self, sha256):
+        with open(self._path(sha256), 'rb') as f:
+            return gzip.decompress(f.read())
+
+    def pages(self, sources=None, since=None, until=None, latest_only=False):
+        """Записи индекса (без содержимого) по источникам и времени загрузки"""
+        query = '''
+            SELECT id, sha256, source_name, source_type, url, fetched_at, run_id, bytes
+            FROM page_archive WHERE 1 = 1
+        '''
+        params = []
+        if sources:
+            query += f" AND source_name IN ({','.join('?' * len(sources))})"
+            params.extend(sources)
+        if since:
+            query += " AND fetched_at >= ?"
+            params.append(since.isoformat() if isinstance(since, datetime) else since)
+        if until:
+            query += " AND fetched_at < ?"
+            params.append(until.isoformat() if isinstance(until, datetime) else until)
+        if latest_only:
+            query += '''
+                AND id IN (SELECT MAX(id) FROM page_archive GROUP BY source_name)
+            '''
+        query += " ORDER BY fetched_at"
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def latest_by_url(self, url, max_age_hours=None):
+        """Последняя сохраненная копия страницы по URL: (тело, fetched_at) или None"""
+        query = "SELECT sha256, fetched_at FROM page_archive WHERE url = ?"
+        params = [url]
+        if max_age_hours is not None:
+            query += " AND fetched_at >= ?"
+            params.append((datetime.now() - timedelta(hours=max_age_hours)).isoformat())
+        query += " ORDER BY fetched_at DESC LIMIT 1"
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute(query, params).fetchone()
+        finally:
+            conn.close()
+        if row is None or not os.path.exists(self._path(row[0])):
+            return None
+        return self.load(row[0]), row[1]
+
+    def prune(self, retention_days=None):
+        """Удаление записей старше срока хранения и файлов без ссылок"""
+        retention_days = self.retention_days if retention_days is None else retention_days
+        cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat()
+
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT DISTINCT sha256 FROM page_archive WHERE fetched_at < ?", (cutoff,))
+            candidates = [row[0] for row in cursor.fetchall()]
+            cursor.execute("DELETE FROM page_archive WHERE fetched_at < ?", (cutoff,))
+            removed_rows = cursor.rowcount
+
+            orphaned = []
+            for sha256 in candidates:
+                cursor.execute("SELECT 1 FROM page_archive WHERE sha256 = ? LIMIT 1", (sha256,))
+                if cursor.fetchone() is None:
+                    orphaned.append(sha256)
+            conn.commit()
+        finally:
+            conn.close()
+
+        for sha256 in orphaned:
+            try:
+                os.remove(self._path(sha256))
+            except FileNotFoundError:
+                pass
+
+        if removed_rows:
+            logger.info(f"🗄️ Архив страниц: удалено записей {removed_rows}, файлов {len(orphaned)}")
+        return {'rows': removed_rows, 'files': len(orphaned)}
+
+    def get_stats(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            pages, unique, raw_bytes, first, last = conn.execute('''
+                SELECT COUNT(*), COUNT(DISTINCT sha256), SUM(bytes), MIN(fetched_at), MAX(fetched_at)
+                FROM page_archive
+            ''').fetchone()
+            stored_bytes = conn.execute('''
+                SELECT SUM(stored_bytes) FROM (SELECT MAX(stored_bytes) AS stored_bytes FROM page_archive GROUP BY sha256)
+            ''').fetchone()[0]
+            sources = dict(conn.execute(
+                "SELECT source_name, COUNT(*) FROM page_archive GROUP BY source_name"
+            ).fetchall())
+        finally:
+            conn.close()
+
+        return {
+            'pages': pages,
+            'unique_pages': unique,
+            'bytes': raw_bytes or 0,
+            'stored_bytes': stored_bytes or 0,
+            'oldest': first,
+            'newest': last,
+            'retention_days': self.retention_days,
+            'sources': sources
+        }
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_page_archive(db_path="data/news.db"):
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = PageArchive(db_path=db_path)
+        return _archive
@@ -1,152 +1,149 @@
-import time
-import schedule
+import argparse
 import logging
-import sys
 import os
-from datetime import datetime
+import random
+import signal
+import sqlite3
+import sys
+import threading
+import time
 
 # Добавляем корневую директорию в путь для импортов
-sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from data_collector import FinanceNewsCollector
+from collection_coordinator import CollectionCoordinator
+
+os.makedirs('data', exist_ok=True)
 
 # Настройка логирования
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('data/collector.log'),
+        logging.FileHandler('data/collector.log', encoding='utf-8'),
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
 
-class AutoNewsCollector:
-    def __init__(self):
-        self.collector = FinanceNewsCollector()
-        self.is_running = False
+# Не просыпаться чаще, даже если срок у источника уже прошел
+MIN_DELAY = 30
+
+
+class CollectorDaemon:
+    """Фоновый сборщик новостей без интерактива (для systemd, supervisor, nssm).
 
-    def collect_news_job(self):
-        """Задача по сбору новостей"""
+    Прогоны идут строго по одному через CollectionCoordinator: постоянный
+    event loop и пул HTTP-соединений, аренда collection в общей базе (сбор
+    из веб-интерфейса и демон не пересекаются), история в collection_runs.
+    Прогон опрашивает только источники, которым подошел срок по адаптивному
+    расписанию; демон просыпается к ближайшему сроку, но не реже чем раз в
+    interval секунд, плюс случайный разброс jitter.
+    """
+
+    def __init__(self, interval=1800, jitter=0.1, hours_back=24, run_timeout=1800, due_only=True):
+        self.interval = interval
+        self.due_only = due_only
+        self.jitter = jitter
+        self.run_timeout = run_timeout
+        self.coordinator = CollectionCoordinator(min_interval=0, hours_back=hours_back)
+        self.stop_event = threading.Event()
+
+    def handle_signal(self, signum, frame):
+        logger.info(f"🛑 Сигнал {signum}: остановка после текущего прогона")
+        self.stop_event.set()
+
+    def install_signal_handlers(self):
+        for name in ('SIGINT', 'SIGTERM', 'SIGBREAK'):
+            if hasattr(signal, name):
+                signal.signal(getattr(signal, name), self.handle_signal)
+
+    def next_delay(self):
+        delay = self.interval
         try:
-            logger.info("🚀 ЗАПУСК АВТОМАТИЧЕСКОГО СБОРА НОВОСТЕЙ")
-            
-            articles = self.collector.collect_news(hours_back=24)
-            
-            logger.info(f"✅ АВТОСБОР ЗАВЕРШЕН. Собрано {len(articles)} финансовых статей")
-            
-            # Логируем статистику
-            self.log_statistics()
-            
+            due_in = self.coordinator.next_due_in()
+            if due_in is not None:
+                delay = min(delay, max(due_in, MIN_DELAY))
         except Exception as e:
-            logger.error(f"❌ ОШИБКА АВТОСБОРА: {e}")
+            logger.error(f"❌ Ошибка чтения расписания источников: {e}")
+        return max(delay * (1 + random.uniform(-self.jitter, self.jitter)), 0)
+
+    def run_once(self):
+        """Один прогон: finished | failed | skipped (идет в другом процессе) | timeout"""
+        result = self.coordinator.trigger(force=True, origin='daemon', due_only=self.due_only)
+        if result['status'] != 'started':
+            logger.info("⏭️ Прогон уже идет в другом процессе, пропускаем")
+            return 'skipped'
+
+        # Ждем с коротким шагом, чтобы сигнал не блокировался на ожидании
+        deadline = time.time() + self.run_timeout
+        while not self.coordinator.wait(1):
+            if time.time() > deadline:
+                logger.error("❌ Прогон не уложился в таймаут")
+                return 'timeout'
+
+        self.log_statistics()
+        return self.coordinator.last_run['state']
+
+    def run_forever(self, initial_delay=0):
+        logger.info(f"⏰ Демон сбора: по расписанию источников, не реже раза в {self.interval}с ±{int(self.jitter * 100)}%")
+        delay = initial_delay
+        while not self.stop_event.wait(delay):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"❌ ОШИБКА АВТОСБОРА: {e}")
+            delay = self.next_delay()
+            logger.info(f"💤 Следующий прогон через {delay / 60:.1f} мин")
+
+    def shutdown(self):
+        self.coordinator.shutdown()
+        logger.info("🛑 ДЕМОН СБОРА ОСТАНОВЛЕН")
 
     def log_statistics(self):
-        """Логирование статистики базы данных"""
+        """Итог последнего прогона и статистика базы"""
         try:
-            import sqlite3
+            last = self.coordinator.get_history(limit=1)
+            if last:
+                run = last[0]
+                logger.info(f"✅ Прогон {run['run_id']}: {run['duration']}с, получено {run['fetched']}, "
+                            f"сохранено {run['saved']}, источников с ошибкой: {run['failed_sources']}")
+
             conn = sqlite3.connect("data/news.db")
             cursor = conn.cursor()
-            
             cursor.execute("SELECT COUNT(*) FROM raw_articles WHERE is_finance = 1")
             total_finance = cursor.fetchone()[0]
-            
-            cursor.execute("""
-                SELECT source_name, COUNT(*) 
-                FROM raw_articles 
-                WHERE is_finance = 1 
-                GROUP BY source_name
-            """)
-            sources_stats = cursor.fetchall()
-            
             conn.close()
-            
+
             logger.info(f"📊 СТАТИСТИКА БАЗЫ: Всего финансовых статей: {total_finance}")
-            for source, count in sources_stats:
-                logger.info(f"  {source}: {count} статей")
-                
+
         except Exception as e:
             logger.error(f"Ошибка при логировании статистики: {e}")
 
-    def run_immediately(self):
-        """Немедленный запуск сбора"""
-        logger.info("▶️ НЕМЕДЛЕННЫЙ ЗАПУСК СБОРА")
-        self.collect_news_job()
-
-    def start_scheduler(self):
-        """Запуск планировщика"""
-        if self.is_running:
-            logger.warning("Планировщик уже запущен")
-            return
-
-        logger.info("⏰ ЗАПУСК ПЛАНИРОВЩИКА СБОРА НОВОСТЕЙ")
-        
-        # Расписание сбора новостей
-        schedule.every(30).minutes.do(self.collect_news_job)  # Каждые 30 минут
-        schedule.every(1).hour.do(self.collect_news_job)      # Каждый час
-        schedule.every().day.at("08:00").do(self.collect_news_job)  # Утром
-        schedule.every().day.at("12:00").do(self.collect_news_job)  # В обед
-        schedule.every().day.at("18:00").do(self.collect_news_job)  # Вечером
-        
-        self.is_running = True
-        
-        logger.info("📅 РАСПИСАНИЕ УСТАНОВЛЕНО:")
-        logger.info("  - Каждые 30 минут")
-        logger.info("  - Каждый час") 
-        logger.info("  - В 08:00, 12:00, 18:00 ежедневно")
-        
-        # Немедленный запуск первого сбора
-        self.run_immediately()
-        
-        # Бесконечный цикл планировщика
-        while self.is_running:
-            try:
-                schedule.run_pending()
-                time.sleep(60)  # Проверка каждую минуту
-            except KeyboardInterrupt:
-                logger.info("🛑 ОСТАНОВКА ПЛАНИРОВЩИКА ПО ЗАПРОСУ ПОЛЬЗОВАТЕЛЯ")
-                break
-            except Exception as e:
-                logger.error(f"Ошибка в планировщике: {e}")
-                time.sleep(300)  # Ждем 5 минут при ошибке
-
-    def stop_scheduler(self):
-        """Остановка планировщика"""
-        self.is_running = False
-        logger.info("🛑 ПЛАНИРОВЩИК ОСТАНОВЛЕН")
 
 def main():
-    """Основная функция"""
-    print("=" * 60)
-    print("📡 RADAR - АВТОМАТИЧЕСКИЙ СБОРЩИК ФИНАНСОВЫХ НОВОСТЕЙ")
-    print("=" * 60)
-    print("Режимы работы:")
-    print("  1. Однократный сбор (запуск и выход)")
-    print("  2. Фоновый режим (постоянный сбор по расписанию)")
-    print("  3. Только планировщик (без немедленного сбора)")
-    print()
-    
+    parser = argparse.ArgumentParser(description='Фоновый сборщик финансовых новостей')
+    parser.add_argument('--once', action='store_true', help='Один прогон и выход (для cron/планировщика задач)')
+    parser.add_argument('--interval', type=int, default=int(os.environ.get('RADAR_COLLECT_INTERVAL', 1800)),
+                        help='Наибольшая пауза между прогонами, с')
+    parser.add_argument('--jitter', type=float, default=0.1, help='Случайный разброс паузы, доля от интервала')
+    parser.add_argument('--hours-back', type=int, default=24)
+    parser.add_argument('--delay', type=int, default=0, help='Задержка перед первым прогоном, с')
+    parser.add_argument('--all-sources', action='store_true', help='Опрашивать все источники, без расписания')
+    args = parser.parse_args()
+
+    daemon = CollectorDaemon(interval=args.interval, jitter=args.jitter, hours_back=args.hours_back,
+                             due_only=not args.all_sources)
+    daemon.install_signal_handlers()
+
     try:
-        mode = input("Выберите режим (1/2/3, по умолчанию 1): ").strip()
-        
-        collector = AutoNewsCollector()
-        
-        if mode == "2":
-            print("🚀 ЗАПУСК В ФОНОВОМ РЕЖИМЕ...")
-            collector.start_scheduler()
-        elif mode == "3":
-            print("⏰ ЗАПУСК ТОЛЬКО ПЛАНИРОВЩИКА...")
-            collector.is_running = True
-            collector.start_scheduler()
-        else:
-            print("⚡ ОДНОКРАТНЫЙ СБОР...")
-            collector.run_immediately()
-            print("✅ СБОР ЗАВЕРШЕН")
-            
-    except KeyboardInterrupt:
-        print("\n🛑 ВЫХОД ПО ЗАПРОСУ ПОЛЬЗОВАТЕЛЯ")
-    except Exception as e:
-        print(f"❌ КРИТИЧЕСКАЯ ОШИБКА: {e}")
+        if args.once:
+            status = daemon.run_once()
+            sys.exit(1 if status in ('failed', 'timeout') else 0)
+        daemon.run_forever(initial_delay=args.delay)
+    finally:
+        daemon.shutdown()
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,150 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Добавляем корневую директорию в путь для импортов
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_store import EmbeddingStore
+from ann_index import IVFIndex
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def make_corpus(size, dim, topics, noise, seed):
+    """Синтетические эмбеддинги: сюжеты-центры плюс шум, нормированные"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, dim)).astype(np.float32)
+    labels = rng.integers(0, topics, size=size)
+    vectors = centers[labels] + noise * rng.standard_normal((size, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def exact_top_k(store, query, k, rows=None):
+    """Точный ответ полным перебором (эталон для recall)"""
+    scores = store.scores(query)
+    if rows is not None:
+        mask = np.full(len(scores), -np.inf, dtype=np.float32)
+        mask[rows] = scores[rows]
+        scores = mask
+    top = np.argpartition(-scores, k - 1)[:k]
+    return set(store.ids[top].tolist())
+
+
+def run_benchmark(size=200000, dim=384, queries=100, k=10, topics=2000, noise=1.0,
+                  nprobes=(1, 2, 4, 8, 16, 32, 64), window_hours=24, seed=7):
+    workdir = tempfile.mkdtemp(prefix='radar_ann_')
+    store = EmbeddingStore(os.path.join(workdir, 'embeddings'), dim=dim, initial_capacity=size)
+
+    logger.info(f"📦 Генерация {size} синтетических эмбеддингов (dim={dim})...")
+    vectors = make_corpus(size, dim, topics, noise, seed)
+    ids = [hashlib.md5(str(i).encode()).hexdigest() for i in range(size)]
+
+    started = time.time()
+    for start in range(0, size, 100000):
+        store.add(ids[start:start + 100000], vectors[start:start + 100000])
+    logger.info(f"💾 Хранилище заполнено за {time.time() - started:.1f}с")
+
+    # Публикации равномерно за 30 дней
+    rng = np.random.default_rng(seed + 1)
+    now = time.time()
+    published = now - rng.uniform(0, 30 * 86400, size=size)
+
+    index = IVFIndex(store, path=os.path.join(workdir, 'ann_index.npz'))
+    started = time.time()
+    index.add(np.arange(size, dtype=np.int32), published)
+    build_seconds = time.time() - started
+    logger.info(f"🧭 Индекс построен за {build_seconds:.1f}с: {index.nlist} списков")
+
+    index.save()
+    started = time.time()
+    IVFIndex(store, path=index.path)
+    load_ms = (time.time() - started) * 1000
+
+    query_rows = rng.choice(size, size=queries, replace=False)
+    query_vectors = vectors[query_rows] + 0.1 * rng.standard_normal((queries, dim)).astype(np.float32)
+
+    since = now - window_hours * 3600
+    window_rows = np.nonzero(published >= since)[0]
+
+    logger.info("🎯 Расчет эталонных ответов полным перебором...")
+    truth_all = []
+    truth_window = []
+    brute_ms = []
+    for query in query_vectors:
+        started = time.time()
+        truth_all.append(exact_top_k(store, query, k))
+        brute_ms.append((time.time() - started) * 1000)
+        truth_window.append(exact_top_k(store, query, k, rows=window_rows))
+
+    report = {
+        'size': size,
+        'dim': dim,
+        'k': k,
+        'queries': queries,
+        'nlist': index.nlist,
+        'build_seconds': round(build_seconds, 2),
+        'load_ms': round(load_ms, 1),
+        'brute_force_ms_p50': round(float(np.percentile(brute_ms, 50)), 2),
+        'results': []
+    }
+
+    for nprobe in nprobes:
+        for window, truth, since_ts in (('all', truth_all, None), (f'{window_hours}h', truth_window, since)):
+            latencies = []
+            recalls = []
+            for query, expected in zip(query_vectors, truth):
+                started = time.time()
+                found = index.search(query, k=k, nprobe=nprobe, since=since_ts)
+                latencies.append((time.time() - started) * 1000)
+                found_ids = {article_id.encode('ascii') for article_id, _ in found}
+                recalls.append(len(found_ids & expected) / max(len(expected), 1))
+
+            report['results'].append({
+                'nprobe': nprobe,
+                'window': window,
+                'recall_at_k': round(float(np.mean(recalls)), 4),
+                'latency_ms_p50': round(float(np.percentile(latencies, 50)), 2),
+                'latency_ms_p95': round(float(np.percentile(latencies, 95)), 2)
+            })
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк ANN-индекса: recall против задержки')
+    parser.add_argument('--size', type=int, default=200000, help='Количество статей в архиве')
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--window-hours', type=int, default=24)
+    parser.add_argument('--output', help='Путь для JSON-отчета')
+    args = parser.parse_args()
+
+    report = run_benchmark(size=args.size, dim=args.dim, queries=args.queries,
+                           k=args.k, window_hours=args.window_hours)
+
+    print(f"\n📊 ANN: {report['size']} статей, {report['nlist']} списков, "
+          f"перебор p50 = {report['brute_force_ms_p50']} мс, загрузка индекса = {report['load_ms']} мс")
+    print(f"{'nprobe':>7} {'окно':>6} {'recall@k':>9} {'p50, мс':>9} {'p95, мс':>9}")
+    for row in report['results']:
+        print(f"{row['nprobe']:>7} {row['window']:>6} {row['recall_at_k']:>9.3f} "
+              f"{row['latency_ms_p50']:>9.2f} {row['latency_ms_p95']:>9.2f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Отчет сохранен в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
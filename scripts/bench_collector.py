@@ -0,0 +1,369 @@
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import time
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import aiohttp
+import numpy as np
+from aiohttp import web
+
+# Добавляем корневую директорию в путь для импортов
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from data_collector import AdvancedFinanceNewsCollector
+from page_archive import PageArchive
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+_SELECTOR_RE = re.compile(r'^([a-z0-9]+)?(?:\.([\w-]+))?$')
+
+# Заголовки с финансовой лексикой: статьи должны проходить фильтр is_finance
+TITLES = [
+    'ЦБ сохранил ключевую ставку, рубль укрепился к доллару',
+    'Нефть дорожает на фоне сокращения добычи',
+    'Индекс Мосбиржи обновил максимум на новостях о дивидендах',
+    'Банк отчитался о росте прибыли за квартал',
+    'Инфляция замедлилась второй месяц подряд',
+    'Fed holds rates steady as inflation cools',
+    'Oil prices climb after supply cut announcement',
+    'Stock market rallies on strong bank earnings',
+    'Bitcoin trading volume hits yearly high',
+    'Bond yields fall as investors seek safety'
+]
+FILLER = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. '
+
+
+def parse_selector(selector):
+    """Простой CSS-селектор tag.class -> (tag, class); сложные не поддерживаются"""
+    match = _SELECTOR_RE.match(selector or '')
+    if not match:
+        return None
+    return match.group(1) or 'div', match.group(2)
+
+
+def element(selector, inner='', **attrs):
+    tag, css_class = parse_selector(selector) or ('div', None)
+    if css_class:
+        attrs['class'] = css_class
+    rendered = ''.join(f' {key}="{value}"' for key, value in attrs.items())
+    return f'<{tag}{rendered}>{inner}</{tag}>'
+
+
+def render_html(source_id, selectors, items, size_kb):
+    """Страница с items статьями в разметке под селекторы источника из sources.json"""
+    cards = []
+    for i in range(items):
+        title = f"{TITLES[(source_id + i) % len(TITLES)]} ({source_id}-{i})"
+        href = f"/article/{source_id}/{i}"
+        time_html = element(selectors.get('time', 'span'), f"{i * 7 % 59 + 1} минут назад")
+        summary_html = element(selectors.get('summary', 'div'), f"Краткое описание новости о рынке и инвестициях {i}.")
+
+        if selectors.get('link') == selectors.get('article'):
+            # Сама карточка - ссылка (a.news-feed__item), заголовок внутри
+            inner = element(selectors['title'], title) + time_html + summary_html
+            cards.append(element(selectors['article'], inner, href=href))
+        else:
+            if selectors.get('title') == selectors.get('link'):
+                head = element(selectors['link'], title, href=href)
+            else:
+                head = element(selectors.get('link', 'a'), element(selectors['title'], title), href=href)
+            cards.append(element(selectors['article'], head + time_html + summary_html))
+
+    body = '\n'.join(cards)
+    padding = max(size_kb * 1024 - len(body), 0)
+    filler = f'<div class="bench-filler">{FILLER * (padding // len(FILLER) + 1)}</div>' if padding else ''
+    return f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>bench {source_id}</title></head>' \
+           f'<body><main>{body}</main>{filler}</body></html>'
+
+
+def render_rss(source_id, items, size_kb, now):
+    entries = []
+    for i in range(items):
+        title = f"{TITLES[(source_id + i) % len(TITLES)]} ({source_id}-{i})"
+        published = format_datetime(now - timedelta(minutes=i * 7))
+        entries.append(f'<item><title>{title}</title><link>http://bench.local/rss/{source_id}/{i}</link>'
+                       f'<description>Market and investment news summary {i}.</description>'
+                       f'<pubDate>{published}</pubDate></item>')
+
+    body = '\n'.join(entries)
+    padding = max(size_kb * 1024 - len(body), 0)
+    filler = f'<!-- {FILLER * (padding // len(FILLER) + 1)} -->' if padding else ''
+    return f'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>bench {source_id}</title>' \
+           f'{body}{filler}</channel></rss>'
+
+
+def make_sources(count, templates, base_url):
+    """count источников по кругу из шаблонов sources.json (сохраняется доля HTML/RSS)"""
+    sources = []
+    for i in range(count):
+        template = templates[i % len(templates)]
+        source = dict(template, name=f"{template['name']} #{i}", url=f"{base_url}/{template['type']}/{i}")
+        source['template'] = template['name']
+        sources.append(source)
+    return sources
+
+
+# --- Сервер-заглушка (отдельный процесс, чтобы не мерить его CPU вместе со сборщиком) ---
+
+def run_server(port, sources, options, recorded):
+    stats = {'requests': 0, 'errors': 0, 'bytes': 0}
+    rng = random.Random(options['seed'])
+    now = datetime.now(timezone.utc)
+    pages = {}
+
+    for i, source in enumerate(sources):
+        if source['template'] in recorded:
+            pages[i] = recorded[source['template']]
+        elif source['type'] == 'html':
+            pages[i] = render_html(i, source.get('selectors', {}), options['items'], options['size_kb']).encode('utf-8')
+        else:
+            pages[i] = render_rss(i, options['items'], options['size_kb'], now).encode('utf-8')
+
+    async def handle_page(request):
+        stats['requests'] += 1
+        latency = max(rng.gauss(options['latency_ms'], options['latency_jitter_ms']), 0) / 1000
+        await asyncio.sleep(latency)
+        if rng.random() < options['error_rate']:
+            stats['errors'] += 1
+            return web.Response(status=503, text='unavailable')
+
+        body = pages.get(int(request.match_info['id']))
+        if body is None:
+            return web.Response(status=404)
+        stats['bytes'] += len(body)
+        content_type = 'text/html' if request.match_info['kind'] == 'html' else 'application/rss+xml'
+        return web.Response(body=body, content_type=content_type, charset='utf-8')
+
+    async def handle_stats(request):
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_get('/{kind:html|rss}/{id:\\d+}', handle_page)
+    app.router.add_get('/_stats', handle_stats)
+    web.run_app(app, host='127.0.0.1', port=port, print=None, access_log=None, backlog=2048)
+
+
+def load_recorded(templates):
+    """Последние архивные страницы реальных источников (data/archive), если есть"""
+    recorded = {}
+    try:
+        archive = PageArchive(os.path.join(ROOT_DIR, 'data', 'archive'), os.path.join(ROOT_DIR, 'data', 'news.db'))
+        latest = {page['source_name']: page for page in archive.pages(latest_only=True)}
+    except Exception as e:
+        logger.warning(f"⚠️ Архив страниц недоступен: {e}")
+        return recorded
+
+    for template in templates:
+        page = latest.get(template['name'])
+        if page:
+            recorded[template['name']] = archive.load(page['sha256'])
+    logger.info(f"🗄️ Записанных страниц из архива: {len(recorded)} из {len(templates)}")
+    return recorded
+
+
+async def wait_server(base_url, timeout=30):
+    deadline = time.time() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.time() < deadline:
+            try:
+                async with session.get(base_url + '/_stats') as response:
+                    if response.status == 200:
+                        return await response.json()
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError('сервер-заглушка не поднялся')
+
+
+# --- Замеры ---
+
+class LoopLagMonitor:
+    """Задержка event loop: насколько позже заказанного просыпается sleep(interval)"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(loop.time() - started - self.interval, 0) * 1000)
+
+    def start(self):
+        self.samples = []
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        samples = np.array(self.samples) if self.samples else np.zeros(1)
+        return {
+            'p50': round(float(np.percentile(samples, 50)), 2),
+            'p99': round(float(np.percentile(samples, 99)), 2),
+            'max': round(float(samples.max()), 2)
+        }
+
+
+def peak_rss_mb():
+    # ru_maxrss в Linux - в килобайтах
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+async def run_sweeps(config_path, db_path, sweeps, pool, base_url):
+    collector = AdvancedFinanceNewsCollector(config_path=config_path, db_path=db_path, embed_articles=False)
+    if pool:
+        await collector.start_session()
+
+    monitor = LoopLagMonitor()
+    results = []
+    try:
+        for sweep in range(sweeps):
+            async with aiohttp.ClientSession() as session:
+                async with session.get(base_url + '/_stats') as response:
+                    before = await response.json()
+
+            monitor.start()
+            started = time.perf_counter()
+            articles = await collector.collect_news_async(run_id=f'bench-{sweep}')
+            wall = time.perf_counter() - started
+            lag = await monitor.stop()
+
+            async with aiohttp.ClientSession() as session:
+                async with session.get(base_url + '/_stats') as response:
+                    after = await response.json()
+
+            outcomes = collector.fetch_outcomes
+            results.append({
+                'sweep': sweep,
+                'wall_seconds': round(wall, 2),
+                'articles': len(articles),
+                'articles_per_second': round(len(articles) / wall, 1) if wall else 0,
+                'sources_ok': sum(1 for outcome in outcomes.values() if isinstance(outcome, list)),
+                'sources_failed': sum(1 for outcome in outcomes.values() if not isinstance(outcome, list)),
+                'requests': after['requests'] - before['requests'],
+                'server_errors': after['errors'] - before['errors'],
+                'megabytes': round((after['bytes'] - before['bytes']) / 1024 / 1024, 2),
+                'peak_rss_mb': peak_rss_mb(),
+                'loop_lag_ms': lag
+            })
+            logger.info(f"⏱️ Прогон {sweep}: {wall:.2f}с, статей {len(articles)}")
+    finally:
+        await collector.close_session()
+    return results
+
+
+def run_benchmark(sources=30, sweeps=3, latency_ms=50, latency_jitter_ms=20, error_rate=0.0, size_kb=64,
+                  items=30, recorded=False, pool=True, port=8940, seed=7):
+    with open(os.path.join(ROOT_DIR, 'config', 'sources.json'), 'r', encoding='utf-8') as f:
+        real_config = json.load(f)
+    templates = real_config.get('html_sources', []) + real_config.get('rss_sources', [])
+
+    base_url = f'http://127.0.0.1:{port}'
+    bench_sources = make_sources(sources, templates, base_url)
+    options = {'latency_ms': latency_ms, 'latency_jitter_ms': latency_jitter_ms, 'error_rate': error_rate,
+               'size_kb': size_kb, 'items': items, 'seed': seed}
+
+    server = multiprocessing.Process(
+        target=run_server, args=(port, bench_sources, options, load_recorded(templates) if recorded else {}),
+        daemon=True
+    )
+    server.start()
+
+    workdir = tempfile.mkdtemp(prefix='radar_bench_')
+    config_path = os.path.join(workdir, 'sources.json')
+    config = {key: value for key, value in real_config.items() if key not in ('html_sources', 'rss_sources')}
+    # Предохранители в бенчмарке не размыкаются: каждый прогон опрашивает все источники
+    config['fetch'] = dict(config.get('fetch', {}), breaker_threshold=10 ** 9)
+    config['html_sources'] = [s for s in bench_sources if s['type'] == 'html']
+    config['rss_sources'] = [s for s in bench_sources if s['type'] == 'rss']
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False)
+
+    try:
+        asyncio.run(wait_server(base_url))
+        logger.info(f"🚀 Сервер-заглушка: {sources} источников, задержка {latency_ms}±{latency_jitter_ms} мс, "
+                    f"ошибки {error_rate:.0%}, {size_kb} КБ")
+        results = asyncio.run(run_sweeps(config_path, os.path.join(workdir, 'news.db'), sweeps, pool, base_url))
+    finally:
+        server.terminate()
+        server.join(timeout=10)
+
+    return {
+        'sources': sources,
+        'html_sources': len(config['html_sources']),
+        'rss_sources': len(config['rss_sources']),
+        'latency_ms': latency_ms,
+        'latency_jitter_ms': latency_jitter_ms,
+        'error_rate': error_rate,
+        'size_kb': size_kb,
+        'items_per_page': items,
+        'recorded_pages': recorded,
+        'connection_pool': pool,
+        'cpu_count': os.cpu_count(),
+        'results': results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк сборщика новостей на локальном сервере-заглушке (без сети)')
+    parser.add_argument('--sources', default='30', help='Числа источников через запятую (например 30,300,1000)')
+    parser.add_argument('--sweeps', type=int, default=3, help='Прогонов на каждое число источников')
+    parser.add_argument('--latency-ms', type=float, default=50, help='Средняя задержка ответа')
+    parser.add_argument('--latency-jitter-ms', type=float, default=20)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 503')
+    parser.add_argument('--size-kb', type=int, default=64, help='Размер страницы')
+    parser.add_argument('--items', type=int, default=30, help='Статей на странице')
+    parser.add_argument('--recorded', action='store_true', help='Отдавать записанные страницы из data/archive, где они есть')
+    parser.add_argument('--no-pool', action='store_true', help='Без общего пула соединений (сессия на источник)')
+    parser.add_argument('--port', type=int, default=8940)
+    parser.add_argument('--output', help='Путь для JSON-отчета')
+    args = parser.parse_args()
+
+    # Логи сборщика по каждому источнику заглушили бы отчет
+    logging.getLogger('data_collector').setLevel(logging.WARNING)
+    logging.getLogger('source_health').setLevel(logging.WARNING)
+
+    reports = []
+    for count in [int(value) for value in args.sources.split(',')]:
+        reports.append(run_benchmark(
+            sources=count, sweeps=args.sweeps, latency_ms=args.latency_ms, latency_jitter_ms=args.latency_jitter_ms,
+            error_rate=args.error_rate, size_kb=args.size_kb, items=args.items, recorded=args.recorded,
+            pool=not args.no_pool, port=args.port
+        ))
+
+    print(f"\n📊 Сборщик на заглушке: задержка {args.latency_ms} мс, {args.size_kb} КБ, "
+          f"ошибки {args.error_rate:.0%}, CPU: {os.cpu_count()}")
+    print(f"{'источн.':>8} {'прогон':>7} {'время, с':>9} {'статей':>7} {'стат/с':>7} {'ошибок':>7} "
+          f"{'МБ':>6} {'RSS, МБ':>8} {'лаг p99':>8} {'лаг max':>8}")
+    for report in reports:
+        for row in report['results']:
+            print(f"{report['sources']:>8} {row['sweep']:>7} {row['wall_seconds']:>9.2f} {row['articles']:>7} "
+                  f"{row['articles_per_second']:>7.1f} {row['sources_failed']:>7} {row['megabytes']:>6.1f} "
+                  f"{row['peak_rss_mb']:>8.1f} {row['loop_lag_ms']['p99']:>8.1f} {row['loop_lag_ms']['max']:>8.1f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Отчет сохранен в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
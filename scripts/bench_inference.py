@@ -0,0 +1,322 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import torch
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Добавляем корневую директорию в путь для импортов
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CAPABILITIES = ('embedding', 'sentiment', 'ner', 'generator')
+
+# Архитектуры моделей NeuralNewsAnalyzer. full - размеры настоящих моделей (вычисления и память
+# как в продакшне, веса случайные), tiny - те же архитектуры в миниатюре для быстрой проверки
+ARCHITECTURES = {
+    'full': {
+        'embedding': {'vocab_size': 250037, 'hidden_size': 384, 'num_hidden_layers': 12,
+                      'num_attention_heads': 12, 'intermediate_size': 1536},   # paraphrase-multilingual-MiniLM-L12-v2
+        'sentiment': {'vocab_size': 119547, 'hidden_size': 768, 'num_hidden_layers': 12,
+                      'num_attention_heads': 12, 'intermediate_size': 3072},   # rubert-base-cased-sentiment
+        'ner': {'vocab_size': 119547, 'hidden_size': 768, 'num_hidden_layers': 12,
+                'num_attention_heads': 12, 'intermediate_size': 3072},         # bert-base-multilingual-cased-ner-hrl
+        'generator': {'vocab_size': 50264, 'n_embd': 768, 'n_layer': 12, 'n_head': 12,
+                      'n_positions': 2048}                                     # rugpt3small_based_on_gpt2
+    },
+    'tiny': {
+        'embedding': {'hidden_size': 64, 'num_hidden_layers': 2, 'num_attention_heads': 2, 'intermediate_size': 128},
+        'sentiment': {'hidden_size': 64, 'num_hidden_layers': 2, 'num_attention_heads': 2, 'intermediate_size': 128},
+        'ner': {'hidden_size': 64, 'num_hidden_layers': 2, 'num_attention_heads': 2, 'intermediate_size': 128},
+        'generator': {'n_embd': 64, 'n_layer': 2, 'n_head': 2, 'n_positions': 1024}
+    }
+}
+
+WORDS = ('Центральный банк сохранил ключевую ставку, рубль укрепился, нефть подорожала, индекс Мосбиржи вырос, '
+         'инвесторы ждут дивидендов Сбербанка и отчетности Газпрома. The Fed kept rates unchanged as inflation '
+         'cooled, oil prices climbed and bank earnings beat forecasts.').split()
+
+
+def build_vocab(path):
+    """Словарь WordPiece без сети: служебные токены, символы и слова тестовых текстов"""
+    chars = set(''.join(WORDS)) | set('abcdefghijklmnopqrstuvwxyz0123456789.,%-')
+    chars |= set('абвгдеёжзийклмнопрстуфхцчшщъыьэюя')
+    tokens = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]']
+    tokens += sorted(chars) + [f'##{char}' for char in sorted(chars)]
+    tokens += sorted({word.strip('.,').lower() for word in WORDS})
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(dict.fromkeys(tokens)) + '\n')
+
+
+def build_random_models(size, capabilities, workdir):
+    """Модели тех же архитектур со случайными весами - без загрузки из сети"""
+    from transformers import (BertConfig, BertForSequenceClassification, BertForTokenClassification, BertModel,
+                              BertTokenizerFast, GPT2Config, GPT2LMHeadModel, pipeline)
+
+    vocab_path = os.path.join(workdir, 'vocab.txt')
+    build_vocab(vocab_path)
+    tokenizer = BertTokenizerFast(vocab_file=vocab_path, do_lower_case=False)
+    architectures = ARCHITECTURES[size]
+
+    def bert_config(name, **extra):
+        params = dict(architectures[name], **extra)
+        params.setdefault('vocab_size', len(tokenizer))
+        return BertConfig(**params)
+
+    models = {}
+    if 'embedding' in capabilities:
+        from sentence_transformers import SentenceTransformer, models as st_models
+        model_dir = os.path.join(workdir, 'embedding')
+        BertModel(bert_config('embedding')).save_pretrained(model_dir)
+        tokenizer.save_pretrained(model_dir)
+        transformer = st_models.Transformer(model_dir, max_seq_length=512)
+        pooling = st_models.Pooling(transformer.get_word_embedding_dimension())
+        models['embedding'] = SentenceTransformer(modules=[transformer, pooling], device='cpu')
+
+    if 'sentiment' in capabilities:
+        model = BertForSequenceClassification(bert_config('sentiment', num_labels=3))
+        model.config.id2label = {0: 'NEUTRAL', 1: 'POSITIVE', 2: 'NEGATIVE'}
+        models['sentiment'] = pipeline('sentiment-analysis', model=model.eval(), tokenizer=tokenizer, device=-1)
+
+    if 'ner' in capabilities:
+        labels = ['O', 'B-PER', 'I-PER', 'B-ORG', 'I-ORG', 'B-LOC', 'I-LOC', 'B-DATE', 'I-DATE']
+        model = BertForTokenClassification(bert_config('ner', num_labels=len(labels)))
+        model.config.id2label = dict(enumerate(labels))
+        models['ner'] = pipeline('ner', model=model.eval(), tokenizer=tokenizer, aggregation_strategy='simple',
+                                 device=-1)
+
+    if 'generator' in capabilities:
+        params = dict(architectures['generator'])
+        params.setdefault('vocab_size', len(tokenizer))
+        model = GPT2LMHeadModel(GPT2Config(**params, pad_token_id=tokenizer.pad_token_id))
+        models['generator'] = pipeline('text-generation', model=model.eval(), tokenizer=tokenizer, device=-1)
+
+    return models, tokenizer
+
+
+def load_real_models(capabilities, url=None):
+    """Настоящие модели NeuralNewsAnalyzer: локально (кэш HuggingFace) или на сервере инференса"""
+    from neural_analyzer import NeuralNewsAnalyzer
+
+    if url:
+        from inference_client import RemoteModelManager
+        manager = RemoteModelManager(url)
+    else:
+        from model_manager import ModelManager
+        # Без бюджета и выгрузки по простою: все модели замера в памяти одновременно
+        manager = ModelManager(memory_budget_mb=0, idle_timeout=0)
+    analyzer = NeuralNewsAnalyzer(manager)
+    return {name: analyzer.models.get(name) for name in capabilities}
+
+
+def model_tokenizer(model, fallback):
+    tokenizer = getattr(model, 'tokenizer', None)
+    return tokenizer if tokenizer is not None and callable(tokenizer) else fallback
+
+
+def make_texts(tokenizer, count, seq_len, seed=7):
+    """count текстов ровно по seq_len токенов (со служебными) для заданного токенизатора"""
+    rng = np.random.default_rng(seed)
+    texts = []
+    for _ in range(count):
+        words = list(rng.choice(WORDS, seq_len * 2))
+        ids = tokenizer(' '.join(words), add_special_tokens=False)['input_ids'][:max(seq_len - 2, 1)]
+        texts.append(tokenizer.decode(ids))
+    return texts
+
+
+def count_tokens(tokenizer, texts):
+    return sum(len(ids) for ids in tokenizer(list(texts))['input_ids'])
+
+
+class MemorySampler:
+    """Пиковый RSS процесса за замер: опрос /proc/self/statm (Linux) в фоновом потоке"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def rss_mb():
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+        except (OSError, ValueError, AttributeError):
+            if resource is None:
+                return 0.0
+            # Не Linux: только пик за всю жизнь процесса (ru_maxrss - КБ в Linux, байты в macOS)
+            scale = 1 if platform.system() == 'Darwin' else 1024
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1024 / 1024
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.rss_mb())
+
+    def __enter__(self):
+        self.peak = self.rss_mb()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.rss_mb())
+
+
+def run_capability(name, model, texts, batch_size, new_tokens):
+    """Один вызов модели на весь набор текстов тем же способом, что и NeuralNewsAnalyzer"""
+    if name == 'embedding':
+        return model.encode(texts, batch_size=batch_size, convert_to_numpy=True,
+                            normalize_embeddings=True, show_progress_bar=False)
+    if name == 'generator':
+        return model(texts, batch_size=batch_size, max_new_tokens=new_tokens, min_new_tokens=new_tokens,
+                     do_sample=True, temperature=0.7, num_return_sequences=1)
+    return model(texts, batch_size=batch_size)
+
+
+def measure(name, model, texts, batch_size, new_tokens, input_tokens):
+    run_capability(name, model, texts[:batch_size], batch_size, new_tokens)  # прогрев
+
+    with MemorySampler() as memory:
+        started = time.perf_counter()
+        run_capability(name, model, texts, batch_size, new_tokens)
+        elapsed = time.perf_counter() - started
+
+    # Для генерации считаем порожденные токены, для остальных - входные
+    tokens = new_tokens * len(texts) if name == 'generator' else input_tokens
+    return {
+        'seconds': round(elapsed, 3),
+        'articles_per_second': round(len(texts) / elapsed, 2),
+        'tokens_per_second': round(tokens / elapsed, 1),
+        'ms_per_article': round(elapsed / len(texts) * 1000, 2),
+        'peak_rss_mb': round(memory.peak, 1)
+    }
+
+
+def run_benchmark(models='tiny', capabilities=CAPABILITIES, batch_sizes=(1, 8, 32), seq_lens=(64, 256),
+                  threads=(1,), texts=64, generator_texts=8, new_tokens=32, url=None):
+    workdir = tempfile.mkdtemp(prefix='radar_inference_')
+    torch.manual_seed(7)
+
+    baseline_mb = MemorySampler.rss_mb()
+    started = time.time()
+    if models == 'real':
+        loaded = load_real_models(capabilities, url)
+        fallback_tokenizer = None
+    else:
+        loaded, fallback_tokenizer = build_random_models(models, capabilities, workdir)
+    logger.info(f"🧠 Модели ({models}) готовы за {time.time() - started:.1f}с")
+
+    results = []
+    for name in capabilities:
+        model = loaded.get(name)
+        if model is None:
+            logger.warning(f"⚠️ Модель {name} недоступна, пропускаем")
+            continue
+        tokenizer = model_tokenizer(model, fallback_tokenizer)
+        if tokenizer is None:
+            # Удаленная модель: токенизатор берем у миниатюрной копии
+            _, tokenizer = build_random_models('tiny', (), workdir)
+
+        count = generator_texts if name == 'generator' else texts
+        for seq_len in seq_lens:
+            sample = make_texts(tokenizer, count, seq_len)
+            input_tokens = count_tokens(tokenizer, sample)
+            for thread_count in threads:
+                if not url:
+                    torch.set_num_threads(thread_count)
+                for batch_size in batch_sizes:
+                    logger.info(f"⏱️ {name}: seq_len={seq_len}, batch={batch_size}, threads={thread_count}")
+                    try:
+                        row = measure(name, model, sample, batch_size, new_tokens, input_tokens)
+                    except Exception as e:
+                        logger.error(f"❌ {name}: {e}")
+                        row = {'error': str(e)}
+                    row.update(capability=name, seq_len=seq_len, batch_size=batch_size,
+                               threads=None if url else thread_count, texts=count)
+                    results.append(row)
+
+    import transformers
+    return {
+        'models': models,
+        'backend': 'server' if url else 'local',
+        'torch': torch.__version__,
+        'transformers': transformers.__version__,
+        'cpu_count': os.cpu_count(),
+        'device': 'cpu',
+        'baseline_rss_mb': round(baseline_mb, 1),
+        'models_rss_mb': round(MemorySampler.rss_mb() - baseline_mb, 1),
+        'new_tokens': new_tokens,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк инференса моделей NeuralNewsAnalyzer')
+    parser.add_argument('--models', choices=('tiny', 'full', 'real'), default='tiny',
+                        help='tiny/full - случайные веса (без сети), real - настоящие модели')
+    parser.add_argument('--url', help='Мерить сервер инференса (inference_server.py) вместо локальных моделей')
+    parser.add_argument('--capabilities', default=','.join(CAPABILITIES))
+    parser.add_argument('--batch-sizes', default='1,8,32')
+    parser.add_argument('--seq-lens', default='64,256', help='Длины входов в токенах')
+    parser.add_argument('--threads', default=f'1,{os.cpu_count()}', help='Значения torch.set_num_threads')
+    parser.add_argument('--texts', type=int, default=64, help='Текстов на замер')
+    parser.add_argument('--generator-texts', type=int, default=8, help='Текстов на замер генерации')
+    parser.add_argument('--new-tokens', type=int, default=32, help='Новых токенов на текст при генерации')
+    parser.add_argument('--output', help='Путь для JSON-отчета')
+    args = parser.parse_args()
+
+    if args.url and args.models != 'real':
+        parser.error('--url работает только с --models real: модели загружает сервер')
+
+    report = run_benchmark(
+        models=args.models,
+        capabilities=[name for name in args.capabilities.split(',') if name in CAPABILITIES],
+        batch_sizes=[int(value) for value in args.batch_sizes.split(',')],
+        seq_lens=[int(value) for value in args.seq_lens.split(',')],
+        threads=sorted({int(value) for value in args.threads.split(',')}),
+        texts=args.texts,
+        generator_texts=args.generator_texts,
+        new_tokens=args.new_tokens,
+        url=args.url
+    )
+
+    print(f"\n📊 Инференс ({report['models']}, {report['backend']}): torch {report['torch']}, "
+          f"CPU: {report['cpu_count']}, модели +{report['models_rss_mb']} МБ")
+    print(f"{'модель':<10} {'токены':>7} {'пакет':>6} {'потоки':>7} {'стат/с':>8} {'ток/с':>9} "
+          f"{'мс/стат':>8} {'RSS, МБ':>8}")
+    for row in report['results']:
+        if 'error' in row:
+            print(f"{row['capability']:<10} {row['seq_len']:>7} {row['batch_size']:>6} "
+                  f"{row['threads'] or '-':>7}  ❌ {row['error'][:60]}")
+            continue
+        print(f"{row['capability']:<10} {row['seq_len']:>7} {row['batch_size']:>6} {row['threads'] or '-':>7} "
+              f"{row['articles_per_second']:>8.1f} {row['tokens_per_second']:>9.1f} {row['ms_per_article']:>8.1f} "
+              f"{row['peak_rss_mb']:>8.1f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Отчет сохранен в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
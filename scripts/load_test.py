@@ -0,0 +1,333 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import aiohttp
+import numpy as np
+
+# Корень проекта: gunicorn запускается оттуда
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+async def run_load(base_url, paths, concurrency=32, duration=20, warmup=2):
+    """Замкнутая нагрузка: concurrency клиентов шлют запросы без пауз duration секунд"""
+    latencies = []
+    statuses = {}
+    errors = 0
+    started = time.time()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    async def client(session, offset):
+        nonlocal errors
+        i = offset
+        while time.time() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            request_started = time.time()
+            try:
+                async with session.get(base_url + path) as response:
+                    await response.read()
+                    status = response.status
+            except Exception:
+                status = 'error'
+            if request_started < measure_from:
+                continue
+            latencies.append(time.time() - request_started)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status != 200:
+                errors += 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        await asyncio.gather(*(client(session, i) for i in range(concurrency)))
+
+    latencies_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': {str(k): v for k, v in statuses.items()},
+        'rps': round(len(latencies) / duration, 1),
+        'latency_ms_p50': round(float(np.percentile(latencies_ms, 50)), 1),
+        'latency_ms_p95': round(float(np.percentile(latencies_ms, 95)), 1),
+        'latency_ms_p99': round(float(np.percentile(latencies_ms, 99)), 1)
+    }
+
+
+def wait_ready(base_url, timeout=120):
+    async def probe():
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=2)) as session:
+            async with session.get(base_url + '/api/system-status') as response:
+                return response.status == 200
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if asyncio.run(probe()):
+                return True
+        except Exception:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def start_gunicorn(workers, port, threads, root=ROOT_DIR):
+    """gunicorn из каталога root: приложение работает с <root>/data/news.db"""
+    env = dict(os.environ,
+               RADAR_WEB_WORKERS=str(workers),
+               RADAR_WEB_THREADS=str(threads),
+               RADAR_BIND=f'127.0.0.1:{port}',
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT_DIR, os.environ.get('PYTHONPATH')])))
+    if root != ROOT_DIR:
+        # На стенде нейросети не обрабатывают очередь: меряем только API
+        env['RADAR_INPROCESS_WORKER'] = '0'
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT_DIR, 'gunicorn.conf.py'), 'wsgi:app'],
+        cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def run_scaling(worker_counts, paths, concurrency, duration, port, threads):
+    """Пропускная способность при разном числе воркеров gunicorn"""
+    results = []
+    for workers in worker_counts:
+        process = start_gunicorn(workers, port, threads)
+        base_url = f'http://127.0.0.1:{port}'
+        try:
+            if not wait_ready(base_url):
+                logger.error(f"❌ gunicorn с {workers} воркерами не поднялся")
+                continue
+            logger.info(f"🚀 Нагрузка: {workers} воркеров, {concurrency} клиентов, {duration}с")
+            result = asyncio.run(run_load(base_url, paths, concurrency, duration))
+            result['workers'] = workers
+            results.append(result)
+        finally:
+            process.terminate()
+            process.wait(timeout=60)
+
+    if results:
+        base_rps = results[0]['rps'] / results[0]['workers']
+        for result in results:
+            # 1.0 - идеальное линейное масштабирование относительно первого замера
+            result['scaling_efficiency'] = round(result['rps'] / (base_rps * result['workers']), 2) if base_rps else 0
+    return results
+
+
+def build_scenarios(root, detail_samples=200):
+    """Сценарии набора: /api/news по всем сортировкам и приоритетам, статистика, карточки новостей"""
+    scenarios = {}
+    for sort_by in ('hotness', 'date_new', 'date_old', 'source'):
+        for priority in ('all', 'high', 'medium', 'low'):
+            scenarios[f'news sort={sort_by} priority={priority}'] = [
+                f'/api/news?limit=20&sort={sort_by}&priority={priority}'
+            ]
+    scenarios['news hours=168'] = ['/api/news?limit=20&hours=168']
+    scenarios['stats'] = ['/api/stats']
+    scenarios['system-status'] = ['/api/system-status']
+
+    # Карточки открываются по 12-символьному префиксу id, как из веб-интерфейса
+    conn = sqlite3.connect(os.path.join(root, 'data', 'news.db'))
+    try:
+        ids = [row[0] for row in conn.execute(
+            "SELECT id FROM raw_articles WHERE is_finance = 1 ORDER BY RANDOM() LIMIT ?", (detail_samples,)
+        ).fetchall()]
+    finally:
+        conn.close()
+    if ids:
+        scenarios['news-detail'] = [f'/news/{article_id[:12]}' for article_id in ids]
+    return scenarios
+
+
+def time_collection_stats(root, repeats=5):
+    """get_collection_stats сборщика на базе стенда (в процессе, без HTTP)"""
+    sys.path.append(ROOT_DIR)
+    from data_collector import AdvancedFinanceNewsCollector
+
+    collector = AdvancedFinanceNewsCollector(
+        config_path=os.path.join(root, 'config', 'sources.json'),
+        db_path=os.path.join(root, 'data', 'news.db'),
+        embed_articles=False
+    )
+    latencies = []
+    for _ in range(repeats):
+        started = time.time()
+        asyncio.run(collector.get_collection_stats())
+        latencies.append(time.time() - started)
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'scenario': 'get_collection_stats',
+        'requests': repeats,
+        'errors': 0,
+        'rps': round(repeats / sum(latencies), 2),
+        'latency_ms_p50': round(float(np.percentile(latencies_ms, 50)), 1),
+        'latency_ms_p95': round(float(np.percentile(latencies_ms, 95)), 1),
+        'latency_ms_p99': round(float(np.percentile(latencies_ms, 99)), 1)
+    }
+
+
+def run_suite(worker_counts, scenarios, concurrency, duration, port, threads, root):
+    """Все сценарии на синтетической базе стенда для каждого числа воркеров"""
+    results = []
+    for workers in worker_counts:
+        process = start_gunicorn(workers, port, threads, root=root)
+        base_url = f'http://127.0.0.1:{port}'
+        try:
+            if not wait_ready(base_url):
+                logger.error(f"❌ gunicorn с {workers} воркерами не поднялся")
+                continue
+            for name, paths in scenarios.items():
+                logger.info(f"🚀 {name}: {workers} воркеров, {concurrency} клиентов, {duration}с")
+                result = asyncio.run(run_load(base_url, paths, concurrency, duration))
+                result.update(workers=workers, scenario=name)
+                results.append(result)
+        finally:
+            process.terminate()
+            process.wait(timeout=60)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return 'unknown'
+
+
+def save_results(report, results_dir):
+    """Отчет в results_dir/<время>_<коммит>.json - для сравнения версий"""
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{report['revision']}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def latest_results(results_dir):
+    if not os.path.isdir(results_dir):
+        return None
+    reports = sorted(name for name in os.listdir(results_dir) if name.endswith('.json'))
+    return os.path.join(results_dir, reports[-1]) if reports else None
+
+
+def print_comparison(current, previous):
+    """Изменение req/s и p95 по сценариям относительно прошлого отчета"""
+    before = {(row.get('workers'), row['scenario']): row for row in previous['results']}
+    print(f"\n🔁 Сравнение с {previous['revision']} ({previous['created_at']}):")
+    print(f"{'сценарий':<36} {'воркеры':>8} {'req/s':>16} {'p95, мс':>18}")
+    for row in current['results']:
+        old = before.get((row.get('workers'), row['scenario']))
+        if not old:
+            continue
+        rps_change = (row['rps'] - old['rps']) / old['rps'] * 100 if old['rps'] else 0
+        p95_change = (row['latency_ms_p95'] - old['latency_ms_p95']) / old['latency_ms_p95'] * 100 \
+            if old['latency_ms_p95'] else 0
+        print(f"{row['scenario']:<36} {row.get('workers', '-'):>8} {row['rps']:>8.1f} ({rps_change:+5.0f}%) "
+              f"{row['latency_ms_p95']:>9.1f} ({p95_change:+5.0f}%)")
+
+
+def suite_main(args):
+    root = os.path.abspath(args.root)
+    if not os.path.exists(os.path.join(root, 'data', 'news.db')):
+        print(f"❌ Нет базы стенда {root}/data/news.db: сначала scripts/synthetic_corpus.py --root {args.root}")
+        return
+
+    scenarios = build_scenarios(root)
+    if args.scenarios:
+        scenarios = {name: paths for name, paths in scenarios.items()
+                     if any(pattern in name for pattern in args.scenarios.split(','))}
+
+    worker_counts = [int(value) for value in args.workers.split(',')]
+    results = run_suite(worker_counts, scenarios, args.concurrency, args.duration, args.port, args.threads, root)
+    results.append(time_collection_stats(root))
+
+    corpus = {}
+    if os.path.exists(os.path.join(root, 'corpus.json')):
+        with open(os.path.join(root, 'corpus.json'), 'r', encoding='utf-8') as f:
+            corpus = json.load(f)
+
+    report = {
+        'revision': git_revision(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'cpu_count': os.cpu_count(),
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'threads': args.threads,
+        'corpus': corpus,
+        'results': results
+    }
+
+    print(f"\n📊 Набор сценариев: {corpus.get('articles', '?')} статей, {args.concurrency} клиентов, "
+          f"{args.duration}с, CPU: {os.cpu_count()}")
+    print(f"{'сценарий':<36} {'воркеры':>8} {'req/s':>8} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'ошибки':>7}")
+    for row in results:
+        print(f"{row['scenario']:<36} {row.get('workers', '-'):>8} {row['rps']:>8.1f} {row['latency_ms_p50']:>9.1f} "
+              f"{row['latency_ms_p95']:>9.1f} {row['latency_ms_p99']:>9.1f} {row['errors']:>7}")
+
+    previous_path = latest_results(args.results_dir) if args.compare == 'latest' else args.compare
+    path = save_results(report, args.results_dir)
+    print(f"\n💾 Отчет сохранен в {path}")
+
+    if previous_path and os.path.exists(previous_path):
+        with open(previous_path, 'r', encoding='utf-8') as f:
+            print_comparison(report, json.load(f))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест API веб-интерфейса')
+    parser.add_argument('--url', help='Нагружать уже запущенный сервер (иначе - gunicorn с --workers)')
+    parser.add_argument('--workers', default='1,2,4', help='Числа воркеров gunicorn через запятую')
+    parser.add_argument('--threads', type=int, default=4, help='Потоков на воркер gunicorn')
+    parser.add_argument('--paths', default='/api/news?limit=20,/api/news?limit=20&sort=date_new',
+                        help='Запрашиваемые пути через запятую (по кругу)')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=int, default=20, help='Длительность замера, с')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--output', help='Путь для JSON-отчета')
+    parser.add_argument('--suite', action='store_true',
+                        help='Набор сценариев на синтетической базе стенда (scripts/synthetic_corpus.py)')
+    parser.add_argument('--root', default='data/bench', help='Корень стенда для --suite')
+    parser.add_argument('--scenarios', help='Только сценарии, содержащие эти подстроки (через запятую)')
+    parser.add_argument('--results-dir', default='data/load_results', help='Куда сохранять отчеты --suite')
+    parser.add_argument('--compare', help="Сравнить с отчетом: путь или 'latest' (последний в --results-dir)")
+    args = parser.parse_args()
+
+    if args.suite:
+        suite_main(args)
+        return
+
+    paths = args.paths.split(',')
+
+    if args.url:
+        results = [asyncio.run(run_load(args.url.rstrip('/'), paths, args.concurrency, args.duration))]
+    else:
+        worker_counts = [int(value) for value in args.workers.split(',')]
+        results = run_scaling(worker_counts, paths, args.concurrency, args.duration, args.port, args.threads)
+
+    print(f"\n📊 Нагрузка на {', '.join(paths)}: {args.concurrency} клиентов, {args.duration}с, CPU: {os.cpu_count()}")
+    print(f"{'воркеры':>8} {'req/s':>8} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'ошибки':>7} {'эфф.':>6}")
+    for row in results:
+        print(f"{row.get('workers', '-'):>8} {row['rps']:>8.1f} {row['latency_ms_p50']:>9.1f} "
+              f"{row['latency_ms_p95']:>9.1f} {row['latency_ms_p99']:>9.1f} {row['errors']:>7} "
+              f"{row.get('scaling_efficiency', '-'):>6}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'cpu_count': os.cpu_count(), 'paths': paths, 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Отчет сохранен в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
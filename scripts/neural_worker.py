@@ -0,0 +1,80 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+
+# Добавляем корневую директорию в путь для импортов
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_store import get_job_store
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(process)d - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def worker_main():
+    """Один процесс-воркер: свои модели, задачи - из общей таблицы ai_jobs"""
+    from app import run_enrichment_worker
+    from neural_analyzer import get_neural_analyzer
+
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        logger.info("🛑 Сигнал остановки: воркер завершит текущую задачу")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    analyzer = get_neural_analyzer()
+    if not analyzer.models_loaded:
+        logger.error("❌ Нейросетевые модели недоступны, воркер остановлен")
+        return
+
+    run_enrichment_worker(analyzer, stop_event=stop_event)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Воркеры нейросетевой обработки новостей (очередь ai_jobs)')
+    parser.add_argument('--workers', type=int, default=1, help='Количество процессов-воркеров')
+    parser.add_argument('--requeue-failed', action='store_true', help='Вернуть упавшие задачи в очередь и выйти')
+    parser.add_argument('--requeue-stale', action='store_true',
+                        help='Переобработать статьи, обработанные другой версией моделей, и выйти')
+    parser.add_argument('--stats', action='store_true', help='Показать состояние очереди и выйти')
+    args = parser.parse_args()
+
+    jobs = get_job_store()
+
+    if args.requeue_failed or args.requeue_stale or args.stats:
+        if args.requeue_failed:
+            print(f"🔁 Возвращено в очередь упавших задач: {jobs.requeue('failed')}")
+        if args.requeue_stale:
+            from neural_analyzer import MODEL_VERSION
+            print(f"🔁 Поставлено на переобработку: {jobs.requeue(model_version=MODEL_VERSION)}")
+        print(f"📊 Очередь: {jobs.get_stats()}")
+        return
+
+    if args.workers == 1:
+        worker_main()
+        return
+
+    processes = [multiprocessing.Process(target=worker_main, name=f'neural-worker-{i}') for i in range(args.workers)]
+    for process in processes:
+        process.start()
+    logger.info(f"🚀 Запущено воркеров: {len(processes)}")
+
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # Воркеры получили тот же SIGINT и завершают текущие задачи
+        logger.info("⏳ Ожидание завершения воркеров...")
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -12,16 +12,17 @@ echo Доступные команды:
 echo   1 - Запуск веб-интерфейса
 echo   2 - Запуск сборщика новостей
 echo   3 - Проверка статуса базы данных
+echo   4 - Разовый сбор новостей
 echo.
 
-set /p choice="Выберите команду (1/2/3): "
+set /p choice="Выберите команду (1/2/3/4): "
 
 if "%choice%"=="1" (
     echo 🌐 Запуск веб-интерфейса...
     python app.py
 ) else if "%choice%"=="2" (
     echo 🚀 Запуск сборщика новостей...
-    python data_collector.py
+    python scripts\auto_collector.py
 ) else if "%choice%"=="3" (
     echo 📊 Проверка статуса системы...
     python -c "
@@ -62,6 +63,9 @@ def check_database():
 
 check_database()
 "
+) else if "%choice%"=="4" (
+    echo 📥 Разовый сбор новостей...
+    python scripts\auto_collector.py --once
 ) else (
     echo ❌ Неверный выбор
 )
@@ -0,0 +1,267 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# Добавляем корневую директорию в путь для импортов
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from data_collector import AdvancedFinanceNewsCollector
+from entity_index import TYPES, canonical_entity, display_name
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+ENTITIES = {
+    'ru': ['Сбербанк', 'Газпром', 'Роснефть', 'Лукойл', 'ВТБ', 'Яндекс', 'Тинькофф', 'Мосбиржа', 'ЦБ', 'Минфин',
+           'Норникель', 'Новатэк', 'Магнит', 'Полюс', 'АЛРОСА'],
+    'en': ['Fed', 'ECB', 'Apple', 'Microsoft', 'JPMorgan', 'Goldman Sachs', 'Tesla', 'Nvidia', 'OPEC', 'IMF',
+           'BlackRock', 'Amazon', 'Exxon', 'HSBC', 'World Bank']
+}
+TEMPLATES = {
+    'ru': ['{entity} отчитался о росте прибыли на {pct}%', 'Акции {entity} упали на {pct}% после новостей о санкциях',
+           '{entity}: ключевая ставка может вырасти до {rate}%', 'Рубль укрепился, {entity} пересмотрел прогноз',
+           'Инфляция замедлилась до {rate}%, {entity} сохранил курс', 'Нефть подорожала на {pct}%, {entity} в плюсе',
+           '{entity} разместит облигации на {amount} млрд рублей', 'Дивиденды {entity} составят {amount} рубля на акцию'],
+    'en': ['{entity} shares jump {pct}% on strong earnings', '{entity} warns inflation may stay near {rate}%',
+           'Oil prices rise {pct}% as {entity} signals supply cuts', '{entity} raises interest rate to {rate}%',
+           '{entity} bond yields climb as market braces for data', '{entity} to buy back ${amount} billion in stock',
+           'Bitcoin slides {pct}% as {entity} tightens crypto rules', '{entity} cuts GDP forecast for the economy']
+}
+WORDS = {
+    'ru': ('рынок банк ставка инфляция акции облигации рубль доллар прибыль выручка дивиденды инвесторы биржа '
+           'экономика бюджет кредит нефть газ золото прогноз квартал рост снижение компания аналитики').split(),
+    'en': ('market bank rate inflation stocks bonds dollar euro profit revenue dividend investors exchange '
+           'economy budget credit oil gas gold forecast quarter growth decline company analysts').split()
+}
+
+
+def source_weights(count, rng, skew=0.8):
+    """Доли источников по закону Ципфа: несколько крупных лент дают большую часть потока"""
+    weights = 1 / np.arange(1, count + 1) ** skew
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def sample_timestamps(count, days, now, rng):
+    """Время публикации: суточный цикл (пик днем) и спад в выходные, по убыванию"""
+    window = days * 86400
+    stamps = np.empty(0)
+    while len(stamps) < count:
+        candidates = now - rng.uniform(0, window, count * 2)
+        hours = (candidates % 86400) / 3600
+        weekdays = ((candidates // 86400) + 3) % 7  # 1970-01-01 - четверг
+        weight = (0.25 + 0.75 * np.clip(np.sin((hours - 6) / 24 * 2 * np.pi) + 0.2, 0, None) / 1.2) \
+            * np.where(weekdays >= 5, 0.4, 1.0)
+        stamps = np.concatenate([stamps, candidates[rng.random(len(candidates)) < weight]])
+    return np.sort(stamps[:count])[::-1]
+
+
+def make_paragraphs(language, rng, count=500, length=4000):
+    words = WORDS[language]
+    paragraphs = []
+    for _ in range(count):
+        text = ' '.join(rng.choice(words, length // 6))
+        paragraphs.append(text[:length].capitalize() + '.')
+    return paragraphs
+
+
+def enhanced_data(article_id, title, url, source_name, published_at, importance, entities, category, rng):
+    """AI-данные в формате NeuralAnalyzer.process_articles_with_ai"""
+    return {
+        'id': article_id,
+        'headline': title,
+        'hotness': round(importance, 3),
+        'why_now': "🔥 Высокий приоритет" if importance > 0.7 else "📊 Информация к сведению",
+        'entities': entities,
+        'sources': [url],
+        'timeline': [f"{published_at.strftime('%H:%M')} - Публикация", "Следующий час - Мониторинг реакции"],
+        'draft': {
+            'title': f"Анализ: {title}",
+            'lead': "Событие привлекает внимание финансового сообщества.",
+            'bullets': [f"Событие затрагивает {entities[0]}", "Требуется мониторинг развития"],
+            'quote': "Ситуация требует внимания - система",
+            'category': category,
+            'generated_by_ai': True
+        },
+        'category': category,
+        'impact_level': "высокий" if importance > 0.7 else "средний" if importance > 0.5 else "базовый",
+        'source': source_name,
+        'published_at': published_at.isoformat(),
+        'ai_enhanced': True,
+        'sentiment': {'label': str(rng.choice(['positive', 'neutral', 'negative'])), 'score': round(rng.random(), 3)}
+    }
+
+
+def generate_corpus(root, articles=1_000_000, days=30, ai_share=0.35, duplicate_share=0.04,
+                    finance_share=0.92, seed=42, batch_size=20000):
+    """Синтетическая база root/data/news.db с распределениями, похожими на реальный сбор.
+
+    Источники, языки и страны - из config/sources.json (доли по Ципфу),
+    время публикации - за days дней с суточным циклом, важность - бета-
+    распределение (примерно каждая десятая статья выше 0.7), длина текста -
+    логнормальная. Часть статей - почти-дубликаты более ранних, часть уже
+    обработана нейросетями (ai_article_data, чаще важные).
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.join(root, 'data'), exist_ok=True)
+    os.makedirs(os.path.join(root, 'config'), exist_ok=True)
+    config_path = os.path.join(root, 'config', 'sources.json')
+    shutil.copy(os.path.join(ROOT_DIR, 'config', 'sources.json'), config_path)
+    db_path = os.path.join(root, 'data', 'news.db')
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    # Схема - та же, что создает сборщик (таблицы и индексы)
+    collector = AdvancedFinanceNewsCollector(config_path=config_path, db_path=db_path, embed_articles=False)
+    sources = collector.get_sources()
+    weights = source_weights(len(sources), rng)
+
+    now = time.time()
+    paragraphs = {language: make_paragraphs(language, rng) for language in WORDS}
+    started = time.time()
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA journal_mode = MEMORY")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ai_article_data (
+            article_id TEXT PRIMARY KEY,
+            enhanced_data TEXT,
+            processed_at TIMESTAMP,
+            ai_enhanced BOOLEAN DEFAULT 1
+        )
+    ''')
+
+    stamps = sample_timestamps(articles, days, now, rng)
+    recent_ids = []
+    stats = {'articles': 0, 'ai_processed': 0, 'duplicates': 0, 'finance': 0}
+
+    for start in range(0, articles, batch_size):
+        size = min(batch_size, articles - start)
+        source_index = rng.choice(len(sources), size, p=weights)
+        importance = np.clip(rng.beta(2.2, 3.0, size), 0.05, 0.99)
+        # Ключ горячести считается векторно (формула HotnessIndex.key)
+        index = collector.hotness_index
+        hot_keys = np.log(importance) + index.decay * (stamps[start:start + size] - index.ref_ts)
+        lengths = np.where(rng.random(size) < 0.05, 0, np.clip(rng.lognormal(6.4, 0.8, size), 80, 20000)).astype(int)
+        lags = rng.exponential(900, size)
+        is_finance = rng.random(size) < finance_share
+        duplicate = rng.random(size) < duplicate_share
+        # Обработанные нейросетями - чаще важные статьи
+        processed = rng.random(size) < np.clip(ai_share * (0.5 + importance), 0, 1)
+
+        rows = []
+        ai_rows = []
+        entity_rows = []
+        for i in range(size):
+            n = start + i
+            source = sources[source_index[i]]
+            language = source.get('language', 'ru') if source.get('language') in WORDS else 'en'
+            entity = str(rng.choice(ENTITIES[language]))
+            title = str(rng.choice(TEMPLATES[language])).format(
+                entity=entity, pct=round(float(rng.uniform(0.1, 12)), 1), rate=round(float(rng.uniform(2, 21)), 2),
+                amount=int(rng.integers(1, 500))
+            ) + f" [{n}]"
+            url = f"{source['url'].rstrip('/')}/synthetic/{n}"
+            article_id = hashlib.md5(f"{title}{url}".encode()).hexdigest()
+
+            published_at = datetime.fromtimestamp(stamps[n])
+            collected_at = datetime.fromtimestamp(min(stamps[n] + lags[i], now))
+            paragraph = paragraphs[language][n % len(paragraphs[language])]
+            content = (paragraph * (lengths[i] // len(paragraph) + 1))[:lengths[i]]
+            category = collector._categorize_article(title, content[:300])
+
+            duplicate_of = None
+            if duplicate[i] and recent_ids:
+                duplicate_of = recent_ids[int(rng.integers(len(recent_ids)))]
+                stats['duplicates'] += 1
+
+            rows.append((
+                article_id, source['name'], title, url, content, published_at.isoformat(), collected_at.isoformat(),
+                language, category, bool(is_finance[i]), collector._detect_country(source['name'], language),
+                round(float(importance[i]), 4), duplicate_of, float(hot_keys[i]), collected_at.timestamp()
+            ))
+            canonical = canonical_entity(entity)
+            entity_rows.append((canonical, published_at.isoformat(), article_id, TYPES.get(canonical, 'organization')))
+            if processed[i] and not duplicate_of:
+                ai_rows.append((article_id, json.dumps(enhanced_data(
+                    article_id[:12], title, url, source['name'], published_at, float(importance[i]),
+                    [entity], category, rng
+                ), ensure_ascii=False), collected_at.isoformat(), True))
+            stats['finance'] += int(is_finance[i])
+
+        # Оригиналы почти-дубликатов берем из недавних статей (окно детектора - двое суток)
+        recent_ids = (recent_ids + [row[0] for row in rows[::10]])[-5000:]
+
+        conn.executemany('''
+            INSERT OR REPLACE INTO raw_articles
+            (id, source_name, title, url, content, published_at, collected_at, language, category, is_finance,
+             country, importance_score, duplicate_of, hot_key, scored_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.executemany('''
+            INSERT OR REPLACE INTO ai_article_data (article_id, enhanced_data, processed_at, ai_enhanced)
+            VALUES (?, ?, ?, ?)
+        ''', ai_rows)
+        conn.executemany('''
+            INSERT OR REPLACE INTO article_entities (entity_norm, published_at, article_id, entity_type)
+            VALUES (?, ?, ?, ?)
+        ''', entity_rows)
+        conn.commit()
+
+        stats['articles'] += size
+        stats['ai_processed'] += len(ai_rows)
+        logger.info(f"📝 {stats['articles']}/{articles} статей ({time.time() - started:.0f}с)")
+
+    # Справочник сущностей для подсказок - одной агрегацией по индексу
+    conn.create_function('display_name', 1, display_name)
+    conn.execute('''
+        INSERT OR REPLACE INTO entities (entity_norm, name, entity_type, mentions, last_seen)
+        SELECT entity_norm, display_name(entity_norm), MIN(entity_type), COUNT(*), MAX(published_at)
+        FROM article_entities GROUP BY entity_norm
+    ''')
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+    stats.update(
+        db_path=db_path, days=days, seed=seed,
+        db_megabytes=round(os.path.getsize(db_path) / 1024 / 1024, 1),
+        seconds=round(time.time() - started, 1)
+    )
+    with open(os.path.join(root, 'corpus.json'), 'w', encoding='utf-8') as f:
+        json.dump(stats, f, ensure_ascii=False, indent=2)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Генератор синтетической базы новостей для нагрузочных тестов')
+    parser.add_argument('--root', default='data/bench', help='Корень стенда: <root>/data/news.db и <root>/config')
+    parser.add_argument('--articles', type=int, default=1_000_000)
+    parser.add_argument('--days', type=int, default=30, help='Глубина архива, дней')
+    parser.add_argument('--ai-share', type=float, default=0.35, help='Доля статей с AI-данными')
+    parser.add_argument('--duplicate-share', type=float, default=0.04, help='Доля почти-дубликатов')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    stats = generate_corpus(args.root, articles=args.articles, days=args.days, ai_share=args.ai_share,
+                            duplicate_share=args.duplicate_share, seed=args.seed)
+
+    print(f"\n📦 Синтетическая база: {stats['db_path']}")
+    print(f"   статей: {stats['articles']} (финансовых {stats['finance']}, дубликатов {stats['duplicates']})")
+    print(f"   с AI-данными: {stats['ai_processed']}")
+    print(f"   размер: {stats['db_megabytes']} МБ, за {stats['seconds']}с")
+
+
+if __name__ == "__main__":
+    main()
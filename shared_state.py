@@ -0,0 +1,320 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SharedState:
+    """Состояние веб-приложения, общее для всех процессов-воркеров.
+
+    Хранится в news.db: черновики (drafts), флаги и сводки (app_state) и
+    аренды (leases) - с их помощью ровно один процесс владеет фоновыми
+    задачами (нейросети, сбор новостей).
+    """
+
+    def __init__(self, db_path="data/news.db"):
+        self.db_path = db_path
+        self._setup_database()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def _setup_database(self):
+        try:
+            conn = self._connect()
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS drafts (
+                    news_id TEXT PRIMARY KEY,
+                    draft TEXT,
+                    saved_at REAL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS app_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT,
+                    updated_at REAL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT,
+                    expires REAL
+                )
+            ''')
+            conn.close()
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания таблиц общего состояния: {e}")
+
+    # --- Черновики ---
+
+    def save_draft(self, news_id, draft):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                INSERT OR REPLACE INTO drafts (news_id, draft, saved_at) VALUES (?, ?, ?)
+            ''', (news_id, json.dumps(draft, ensure_ascii=False), time.time()))
+        finally:
+            conn.close()
+
+    def get_draft(self, news_id):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT draft FROM drafts WHERE news_id = ?", (news_id,)).fetchone()
+        finally:
+            conn.close()
+        return json.loads(row[0]) if row else None
+
+    # --- Флаги и сводки ---
+
+    def set(self, key, value):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                INSERT OR REPLACE INTO app_state (key, value, updated_at) VALUES (?, ?, ?)
+            ''', (key, json.dumps(value, ensure_ascii=False, default=str), time.time()))
+        finally:
+            conn.close()
+
+    def get(self, key, default=None):
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM app_state WHERE key = ?", (key,)).fetchone()
+            conn.close()
+        except sqlite3.Error as e:
+            logger.error(f"❌ Ошибка чтения общего состояния {key}: {e}")
+            return default
+        return json.loads(row[0]) if row else default
+
+    def delete(self, key):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM app_state WHERE key = ?", (key,))
+        finally:
+            conn.close()
+
+    def pop(self, key, default=None):
+        """Чтение с удалением в одной транзакции: значение забирает ровно один процесс"""
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE вместо DELETE ... RETURNING: тот требует SQLite 3.35+
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute("SELECT value FROM app_state WHERE key = ?", (key,)).fetchone()
+            if row:
+                conn.execute("DELETE FROM app_state WHERE key = ?", (key,))
+            conn.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        return json.loads(row[0]) if row else default
+
+    def delete_stale(self, prefix, max_age):
+        """Удаляет ключи с префиксом, не обновлявшиеся дольше max_age секунд"""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM app_state WHERE key LIKE ? || '%' AND updated_at < ?",
+                         (prefix, time.time() - max_age))
+        finally:
+            conn.close()
+
+    def get_prefix(self, prefix, max_age=None):
+        """Все ключи с префиксом (например, worker:), не старше max_age секунд"""
+        conn = self._connect()
+        try:
+            query = "SELECT key, value, updated_at FROM app_state WHERE key LIKE ? || '%'"
+            params = [prefix]
+            if max_age is not None:
+                query += " AND updated_at >= ?"
+                params.append(time.time() - max_age)
+            rows = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+        return {key[len(prefix):]: json.loads(value) for key, value, _ in rows}
+
+    # --- Аренды ---
+
+    def acquire_lease(self, name, owner, ttl):
+        """Захват или продление аренды: True, если владелец теперь owner"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('''
+                INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires
+                WHERE leases.owner = excluded.owner OR leases.expires < ?
+            ''', (name, owner, now + ttl, now))
+            row = conn.execute("SELECT owner FROM leases WHERE name = ?", (name,)).fetchone()
+            conn.execute('COMMIT')
+            return bool(row) and row[0] == owner
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def release_lease(self, name, owner):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+        finally:
+            conn.close()
+
+    def lease_owner(self, name):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT owner, expires FROM leases WHERE name = ?", (name,)).fetchone()
+        finally:
+            conn.close()
+        if row and row[1] >= time.time():
+            return row[0]
+        return None
+
+
+class LeaderTerm:
+    """Срок лидерства для циклов фоновых задач (интерфейс threading.Event).
+
+    is_set() - срок окончен: аренду отобрали, она истекла без продления
+    (поток продления завис на базе) или воркер останавливается. Циклы задач
+    лидера проверяют его на каждой итерации и завершаются сами.
+    """
+
+    def __init__(self, election):
+        self.election = election
+        self._ended = threading.Event()
+
+    def set(self):
+        self._ended.set()
+
+    def is_set(self):
+        if not self._ended.is_set() and time.time() >= self.election.lease_expires:
+            self.election.lose('аренда истекла без продления')
+        return self._ended.is_set()
+
+    def wait(self, timeout=None):
+        """Пауза между итерациями; True - срок окончен"""
+        deadline = time.time() + (timeout or 0)
+        while not self.is_set():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            # Просыпаемся не реже раза в секунду - проверить срок аренды
+            self._ended.wait(min(remaining, 1.0))
+        return True
+
+
+class LeaderElection:
+    """Выбор процесса-лидера среди веб-воркеров через аренду в базе.
+
+    Каждый воркер раз в ttl/3 секунд продлевает свою запись (worker:<id>) и
+    пытается захватить аренду leader. Захвативший вызывает on_elected один
+    раз за срок лидерства; если лидер упал, аренда истекает и её подхватывает
+    другой воркер. Потерявший аренду завершает срок (term) и вызывает on_lost,
+    чтобы два воркера не вели фоновые задачи одновременно.
+    """
+
+    def __init__(self, state, on_elected, name='leader', ttl=30, worker_id=None, on_lost=None):
+        self.state = state
+        self.on_elected = on_elected
+        self.on_lost = on_lost
+        self.name = name
+        self.ttl = ttl
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.is_leader = False
+        self.lease_expires = 0
+        self.term = None
+        self.started_at = time.time()
+        self.info = {}
+        self._term_lock = threading.Lock()
+
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self.beat()
+        self._thread = threading.Thread(target=self._run, name='leader-election', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.state.delete(f"worker:{self.worker_id}")
+        if self.is_leader:
+            self.lose('воркер останавливается')
+            self.state.release_lease(self.name, self.worker_id)
+
+    def _run(self):
+        while not self._stop.wait(self.ttl / 3):
+            self.beat()
+
+    def beat(self):
+        attempted_at = time.time()
+        try:
+            leader = self.state.acquire_lease(self.name, self.worker_id, self.ttl)
+            if leader:
+                self.lease_expires = attempted_at + self.ttl
+            self.state.set(f"worker:{self.worker_id}", dict(self.info, pid=os.getpid(), leader=leader,
+                                                            started_at=self.started_at))
+            if leader:
+                # Записи упавших воркеров чистит лидер
+                self.state.delete_stale('worker:', self.ttl * 10)
+        except Exception as e:
+            logger.error(f"❌ Ошибка продления аренды лидера: {e}")
+            if self.is_leader and time.time() >= self.lease_expires:
+                self.lose('аренда истекла без продления')
+            return
+
+        if leader and not self.is_leader:
+            with self._term_lock:
+                self.is_leader = True
+                self.term = LeaderTerm(self)
+            logger.info(f"👑 Воркер {self.worker_id} - лидер: фоновые задачи запускаются здесь")
+            try:
+                self.on_elected()
+            except Exception as e:
+                logger.error(f"❌ Ошибка запуска задач лидера: {e}")
+        elif not leader and self.is_leader:
+            self.lose('аренду захватил другой воркер')
+
+    def lose(self, reason):
+        """Конец срока лидерства: циклы задач видят term.is_set() и завершаются"""
+        with self._term_lock:
+            if not self.is_leader:
+                return
+            self.is_leader = False
+            term = self.term
+        if term:
+            term.set()
+        logger.warning(f"⚠️ Воркер {self.worker_id} потерял аренду лидера: {reason}")
+        if self.on_lost:
+            try:
+                self.on_lost()
+            except Exception as e:
+                logger.error(f"❌ Ошибка остановки задач лидера: {e}")
+
+    def workers(self):
+        """Живые воркеры: записи, обновлявшиеся в пределах ttl"""
+        return self.state.get_prefix('worker:', max_age=self.ttl)
+
+
+_state = None
+_state_lock = threading.Lock()
+
+
+def get_shared_state(db_path="data/news.db"):
+    global _state
+    with _state_lock:
+        if _state is None:
+            _state = SharedState(db_path)
+        return _state
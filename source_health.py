@@ -0,0 +1,199 @@
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FETCH = {
+    'connect_timeout': 5,         # установка соединения, с
+    'read_timeout': 15,           # ожидание очередной порции ответа, с
+    'retries': 2,                 # повторов после первой попытки
+    'retry_base_delay': 1.0,      # база экспоненциальной паузы между повторами, с
+    'retry_max_delay': 10.0,
+    'breaker_threshold': 3,       # подряд неудачных прогонов до размыкания
+    'breaker_cooldown': 900,      # сколько источник пропускается после размыкания, с
+    'breaker_max_cooldown': 6 * 3600
+}
+
+# Ответы, которые имеет смысл повторить: перегрузка и временные ошибки сервера
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def retry_delay(attempt, base=1.0, max_delay=10.0):
+    """Экспоненциальная пауза с полным разбросом: U(0, min(max, base * 2^attempt))"""
+    return random.uniform(0, min(max_delay, base * 2 ** attempt))
+
+
+class SourceHealth:
+    """Предохранитель (circuit breaker) для источников новостей.
+
+    closed - источник опрашивается как обычно; после breaker_threshold
+    неудачных прогонов подряд он размыкается (open) и пропускается
+    breaker_cooldown секунд. Затем один пробный опрос (half_open): успех
+    замыкает предохранитель, неудача снова размыкает его с удвоенной паузой
+    (не больше breaker_max_cooldown). Состояние хранится в source_health,
+    чтобы демон сбора и веб-воркеры видели одно и то же.
+    """
+
+    def __init__(self, db_path="data/news.db", config=None):
+        self.db_path = db_path
+        self.config = dict(DEFAULT_FETCH, **(config or {}))
+        self._lock = threading.Lock()
+        self._setup_database()
+
+    def _setup_database(self):
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS source_health (
+                    name TEXT PRIMARY KEY,
+                    state TEXT DEFAULT 'closed',
+                    failures INTEGER DEFAULT 0,
+                    cooldown REAL,
+                    open_until REAL,
+                    trips INTEGER DEFAULT 0,
+                    last_error TEXT,
+                    last_success REAL,
+                    last_failure REAL
+                )
+            ''')
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания таблицы состояния источников: {e}")
+
+    def _load(self, conn, name=None):
+        cursor = conn.cursor()
+        if name is None:
+            cursor.execute("SELECT * FROM source_health")
+        else:
+            cursor.execute("SELECT * FROM source_health WHERE name = ?", (name,))
+        columns = [column[0] for column in cursor.description]
+        return {row[0]: dict(zip(columns, row)) for row in cursor.fetchall()}
+
+    def _save(self, conn, entry):
+        conn.execute('''
+            INSERT OR REPLACE INTO source_health
+            (name, state, failures, cooldown, open_until, trips, last_error, last_success, last_failure)
+            VALUES (:name, :state, :failures, :cooldown, :open_until, :trips, :last_error, :last_success,
+                    :last_failure)
+        ''', entry)
+
+    def _entry(self, conn, name):
+        return self._load(conn, name).get(name) or {
+            'name': name, 'state': 'closed', 'failures': 0, 'cooldown': None, 'open_until': None,
+            'trips': 0, 'last_error': None, 'last_success': None, 'last_failure': None
+        }
+
+    def allow(self, names, now=None):
+        """Какие из источников можно опрашивать сейчас; open с истекшей паузой -> half_open"""
+        now = now or time.time()
+        with self._lock:
+            try:
+                conn = sqlite3.connect(self.db_path, timeout=30)
+            except Exception as e:
+                logger.error(f"❌ Ошибка чтения состояния источников: {e}")
+                return set(names)
+            try:
+                states = self._load(conn)
+                allowed = set()
+                for name in names:
+                    entry = states.get(name)
+                    if entry is None or entry['state'] != 'open':
+                        allowed.add(name)
+                    elif (entry['open_until'] or 0) <= now:
+                        entry['state'] = 'half_open'
+                        self._save(conn, entry)
+                        allowed.add(name)
+                        logger.info(f"🔌 {name}: пробный опрос после паузы")
+                conn.commit()
+                return allowed
+            finally:
+                conn.close()
+
+    def record_success(self, name, now=None):
+        now = now or time.time()
+        with self._lock:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                entry = self._entry(conn, name)
+                if entry['state'] != 'closed':
+                    logger.info(f"✅ {name}: источник снова отвечает, предохранитель замкнут")
+                entry.update(state='closed', failures=0, cooldown=None, open_until=None, last_success=now)
+                self._save(conn, entry)
+                conn.commit()
+            finally:
+                conn.close()
+
+    def record_failure(self, name, error, now=None):
+        """Неудачный опрос (после всех повторов); возвращает новое состояние"""
+        now = now or time.time()
+        config = self.config
+        with self._lock:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                entry = self._entry(conn, name)
+                entry['failures'] = (entry['failures'] or 0) + 1
+                entry['last_error'] = str(error)[:300]
+                entry['last_failure'] = now
+
+                if entry['state'] == 'half_open':
+                    cooldown = min((entry['cooldown'] or config['breaker_cooldown']) * 2,
+                                   config['breaker_max_cooldown'])
+                elif entry['failures'] >= config['breaker_threshold']:
+                    cooldown = config['breaker_cooldown']
+                else:
+                    cooldown = None
+
+                if cooldown:
+                    entry.update(state='open', cooldown=cooldown, open_until=now + cooldown,
+                                 trips=(entry['trips'] or 0) + 1)
+                    logger.warning(f"🔌 {name}: предохранитель разомкнут на {cooldown / 60:.0f} мин "
+                                   f"({entry['failures']} ошибок подряд: {entry['last_error']})")
+                self._save(conn, entry)
+                conn.commit()
+                return entry['state']
+            finally:
+                conn.close()
+
+    def record_outcomes(self, outcomes, now=None):
+        """Итоги прогона: outcomes[name] - список статей (успех) или строка ошибки"""
+        for name, outcome in outcomes.items():
+            if isinstance(outcome, list):
+                self.record_success(name, now)
+            else:
+                self.record_failure(name, outcome, now)
+
+    def get_states(self, now=None):
+        """Состояние предохранителей для API"""
+        now = now or time.time()
+        try:
+            conn = sqlite3.connect(self.db_path)
+            states = self._load(conn)
+            conn.close()
+        except Exception as e:
+            logger.error(f"❌ Ошибка чтения состояния источников: {e}")
+            return {}
+
+        return {
+            name: {
+                'state': entry['state'],
+                'failures': entry['failures'],
+                'trips': entry['trips'],
+                'retry_in': round(max((entry['open_until'] or 0) - now, 0)) if entry['state'] == 'open' else 0,
+                'last_error': entry['last_error']
+            }
+            for name, entry in states.items()
+        }
+
+    def get_summary(self):
+        states = self.get_states()
+        summary = {'closed': 0, 'open': 0, 'half_open': 0}
+        for entry in states.values():
+            summary[entry['state']] = summary.get(entry['state'], 0) + 1
+        summary['open_sources'] = sorted(name for name, entry in states.items() if entry['state'] != 'closed')
+        return summary
+
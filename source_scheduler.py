@@ -0,0 +1,252 @@
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLLING = {
+    'min_interval': 300,          # не чаще раза в 5 минут
+    'max_interval': 6 * 3600,     # и не реже раза в 6 часов
+    'default_interval': 1800,     # стартовый интервал нового источника
+    'target_new_per_fetch': 3,    # сколько новых статей ждать к следующему опросу
+    'empty_backoff': 1.5,         # множитель интервала после опроса без новых статей
+    'error_backoff': 2.0,         # множитель интервала после ошибки
+    'smoothing': 0.3              # вес свежего замера в скользящих средних
+}
+
+
+class SourceScheduler:
+    """Адаптивные интервалы опроса источников по их темпу публикаций.
+
+    Для каждого источника в таблице source_schedule копятся скользящие средние
+    новых статей за опрос и промежутка между публикациями (по published_at).
+    Следующий опрос назначается тогда, когда ожидается target_new_per_fetch
+    новых статей; опросы без новых статей и ошибки отодвигают его множителями
+    empty_backoff / error_backoff. Интервал всегда в пределах min/max из
+    раздела polling конфига (у источника могут быть свои min_interval и
+    max_interval).
+    """
+
+    def __init__(self, db_path="data/news.db", polling=None):
+        self.db_path = db_path
+        self.polling = dict(DEFAULT_POLLING, **(polling or {}))
+        self._lock = threading.Lock()
+        self._setup_database()
+
+    def _setup_database(self):
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS source_schedule (
+                    name TEXT PRIMARY KEY,
+                    interval REAL,
+                    next_due REAL,
+                    last_fetch REAL,
+                    last_status TEXT,
+                    last_error TEXT,
+                    fetches INTEGER DEFAULT 0,
+                    failures INTEGER DEFAULT 0,
+                    empty_streak INTEGER DEFAULT 0,
+                    new_per_fetch REAL,
+                    gap_seconds REAL,
+                    last_published TIMESTAMP
+                )
+            ''')
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания таблицы расписания источников: {e}")
+
+    def _bounds(self, source):
+        return (source.get('min_interval', self.polling['min_interval']),
+                source.get('max_interval', self.polling['max_interval']))
+
+    def _load(self, cursor, names=None):
+        query = "SELECT * FROM source_schedule"
+        params = []
+        if names is not None:
+            query += f" WHERE name IN ({','.join('?' * len(names))})"
+            params = list(names)
+        cursor.execute(query, params)
+        columns = [column[0] for column in cursor.description]
+        return {row[0]: dict(zip(columns, row)) for row in cursor.fetchall()}
+
+    # --- Выбор источников ---
+
+    def due_sources(self, sources, now=None):
+        """Источники, которые пора опросить (новые - сразу)"""
+        now = now or time.time()
+        try:
+            conn = sqlite3.connect(self.db_path)
+            schedule = self._load(conn.cursor())
+            conn.close()
+        except Exception as e:
+            logger.error(f"❌ Ошибка чтения расписания источников: {e}")
+            return list(sources)
+
+        return [source for source in sources
+                if source['name'] not in schedule or (schedule[source['name']]['next_due'] or 0) <= now]
+
+    def next_due_in(self, sources, now=None):
+        """Сколько секунд до ближайшего опроса (0 - кто-то уже просрочен)"""
+        now = now or time.time()
+        try:
+            conn = sqlite3.connect(self.db_path)
+            schedule = self._load(conn.cursor())
+            conn.close()
+        except Exception as e:
+            logger.error(f"❌ Ошибка чтения расписания источников: {e}")
+            return 0
+
+        waits = []
+        for source in sources:
+            entry = schedule.get(source['name'])
+            waits.append(max((entry['next_due'] or 0) - now, 0) if entry else 0)
+        return min(waits) if waits else None
+
+    # --- Учет опросов ---
+
+    def record_fetches(self, sources, outcomes, now=None):
+        """Итоги опроса: outcomes[name] - список статей или строка ошибки.
+
+        Вызывается до сохранения статей: новыми считаются те, чьих id еще
+        нет в raw_articles.
+        """
+        now = now or time.time()
+        by_name = {source['name']: source for source in sources}
+        outcomes = {name: outcome for name, outcome in outcomes.items() if name in by_name}
+        if not outcomes:
+            return {}
+
+        with self._lock:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                cursor = conn.cursor()
+                schedule = self._load(cursor, list(outcomes))
+                known = self._known_ids(cursor, [
+                    article['id'] for outcome in outcomes.values() if isinstance(outcome, list)
+                    for article in outcome
+                ])
+
+                updated = {}
+                for name, outcome in outcomes.items():
+                    entry = self._update_entry(schedule.get(name), by_name[name], outcome, known, now)
+                    entry['name'] = name
+                    cursor.execute('''
+                        INSERT OR REPLACE INTO source_schedule
+                        (name, interval, next_due, last_fetch, last_status, last_error, fetches, failures,
+                         empty_streak, new_per_fetch, gap_seconds, last_published)
+                        VALUES (:name, :interval, :next_due, :last_fetch, :last_status, :last_error, :fetches,
+                                :failures, :empty_streak, :new_per_fetch, :gap_seconds, :last_published)
+                    ''', entry)
+                    updated[name] = entry
+                conn.commit()
+            finally:
+                conn.close()
+
+        return updated
+
+    def _known_ids(self, cursor, ids):
+        known = set()
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            cursor.execute(f"SELECT id FROM raw_articles WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            known.update(row[0] for row in cursor.fetchall())
+        return known
+
+    def _update_entry(self, entry, source, outcome, known, now):
+        polling = self.polling
+        alpha = polling['smoothing']
+        min_interval, max_interval = self._bounds(source)
+
+        entry = dict(entry or {
+            'interval': polling['default_interval'], 'fetches': 0, 'failures': 0, 'empty_streak': 0,
+            'new_per_fetch': None, 'gap_seconds': None, 'last_published': None, 'last_error': None
+        })
+        interval = entry['interval'] or polling['default_interval']
+        entry['fetches'] = (entry['fetches'] or 0) + 1
+
+        if not isinstance(outcome, list):
+            # Ошибка (404, таймаут): экспоненциально отодвигаем, пока источник не оживет
+            entry['failures'] = (entry['failures'] or 0) + 1
+            entry['last_status'] = 'error'
+            entry['last_error'] = str(outcome)[:300]
+            interval *= polling['error_backoff']
+        else:
+            entry['failures'] = 0
+            entry['last_error'] = None
+            fresh = [article for article in outcome if article['id'] not in known]
+            new_count = len(fresh)
+            entry['new_count'] = new_count
+
+            previous = entry['new_per_fetch']
+            entry['new_per_fetch'] = new_count if previous is None else alpha * new_count + (1 - alpha) * previous
+
+            if new_count == 0:
+                entry['empty_streak'] = (entry['empty_streak'] or 0) + 1
+                entry['last_status'] = 'empty' if not outcome else 'no_new'
+                interval *= polling['empty_backoff']
+            else:
+                entry['empty_streak'] = 0
+                entry['last_status'] = 'ok'
+                gap = self._publication_gap(fresh, entry['last_published'], now, entry.get('last_fetch'))
+                if gap:
+                    previous_gap = entry['gap_seconds']
+                    entry['gap_seconds'] = gap if previous_gap is None else alpha * gap + (1 - alpha) * previous_gap
+                if entry['gap_seconds']:
+                    interval = entry['gap_seconds'] * polling['target_new_per_fetch']
+                if new_count == len(outcome) and len(outcome) >= 10:
+                    # Вся выдача оказалась новой - часть статей могла уйти из ленты
+                    interval = min(interval, (entry['interval'] or interval) / 2)
+
+                latest = max(article['published_at'] for article in fresh)
+                if not entry['last_published'] or latest.isoformat() > entry['last_published']:
+                    entry['last_published'] = latest.isoformat()
+
+        entry['interval'] = round(min(max(interval, min_interval), max_interval), 1)
+        entry['last_fetch'] = now
+        entry['next_due'] = now + entry['interval']
+        return entry
+
+    def _publication_gap(self, fresh, last_published, now, last_fetch):
+        """Средний промежуток между публикациями новых статей, с"""
+        stamps = sorted(article['published_at'].timestamp() for article in fresh)
+        if last_published:
+            stamps.insert(0, datetime.fromisoformat(last_published).timestamp())
+        if len(stamps) >= 2 and stamps[-1] > stamps[0]:
+            return (stamps[-1] - stamps[0]) / (len(stamps) - 1)
+        # Даты публикации неизвестны или совпадают - оцениваем по времени между опросами
+        if last_fetch:
+            return (now - last_fetch) / len(fresh)
+        return None
+
+    # --- Состояние ---
+
+    def get_schedule(self, now=None):
+        """Расписание для API: интервалы, ближайшие опросы, урожайность"""
+        now = now or time.time()
+        try:
+            conn = sqlite3.connect(self.db_path)
+            schedule = self._load(conn.cursor())
+            conn.close()
+        except Exception as e:
+            logger.error(f"❌ Ошибка чтения расписания источников: {e}")
+            return []
+
+        result = []
+        for entry in sorted(schedule.values(), key=lambda e: e['next_due'] or 0):
+            result.append({
+                'name': entry['name'],
+                'interval': entry['interval'],
+                'due_in': round(max((entry['next_due'] or 0) - now, 0)),
+                'last_status': entry['last_status'],
+                'last_error': entry['last_error'],
+                'fetches': entry['fetches'],
+                'failures': entry['failures'],
+                'new_per_fetch': round(entry['new_per_fetch'], 2) if entry['new_per_fetch'] is not None else None,
+                'gap_seconds': round(entry['gap_seconds']) if entry['gap_seconds'] else None
+            })
+        return result
@@ -377,16 +377,19 @@ async function collectNow() {
         btn.textContent = '🔄 Собираем...';
     }
     
+    let polling = false;
+    
     try {
         const response = await fetch('/api/collect-now', { method: 'POST' });
         const result = await response.json();
         
         if (result.status === 'success') {
             showNotification(result.message, 'success');
-            setTimeout(() => {
-                loadNews();
-                loadSystemStats();
-            }, 30000);
+            if (result.collection !== 'throttled') {
+                // Повторные нажатия присоединяются к идущему прогону - просто следим за ним
+                polling = true;
+                pollCollectStatus(btn, originalText);
+            }
         } else {
             showError(result.message || 'Ошибка запуска сбора');
         }
@@ -394,13 +397,39 @@ async function collectNow() {
         console.error('Error starting collection:', error);
         showError('Ошибка подключения к серверу');
     } finally {
-        if (btn) {
+        if (btn && !polling) {
             btn.disabled = false;
             btn.textContent = originalText;
         }
     }
 }
 
+async function pollCollectStatus(btn, originalText) {
+    try {
+        const response = await fetch('/api/collect-status');
+        const status = await response.json();
+        const progress = status.run?.progress;
+        
+        if (status.running) {
+            if (btn && progress) {
+                btn.textContent = `🔄 Собираем... ${progress.done + progress.failed}/${progress.total}`;
+            }
+            setTimeout(() => pollCollectStatus(btn, originalText), 2000);
+            return;
+        }
+        
+        loadNews();
+        loadSystemStats();
+    } catch (error) {
+        console.error('Error loading collection status:', error);
+    }
+    
+    if (btn) {
+        btn.disabled = false;
+        btn.textContent = originalText;
+    }
+}
+
 function showLoading(show) {
     const loading = document.getElementById('loading');
     const container = document.getElementById('news-container');
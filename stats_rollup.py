@@ -0,0 +1,229 @@
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ('source_name', 'category', 'language', 'country', 'band')
+KEY = ('hour',) + DIMENSIONS
+
+
+def _bucket(row):
+    """Ключ корзины для строки raw_articles (NEW, OLD или псевдоним в подзапросе)"""
+    return (
+        f"substr({row}.published_at, 1, 13), "
+        f"COALESCE({row}.source_name, 'unknown'), COALESCE({row}.category, 'unknown'), "
+        f"COALESCE({row}.language, 'unknown'), COALESCE({row}.country, 'unknown'), "
+        # Те же границы, что у фильтра priority в /api/news
+        f"CASE WHEN COALESCE({row}.importance_score, 0.5) > 0.7 THEN 'high' "
+        f"WHEN COALESCE({row}.importance_score, 0.5) >= 0.4 THEN 'medium' ELSE 'low' END"
+    )
+
+
+def _ai_count(article_id):
+    return f"(SELECT COUNT(*) FROM ai_article_data WHERE article_id = {article_id})"
+
+
+def _add(row):
+    return f'''
+        INSERT INTO article_rollups ({', '.join(KEY)}, articles, ai_processed)
+        SELECT {_bucket(row)}, 1, {_ai_count(f'{row}.id')} WHERE {row}.is_finance = 1
+        ON CONFLICT ({', '.join(KEY)}) DO UPDATE
+        SET articles = articles + 1, ai_processed = ai_processed + excluded.ai_processed;
+    '''
+
+
+def _subtract(row):
+    return f'''
+        UPDATE article_rollups
+        SET articles = articles - 1, ai_processed = ai_processed - {_ai_count(f'{row}.id')}
+        WHERE {row}.is_finance = 1 AND ({', '.join(KEY)}) = ({_bucket(row)});
+    '''
+
+
+def _ai_shift(article_id, delta):
+    return f'''
+        UPDATE article_rollups SET ai_processed = ai_processed + ({delta})
+        WHERE ({', '.join(KEY)}) = (SELECT {_bucket('r')} FROM raw_articles r WHERE r.id = {article_id} AND r.is_finance = 1);
+    '''
+
+
+# Триггеры держат сводку в согласии с любым писателем: сохранение сборщика (INSERT OR REPLACE),
+# пересчеты важности (UPDATE), нейросетевой воркер (ai_article_data), генераторы стенда
+TRIGGERS = {
+    # REPLACE удаляет старую строку без триггера удаления - вычитаем ее до вставки
+    'rollup_raw_before_insert': f'''
+        BEFORE INSERT ON raw_articles BEGIN
+            UPDATE article_rollups
+            SET articles = articles - 1, ai_processed = ai_processed - {_ai_count('NEW.id')}
+            WHERE ({', '.join(KEY)}) = (SELECT {_bucket('r')} FROM raw_articles r WHERE r.id = NEW.id AND r.is_finance = 1);
+        END
+    ''',
+    'rollup_raw_insert': f"AFTER INSERT ON raw_articles BEGIN {_add('NEW')} END",
+    'rollup_raw_update': f'''
+        AFTER UPDATE OF published_at, source_name, category, language, country, importance_score, is_finance
+        ON raw_articles
+        WHEN ({_bucket('OLD')}, OLD.is_finance) IS NOT ({_bucket('NEW')}, NEW.is_finance)
+        BEGIN {_subtract('OLD')} {_add('NEW')} END
+    ''',
+    'rollup_raw_delete': f"AFTER DELETE ON raw_articles BEGIN {_subtract('OLD')} END",
+    'rollup_ai_before_insert': f'''
+        BEFORE INSERT ON ai_article_data
+        WHEN EXISTS (SELECT 1 FROM ai_article_data WHERE article_id = NEW.article_id)
+        BEGIN {_ai_shift('NEW.article_id', -1)} END
+    ''',
+    'rollup_ai_insert': f"AFTER INSERT ON ai_article_data BEGIN {_ai_shift('NEW.article_id', 1)} END",
+    'rollup_ai_delete': f"AFTER DELETE ON ai_article_data BEGIN {_ai_shift('OLD.article_id', -1)} END",
+}
+
+
+class StatsRollup:
+    """Почасовая сводка финансовых статей: час x источник x категория x язык x страна x полоса приоритета.
+
+    Таблица article_rollups обновляется триггерами на raw_articles и
+    ai_article_data, поэтому счетчики статистики и графиков читаются за
+    O(корзин) без сканирования статей. Час - по published_at (ISO-строка до
+    часа), поэтому окна вида «за 24 часа» считаются с точностью до часа.
+    Страна зависит только от источника и языка и не увеличивает число корзин.
+    """
+
+    def __init__(self, db_path="data/news.db"):
+        self.db_path = db_path
+        self._setup_database()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _setup_database(self):
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA table_info(raw_articles)")
+            if not cursor.fetchall():
+                conn.close()
+                return
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS ai_article_data (
+                    article_id TEXT PRIMARY KEY,
+                    enhanced_data TEXT,
+                    processed_at TIMESTAMP,
+                    ai_enhanced BOOLEAN DEFAULT 1
+                )
+            ''')
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS article_rollups (
+                    hour TEXT NOT NULL,
+                    source_name TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    country TEXT NOT NULL,
+                    band TEXT NOT NULL,
+                    articles INTEGER DEFAULT 0,
+                    ai_processed INTEGER DEFAULT 0,
+                    PRIMARY KEY ({', '.join(KEY)})
+                ) WITHOUT ROWID
+            ''')
+
+            existing = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+            if not set(TRIGGERS) <= existing:
+                # Первый запуск на готовой базе: сводка строится одним проходом вместе с триггерами
+                cursor.execute("BEGIN IMMEDIATE")
+                for name, body in TRIGGERS.items():
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+                    cursor.execute(f"CREATE TRIGGER {name} {body}")
+                cursor.execute("DELETE FROM article_rollups")
+                cursor.execute(f'''
+                    INSERT INTO article_rollups ({', '.join(KEY)}, articles, ai_processed)
+                    SELECT {_bucket('r')}, COUNT(*), COUNT(a.article_id) AS ai_processed
+                    FROM raw_articles r LEFT JOIN ai_article_data a ON a.article_id = r.id
+                    WHERE r.is_finance = 1
+                    GROUP BY 1, 2, 3, 4, 5, 6
+                ''')
+                logger.info(f"📊 Сводка статистики построена: {cursor.rowcount} корзин")
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания сводки статистики: {e}")
+
+    @staticmethod
+    def _since(hours):
+        return (datetime.now() - timedelta(hours=hours - 1)).strftime('%Y-%m-%dT%H') if hours else ''
+
+    def summary(self, hours=None):
+        """Итоги за последние hours часов (None - за все время)"""
+        conn = self._connect()
+        try:
+            where, params = 'WHERE hour >= ?', [self._since(hours)]
+            articles, ai_processed = conn.execute(
+                f"SELECT COALESCE(SUM(articles), 0), COALESCE(SUM(ai_processed), 0) FROM article_rollups {where}",
+                params
+            ).fetchone()
+            breakdown = {}
+            for dimension in DIMENSIONS:
+                breakdown[dimension] = dict(conn.execute(f'''
+                    SELECT {dimension}, SUM(articles) FROM article_rollups {where}
+                    GROUP BY {dimension} HAVING SUM(articles) > 0
+                ''', params).fetchall())
+        finally:
+            conn.close()
+
+        return {
+            'articles': articles,
+            'ai_processed': ai_processed,
+            'sources_count': len(breakdown['source_name']),
+            'priority_stats': {band: breakdown['band'].get(band, 0) for band in ('high', 'medium', 'low')},
+            'sources': breakdown['source_name'],
+            'categories': breakdown['category'],
+            'languages': breakdown['language'],
+            'countries': breakdown['country']
+        }
+
+    def count(self, hours=None):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COALESCE(SUM(articles), 0) FROM article_rollups WHERE hour >= ?",
+                                (self._since(hours),)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def series(self, hours=48, group_by='band', metric='articles', filters=None):
+        """Почасовой ряд: [{'hour': 'YYYY-MM-DDTHH', 'total': n, 'groups': {значение: n}}] по возрастанию часа"""
+        if group_by not in DIMENSIONS:
+            group_by = None
+        metric = 'ai_processed' if metric == 'ai_processed' else 'articles'
+        where, params = ['hour >= ?'], [self._since(hours)]
+        for dimension, value in (filters or {}).items():
+            if dimension in DIMENSIONS and value:
+                where.append(f"{dimension} = ?")
+                params.append(value)
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(f'''
+                SELECT hour, {group_by or "''"}, SUM({metric}) FROM article_rollups
+                WHERE {' AND '.join(where)}
+                GROUP BY 1, 2 ORDER BY 1
+            ''', params).fetchall()
+        finally:
+            conn.close()
+
+        points = {}
+        for hour, group, value in rows:
+            point = points.setdefault(hour, {'hour': hour, 'total': 0, 'groups': {}})
+            point['total'] += value
+            if group_by and value:
+                point['groups'][group] = value
+        return list(points.values())
+
+
+_rollup = None
+_rollup_lock = threading.Lock()
+
+
+def get_stats_rollup(db_path="data/news.db"):
+    global _rollup
+    with _rollup_lock:
+        if _rollup is None:
+            _rollup = StatsRollup(db_path)
+        return _rollup
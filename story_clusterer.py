@@ -0,0 +1,421 @@
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class StoryClusterer:
+    """Онлайн-кластеризация статей в сюжеты.
+
+    Один проход: каждая новая статья сравнивается с центроидами сюжетов,
+    обновлявшихся в пределах временного окна, и присоединяется к ближайшему,
+    если косинусная близость не ниже порога; иначе открывает новый сюжет.
+    Назначения хранятся в article_stories (отдельно от raw_articles, которую
+    сборщик перезаписывает через INSERT OR REPLACE), сводка - в stories.
+    Сюжеты ведут и демон, и лидер веб-процесса, поэтому каждый проход
+    сверяет память с базой и пишет в одной транзакции BEGIN IMMEDIATE.
+    """
+
+    def __init__(self, store, db_path="data/news.db", threshold=0.78, window_hours=12):
+        self.store = store
+        self.db_path = db_path
+        self.threshold = threshold
+        self.window_hours = window_hours
+
+        self.story_ids = []
+        self.centroid_sums = np.empty((0, store.dim), dtype=np.float32)
+        self.centroids = np.empty((0, store.dim), dtype=np.float32)
+        self.stories = {}
+
+        self._lock = threading.RLock()
+        self._setup_database()
+
+    def _setup_database(self):
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS stories (
+                    story_id TEXT PRIMARY KEY,
+                    lead_article_id TEXT,
+                    first_seen TIMESTAMP,
+                    last_seen TIMESTAMP,
+                    article_count INTEGER DEFAULT 1,
+                    source_count INTEGER DEFAULT 1,
+                    sources TEXT
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS article_stories (
+                    article_id TEXT PRIMARY KEY,
+                    story_id TEXT,
+                    similarity REAL
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_article_stories_story
+                ON article_stories(story_id)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_stories_last_seen
+                ON stories(last_seen)
+            ''')
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания таблиц сюжетов: {e}")
+
+    def _load_active_stories(self, cursor):
+        """Сверка сюжетов в памяти с базой: подгружает открытые или дополненные другим процессом"""
+        since_time = datetime.now() - timedelta(hours=self.window_hours)
+        cursor.execute('''
+            SELECT story_id, first_seen, last_seen, article_count, sources
+            FROM stories WHERE last_seen >= ?
+        ''', (since_time.isoformat(),))
+        stale = {row[0]: row for row in cursor.fetchall()
+                 if self.stories.get(row[0], {}).get('article_count') != row[3]}
+        if not stale:
+            return
+
+        self.store.refresh()
+        sums = {}
+        story_ids = list(stale)
+        for start in range(0, len(story_ids), 500):
+            chunk = story_ids[start:start + 500]
+            cursor.execute(
+                f"SELECT story_id, article_id FROM article_stories WHERE story_id IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            for story_id, article_id in cursor.fetchall():
+                vector = self.store.get(article_id)
+                if vector is None:
+                    continue
+                if story_id not in sums:
+                    sums[story_id] = np.zeros(self.store.dim, dtype=np.float32)
+                sums[story_id] += vector
+
+        positions = {story_id: i for i, story_id in enumerate(self.story_ids)}
+        for story_id, centroid_sum in sums.items():
+            _, first_seen, last_seen, article_count, sources = stale[story_id]
+            self.stories[story_id] = {
+                'first_seen': datetime.fromisoformat(first_seen),
+                'last_seen': datetime.fromisoformat(last_seen),
+                'article_count': article_count,
+                'sources': set(json.loads(sources or '[]'))
+            }
+            if story_id in positions:
+                i = positions[story_id]
+                self.centroid_sums[i] = centroid_sum
+                self.centroids[i] = centroid_sum / max(float(np.linalg.norm(centroid_sum)), 1e-12)
+            else:
+                self._append_story(story_id, centroid_sum)
+
+        if sums:
+            logger.info(f"✅ Загружено активных сюжетов из базы: {len(sums)}")
+
+    def _reset(self):
+        """Сброс памяти: следующий проход загрузит сюжеты из базы заново"""
+        self.story_ids = []
+        self.centroid_sums = np.empty((0, self.store.dim), dtype=np.float32)
+        self.centroids = np.empty((0, self.store.dim), dtype=np.float32)
+        self.stories = {}
+
+    @contextmanager
+    def _transaction(self):
+        """Проход кластеризации: сверка с базой и запись под одной блокировкой записи"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            self._load_active_stories(cursor)
+            yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            # Память могла уйти вперед откатанной базы
+            self._reset()
+            raise
+        finally:
+            conn.close()
+
+    def _append_story(self, story_id, centroid_sum):
+        self.story_ids.append(story_id)
+        self.centroid_sums = np.vstack([self.centroid_sums, centroid_sum[None, :]])
+        norm = max(float(np.linalg.norm(centroid_sum)), 1e-12)
+        self.centroids = np.vstack([self.centroids, (centroid_sum / norm)[None, :]])
+
+    def _expire(self, now):
+        """Убирает из памяти сюжеты, не обновлявшиеся дольше окна"""
+        cutoff = now - timedelta(hours=self.window_hours)
+        keep = [i for i, story_id in enumerate(self.story_ids) if self.stories[story_id]['last_seen'] >= cutoff]
+        if len(keep) == len(self.story_ids):
+            return
+
+        for i, story_id in enumerate(self.story_ids):
+            if self.stories[story_id]['last_seen'] < cutoff:
+                del self.stories[story_id]
+        self.story_ids = [self.story_ids[i] for i in keep]
+        self.centroid_sums = self.centroid_sums[keep]
+        self.centroids = self.centroids[keep]
+
+    def assign_articles(self, articles):
+        """Назначает статьям сюжеты; возвращает {article_id: story_id}"""
+        with self._lock:
+            pending = [a for a in articles if a['id'] in self.store]
+            if not pending:
+                return {}
+
+            with self._transaction() as cursor:
+                already = self._assigned(cursor, (a['id'] for a in pending))
+                pending = [a for a in pending if a['id'] not in already]
+                pending.sort(key=lambda a: a.get('published_at') or datetime.now())
+                assignments = self._assign(pending)
+                self._save(cursor, assignments)
+            return {article_id: story_id for article_id, (story_id, _) in assignments.items()}
+
+    def _assign(self, pending):
+        now = datetime.now()
+        self._expire(now)
+
+        assignments = {}
+        for article in pending:
+            vector = self.store.get(article['id'])
+            published = article.get('published_at') or now
+            source_name = article.get('source_name', '')
+
+            best, similarity = None, 0.0
+            if self.story_ids:
+                scores = self.centroids @ vector
+                best = int(np.argmax(scores))
+                similarity = float(scores[best])
+
+            if best is not None and similarity >= self.threshold:
+                story_id = self.story_ids[best]
+                self.centroid_sums[best] += vector
+                self.centroids[best] = self.centroid_sums[best] / max(
+                    float(np.linalg.norm(self.centroid_sums[best])), 1e-12)
+                story = self.stories[story_id]
+                story['article_count'] += 1
+                story['first_seen'] = min(story['first_seen'], published)
+                story['last_seen'] = max(story['last_seen'], published)
+                story['sources'].add(source_name)
+            else:
+                story_id = article['id']
+                similarity = 1.0
+                self.stories[story_id] = {
+                    'first_seen': published,
+                    'last_seen': published,
+                    'article_count': 1,
+                    'sources': {source_name}
+                }
+                self._append_story(story_id, vector.copy())
+
+            assignments[article['id']] = (story_id, similarity)
+
+        return assignments
+
+    def attach_duplicates(self, articles):
+        """Почти-дубликаты (поле duplicate_of) присоединяются к сюжету оригинала без эмбеддинга"""
+        with self._lock:
+            duplicates = [a for a in articles if a.get('duplicate_of')]
+            if not duplicates:
+                return {}
+
+            assignments = {}
+            with self._transaction() as cursor:
+                # Повторно опрошенные дубликаты уже учтены в сюжете
+                already = self._assigned(cursor, (a['id'] for a in duplicates))
+                duplicates = [a for a in duplicates if a['id'] not in already]
+                originals = self._story_ids(cursor, {a['duplicate_of'] for a in duplicates})
+                for article in duplicates:
+                    story_id = originals.get(article['duplicate_of'])
+                    story = self.stories.get(story_id)
+                    if not story:
+                        continue
+                    story['article_count'] += 1
+                    story['sources'].add(article.get('source_name', ''))
+                    assignments[article['id']] = (story_id, 1.0)
+                self._save(cursor, assignments)
+            return {article_id: story_id for article_id, (story_id, _) in assignments.items()}
+
+    def _assigned(self, cursor, article_ids):
+        return set(self._story_ids(cursor, article_ids))
+
+    def _story_ids(self, cursor, article_ids):
+        article_ids = list(article_ids)
+        result = {}
+        for start in range(0, len(article_ids), 500):
+            chunk = article_ids[start:start + 500]
+            cursor.execute(
+                f"SELECT article_id, story_id FROM article_stories WHERE article_id IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            result.update(cursor.fetchall())
+        return result
+
+    def _save(self, cursor, assignments):
+        if not assignments:
+            return
+
+        cursor.executemany('''
+            INSERT OR REPLACE INTO article_stories (article_id, story_id, similarity)
+            VALUES (?, ?, ?)
+        ''', [(article_id, story_id, similarity) for article_id, (story_id, similarity) in assignments.items()])
+
+        touched = {story_id for story_id, _ in assignments.values()}
+        cursor.executemany('''
+            INSERT INTO stories (story_id, lead_article_id, first_seen, last_seen, article_count, source_count, sources)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(story_id) DO UPDATE SET
+                first_seen = excluded.first_seen,
+                last_seen = excluded.last_seen,
+                article_count = excluded.article_count,
+                source_count = excluded.source_count,
+                sources = excluded.sources
+        ''', [(
+            story_id,
+            story_id,
+            self.stories[story_id]['first_seen'].isoformat(),
+            self.stories[story_id]['last_seen'].isoformat(),
+            self.stories[story_id]['article_count'],
+            len(self.stories[story_id]['sources']),
+            json.dumps(sorted(self.stories[story_id]['sources']), ensure_ascii=False)
+        ) for story_id in touched])
+
+
+def story_velocity(source_count, first_seen, last_seen, now=None, min_hours=0.5):
+    """Скорость сюжета: число источников в час с момента первой публикации"""
+    if isinstance(first_seen, str):
+        first_seen = datetime.fromisoformat(first_seen)
+    now = now or datetime.now()
+    hours = max((now - first_seen).total_seconds() / 3600, min_hours)
+    return round(source_count / hours, 3)
+
+
+def get_stories(story_ids, db_path="data/news.db"):
+    """Сводка сюжетов и их статьи: {story_id: {..., 'articles': [...]}}"""
+    story_ids = list(story_ids)
+    if not story_ids:
+        return {}
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    placeholders = ','.join('?' * len(story_ids))
+    cursor.execute(f'''
+        SELECT story_id, lead_article_id, first_seen, last_seen, article_count, source_count
+        FROM stories WHERE story_id IN ({placeholders})
+    ''', story_ids)
+
+    now = datetime.now()
+    stories = {}
+    for story_id, lead_article_id, first_seen, last_seen, article_count, source_count in cursor.fetchall():
+        stories[story_id] = {
+            'story_id': story_id,
+            'lead_article_id': lead_article_id,
+            'first_seen': first_seen,
+            'last_seen': last_seen,
+            'article_count': article_count,
+            'source_count': source_count,
+            'velocity': story_velocity(source_count, first_seen, last_seen, now),
+            'articles': []
+        }
+
+    cursor.execute(f'''
+        SELECT s.story_id, r.id, r.source_name, r.url, r.published_at
+        FROM article_stories s JOIN raw_articles r ON r.id = s.article_id
+        WHERE s.story_id IN ({placeholders})
+        ORDER BY r.published_at
+    ''', story_ids)
+    for story_id, article_id, source_name, url, published_at in cursor.fetchall():
+        if story_id in stories:
+            stories[story_id]['articles'].append({
+                'id': article_id,
+                'source_name': source_name,
+                'url': url,
+                'published_at': published_at
+            })
+
+    conn.close()
+    return stories
+
+
+def _story_signals(source_count, first_seen, last_seen, now):
+    # Скорость - признак горячести только для сюжетов из нескольких источников
+    return story_velocity(source_count, first_seen, last_seen, now) if source_count > 1 else 0.0
+
+
+def get_story_stats(story_ids, db_path="data/news.db"):
+    """Признаки сюжетов для горячести: {story_id: {'size': article_count, 'velocity': источников в час}}"""
+    story_ids = list(story_ids)
+    if not story_ids:
+        return {}
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    placeholders = ','.join('?' * len(story_ids))
+    cursor.execute(f'''
+        SELECT story_id, article_count, source_count, first_seen, last_seen
+        FROM stories WHERE story_id IN ({placeholders})
+    ''', story_ids)
+    now = datetime.now()
+    result = {story_id: {'size': article_count, 'velocity': _story_signals(source_count, first_seen, last_seen, now)}
+              for story_id, article_count, source_count, first_seen, last_seen in cursor.fetchall()}
+    conn.close()
+    return result
+
+
+def get_article_story_stats(article_ids, db_path="data/news.db"):
+    """Признаки сюжетов статей: {article_id: {'size': ..., 'velocity': ...}} (статьи вне сюжетов не попадают)"""
+    article_ids = list(article_ids)
+    if not article_ids:
+        return {}
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    placeholders = ','.join('?' * len(article_ids))
+    cursor.execute(f'''
+        SELECT a.article_id, s.article_count, s.source_count, s.first_seen, s.last_seen
+        FROM article_stories a JOIN stories s ON s.story_id = a.story_id
+        WHERE a.article_id IN ({placeholders})
+    ''', article_ids)
+    now = datetime.now()
+    result = {article_id: {'size': article_count, 'velocity': _story_signals(source_count, first_seen, last_seen, now)}
+              for article_id, article_count, source_count, first_seen, last_seen in cursor.fetchall()}
+    conn.close()
+    return result
+
+
+def get_story_ids(article_ids, db_path="data/news.db"):
+    """Сюжеты статей: {article_id: story_id}"""
+    article_ids = list(article_ids)
+    if not article_ids:
+        return {}
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    placeholders = ','.join('?' * len(article_ids))
+    cursor.execute(f"SELECT article_id, story_id FROM article_stories WHERE article_id IN ({placeholders})", article_ids)
+    result = dict(cursor.fetchall())
+    conn.close()
+    return result
+
+
+_clusterer = None
+_clusterer_lock = threading.Lock()
+
+
+def get_story_clusterer():
+    """Общий для процесса кластеризатор над общим хранилищем эмбеддингов"""
+    global _clusterer
+    from embedding_store import get_embedding_store
+
+    with _clusterer_lock:
+        if _clusterer is None:
+            _clusterer = StoryClusterer(get_embedding_store())
+        return _clusterer
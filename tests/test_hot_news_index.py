@@ -0,0 +1,154 @@
+import hashlib
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from hot_news_index import BANDS, HotNewsIndex
+from hotness_engine import HotnessIndex
+
+K = 10
+
+
+def article_id(n):
+    return hashlib.md5(str(n).encode()).hexdigest()
+
+
+def insert_articles(db_path, hotness, items, now):
+    """items - (n, importance, часов назад); ключи - как у сборщика, в транзакции записи"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("BEGIN IMMEDIATE")
+    ref_ts = hotness.reference(conn)
+    for n, importance, hours_ago in items:
+        published_at = now - timedelta(hours=hours_ago)
+        conn.execute('''
+            INSERT INTO raw_articles (id, source_name, title, url, content, published_at, collected_at,
+                                      is_finance, importance_score, hot_key, scored_at)
+            VALUES (?, 'РБК', ?, ?, '', ?, ?, 1, ?, ?, ?)
+        ''', (article_id(n), f'Статья {n}', f'https://example.com/{n}', published_at.isoformat(),
+              now.isoformat(), importance, hotness.key(importance, published_at, ref_ts), time.time()))
+    conn.commit()
+    conn.close()
+
+
+def expected(db_path, hours, band, limit):
+    since = (datetime.now() - timedelta(hours=hours)).isoformat()
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(f'''
+        SELECT id FROM raw_articles
+        WHERE is_finance = 1 AND published_at >= ? AND hot_key IS NOT NULL AND {BANDS[band][0]}
+        ORDER BY hot_key DESC LIMIT ?
+    ''', (since, limit)).fetchall()
+    conn.close()
+    return [row[0] for row in rows]
+
+
+@pytest.fixture
+def seeded(tmp_path):
+    db_path = str(tmp_path / 'news.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE raw_articles (
+            id TEXT PRIMARY KEY,
+            source_name TEXT,
+            title TEXT,
+            url TEXT,
+            content TEXT,
+            published_at TIMESTAMP,
+            collected_at TIMESTAMP,
+            language TEXT,
+            category TEXT,
+            is_finance BOOLEAN DEFAULT 0,
+            country TEXT DEFAULT 'unknown',
+            importance_score REAL DEFAULT 0.5,
+            duplicate_of TEXT
+        )
+    ''')
+    conn.commit()
+    conn.close()
+
+    hotness = HotnessIndex(db_path)
+    now = datetime.now()
+    # 40 статей за сутки (больше K на каждую полосу) и 40 - за неделю, важность по всем полосам
+    items = [(n, 0.1 + (n * 37 % 89) / 100, (n * 0.57) % 23) for n in range(40)]
+    items += [(n, 0.1 + (n * 53 % 89) / 100, 25 + (n * 3.1) % 140) for n in range(40, 80)]
+    insert_articles(db_path, hotness, items, now)
+    return db_path, hotness
+
+
+def assert_matches(index, db_path, limit=5):
+    """Каждый ответ индекса совпадает с запросом ORDER BY hot_key DESC (None - уход в базу)"""
+    served = 0
+    for hours in (6, 24, 100, 168):
+        for band in BANDS:
+            result = index.top(hours=hours, limit=limit, band=band)
+            if result is None:
+                continue
+            served += 1
+            assert [article['id'] for article in result] == expected(db_path, hours, band, limit), (hours, band)
+    return served
+
+
+def test_top_matches_query_after_rescores_and_evictions(seeded):
+    db_path, hotness = seeded
+    index = HotNewsIndex(db_path, k=K, refresh_interval=0)
+    assert assert_matches(index, db_path) > 0
+
+    # Пересчеты: лидеры суток падают, аутсайдеры поднимаются
+    top_ids = expected(db_path, 24, 'all', 3)
+    conn = sqlite3.connect(db_path)
+    published = dict(conn.execute("SELECT id, published_at FROM raw_articles").fetchall())
+    bottom_ids = [row[0] for row in conn.execute(
+        "SELECT id FROM raw_articles ORDER BY hot_key LIMIT 3").fetchall()]
+    conn.close()
+    hotness.rescore([(i, 0.05, published[i]) for i in top_ids] + [(i, 0.98, published[i]) for i in bottom_ids])
+    assert_matches(index, db_path)
+
+    # Новые горячие статьи вытесняют хвосты списков
+    insert_articles(db_path, hotness, [(n, 0.99 - (n - 100) / 100, 0.1) for n in range(100, 100 + K)],
+                    datetime.now())
+    assert assert_matches(index, db_path) > 0
+    result = index.top(hours=24, limit=3)
+    assert [article['id'] for article in result] == [article_id(n) for n in range(100, 103)]
+
+
+def test_top_falls_back_outside_memory(seeded):
+    db_path, _ = seeded
+    index = HotNewsIndex(db_path, k=K, refresh_interval=0)
+    assert index.top(hours=24, limit=5) is not None
+    # Окно длиннее недели и страница глубже K - только из базы
+    assert index.top(hours=169, limit=5) is None
+    assert index.top(hours=24, limit=K + 1) is None
+    assert index.top(hours=24, limit=5, band='unknown') is None
+
+
+def test_compact_reloads_index(seeded):
+    db_path, hotness = seeded
+    index = HotNewsIndex(db_path, k=K, refresh_interval=0)
+    assert index.top(hours=24, limit=5) is not None
+    old_ref = index.ref_ts
+
+    assert hotness.compact(now=time.time() + 3600, force=True)
+    assert assert_matches(index, db_path) > 0
+    assert index.ref_ts == hotness.ref_ts != old_ref
+
+    # Ключи в памяти - уже сдвинутые, как в базе
+    conn = sqlite3.connect(db_path)
+    keys = dict(conn.execute("SELECT id, hot_key FROM raw_articles").fetchall())
+    conn.close()
+    assert index.articles
+    for article_id_, article in index.articles.items():
+        assert article['hot_key'] == pytest.approx(keys[article_id_])
+
+
+def test_rejected_insert_marks_floor(seeded):
+    db_path, hotness = seeded
+    # Список недели в полосе all заполнен ровно до K - вытеснений еще не было
+    index = HotNewsIndex(db_path, k=80, refresh_interval=0)
+    assert len(index.top(hours=168, limit=81)) == 80
+
+    # Статья ниже хвоста в список не попадает, но страница из 81 статьи теперь только из базы
+    insert_articles(db_path, hotness, [(200, 0.01, 160)], datetime.now())
+    result = index.top(hours=168, limit=81)
+    assert result is None or [article['id'] for article in result] == expected(db_path, 168, 'all', 81)
@@ -0,0 +1,345 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRENDS = {
+    'width': 2048,                  # ширина скетча: ошибка оценки ~ e/width от числа упоминаний в окне
+    'depth': 4,
+    # уровень -> (секунд в корзине, корзин в окне)
+    'levels': {'minute': [60, 60], 'hour': [3600, 48]},
+    'heavy_size': 200,              # кандидатов в частые термины на корзину
+    'min_mentions': 3,              # меньше упоминаний за последний час - не всплеск
+    'flush_seconds': 30,            # как часто воркер сбрасывает счетчики в базу
+    'refresh_seconds': 5            # как часто читатели перечитывают корзины из базы
+}
+
+
+def normalize_term(term):
+    return ' '.join(str(term).lower().split())
+
+
+@lru_cache(maxsize=100000)
+def _cells(term, width, depth):
+    """Столбцы термина в каждой строке скетча (двойное хеширование, стабильно между процессами)"""
+    digest = hashlib.blake2b(term.encode('utf-8'), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:], 'little') | 1
+    return np.array([(h1 + i * h2) % width for i in range(depth)], dtype=np.int64)
+
+
+class CountMinSketch:
+    """Скетч count-min: оценка числа упоминаний сверху, память depth x width"""
+
+    def __init__(self, width, depth, table=None):
+        self.width = width
+        self.depth = depth
+        self.rows = np.arange(depth)
+        self.table = table if table is not None else np.zeros((depth, width), dtype=np.int32)
+
+    def add(self, term, count=1):
+        self.table[self.rows, _cells(term, self.width, self.depth)] += count
+
+    def estimate(self, term):
+        return int(self.table[self.rows, _cells(term, self.width, self.depth)].min())
+
+    def to_bytes(self):
+        return self.table.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, width, depth):
+        return cls(width, depth, np.frombuffer(data, dtype=np.int32).reshape(depth, width).copy())
+
+
+class SlidingWindow:
+    """Окно из корзин одного уровня: скетч и кандидаты в частые термины на корзину, плюс сумма окна"""
+
+    def __init__(self, bucket_seconds, buckets, width, depth, heavy_size):
+        self.bucket_seconds = bucket_seconds
+        self.size = buckets
+        self.width = width
+        self.depth = depth
+        self.heavy_size = heavy_size
+        self.buckets = {}  # номер корзины -> (скетч, {термин: оценка в корзине})
+        self.total = CountMinSketch(width, depth)
+
+    def bucket_of(self, ts):
+        return int(ts // self.bucket_seconds)
+
+    def expire(self, now):
+        oldest = self.bucket_of(now) - self.size + 1
+        for number in [number for number in self.buckets if number < oldest]:
+            sketch, _ = self.buckets.pop(number)
+            self.total.table -= sketch.table
+        return oldest
+
+    def bucket(self, number):
+        if number not in self.buckets:
+            self.buckets[number] = (CountMinSketch(self.width, self.depth), {})
+        return self.buckets[number]
+
+    def put(self, number, sketch, heavy):
+        """Корзина целиком (загрузка из базы)"""
+        self.buckets[number] = (sketch, heavy)
+        self.total.table += sketch.table
+
+    def add(self, term, ts, now):
+        number = self.bucket_of(ts)
+        if number < self.expire(now):
+            return False
+        sketch, heavy = self.bucket(number)
+        sketch.add(term)
+        self.total.add(term)
+        heavy[term] = sketch.estimate(term)
+        trim_heavy(heavy, self.heavy_size)
+        return True
+
+    def estimate(self, term):
+        return self.total.estimate(term)
+
+    def candidates(self):
+        return set().union(*(heavy for _, heavy in self.buckets.values())) if self.buckets else set()
+
+
+def trim_heavy(heavy, size):
+    """Оставляет size самых частых кандидатов (обрезка с запасом - амортизированно дешево)"""
+    if len(heavy) > 2 * size:
+        kept = sorted(heavy.items(), key=lambda item: item[1], reverse=True)[:size]
+        heavy.clear()
+        heavy.update(kept)
+
+
+class TrendDetector:
+    """Скользящие счетчики упоминаний сущностей и ключевых слов.
+
+    Упоминания (теги сборщика, сущности NER) раскладываются по корзинам двух
+    уровней - минутным за последний час и часовым за двое суток. В каждой
+    корзине - скетч count-min и ограниченный список кандидатов в частые
+    термины, поэтому память не зависит от числа различных сущностей.
+    Скетчи линейны: каждый процесс копит свои приращения и прибавляет их
+    к корзинам в таблице trend_buckets (по строке на корзину, без запросов
+    по отдельным сущностям), а читатели периодически перечитывают корзины.
+
+    Всплеск термина - во сколько раз упоминаний за последний час больше,
+    чем в среднем за час в остальной части часового окна: burst = 1 - 1/ratio.
+    """
+
+    def __init__(self, db_path="data/news.db", config=None):
+        self.db_path = db_path
+        self.config = dict(DEFAULT_TRENDS, **(config or {}))
+        self.loaded_version = None
+        self.loaded_at = 0
+        self.flushed_at = time.time()
+        self.pending = {}  # (уровень, корзина) -> приращения этого процесса
+        self._lock = threading.Lock()
+        self.levels = self._empty_levels()
+        self._setup_database()
+        try:
+            self.load()
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки счетчиков трендов: {e}")
+
+    def _empty_levels(self):
+        config = self.config
+        return {
+            name: SlidingWindow(seconds, count, config['width'], config['depth'], config['heavy_size'])
+            for name, (seconds, count) in config['levels'].items()
+        }
+
+    def _setup_database(self):
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS trend_buckets (
+                    level TEXT,
+                    bucket INTEGER,
+                    counts BLOB,
+                    heavy TEXT,
+                    updated_at REAL,
+                    PRIMARY KEY (level, bucket)
+                )
+            ''')
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания таблицы трендов: {e}")
+
+    # --- Учет упоминаний ---
+
+    def observe(self, mentions, now=None):
+        """mentions - пары (термины статьи, время публикации); термин учитывается раз на статью"""
+        now = now or time.time()
+        observed = 0
+        with self._lock:
+            for terms, published_at in mentions:
+                ts = published_at.timestamp() if isinstance(published_at, datetime) else (published_at or now)
+                ts = min(ts, now)
+                for term in {normalize_term(term) for term in terms or [] if term}:
+                    for name, level in self.levels.items():
+                        if level.add(term, ts, now):
+                            sketch, heavy = self._pending_bucket(name, level.bucket_of(ts))
+                            sketch.add(term)
+                            heavy[term] = sketch.estimate(term)
+                            trim_heavy(heavy, self.config['heavy_size'])
+                    observed += 1
+        return observed
+
+    def _pending_bucket(self, name, number):
+        key = (name, number)
+        if key not in self.pending:
+            self.pending[key] = (CountMinSketch(self.config['width'], self.config['depth']), {})
+        return self.pending[key]
+
+    def burst(self, term):
+        """Всплеск термина 0..1 и счетчики (за последний час, за окно часового уровня)"""
+        config = self.config
+        term = normalize_term(term)
+        recent = self.levels['minute'].estimate(term)
+        total = max(self.levels['hour'].estimate(term), recent)
+        if recent < config['min_mentions']:
+            return 0.0, recent, total
+        baseline = (total - recent) / max(config['levels']['hour'][1] - 1, 1)
+        ratio = (recent + 1) / (baseline + 1)
+        return max(1 - 1 / ratio, 0.0), recent, total
+
+    def burst_scores(self, term_lists, now=None):
+        """Всплеск статьи - наибольший среди ее терминов"""
+        with self._lock:
+            self._expire(now)
+            return [max((self.burst(term)[0] for term in terms or []), default=0.0) for terms in term_lists]
+
+    def _expire(self, now=None):
+        now = now or time.time()
+        for level in self.levels.values():
+            level.expire(now)
+
+    def trends(self, level='hour', limit=20, sort='burst', now=None):
+        """Частые термины окна с оценками упоминаний и всплеска"""
+        self.refresh()
+        with self._lock:
+            self._expire(now)
+            window = self.levels.get(level) or self.levels['hour']
+            rows = []
+            for term in window.candidates():
+                burst, recent, _ = self.burst(term)
+                rows.append({'term': term, 'mentions': window.estimate(term), 'last_hour': recent,
+                             'burst': round(burst, 3)})
+        key = (lambda row: (row['burst'], row['mentions'])) if sort == 'burst' else (lambda row: row['mentions'])
+        return sorted(rows, key=key, reverse=True)[:limit]
+
+    # --- Общие корзины в базе ---
+
+    def flush(self, now=None):
+        """Прибавляет накопленные приращения к корзинам в базе и перечитывает общее состояние"""
+        now = now or time.time()
+        with self._lock:
+            pending, self.pending = self.pending, {}
+        self.flushed_at = now
+        if pending:
+            config = self.config
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for (name, number), (delta, delta_heavy) in pending.items():
+                    row = conn.execute("SELECT counts, heavy FROM trend_buckets WHERE level = ? AND bucket = ?",
+                                       (name, number)).fetchone()
+                    sketch = CountMinSketch.from_bytes(row[0], config['width'], config['depth']) if row else delta
+                    heavy = json.loads(row[1]) if row else {}
+                    if row:
+                        sketch.table += delta.table
+                    for term in delta_heavy:
+                        heavy[term] = sketch.estimate(term)
+                    trim_heavy(heavy, config['heavy_size'])
+                    conn.execute('''
+                        INSERT OR REPLACE INTO trend_buckets (level, bucket, counts, heavy, updated_at)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', (name, number, sketch.to_bytes(), json.dumps(heavy, ensure_ascii=False), now))
+                for name, (seconds, count) in config['levels'].items():
+                    conn.execute("DELETE FROM trend_buckets WHERE level = ? AND bucket <= ?",
+                                 (name, int(now // seconds) - count))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                with self._lock:
+                    # Приращения не потеряны - попадут в следующий сброс
+                    for key, (delta, delta_heavy) in pending.items():
+                        sketch, heavy = self._pending_bucket(*key)
+                        sketch.table += delta.table
+                        heavy.update(delta_heavy)
+                raise
+            finally:
+                conn.close()
+        self.load(now)
+
+    def flush_if_due(self, now=None):
+        now = now or time.time()
+        if now - self.flushed_at >= self.config['flush_seconds']:
+            try:
+                self.flush(now)
+            except Exception as e:
+                logger.error(f"❌ Ошибка сохранения счетчиков трендов: {e}")
+
+    def load(self, now=None):
+        """Корзины из базы плюс еще не сброшенные приращения этого процесса"""
+        now = now or time.time()
+        config = self.config
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            rows = conn.execute("SELECT level, bucket, counts, heavy, updated_at FROM trend_buckets").fetchall()
+        finally:
+            conn.close()
+
+        levels = self._empty_levels()
+        for name, number, counts, heavy, _ in rows:
+            level = levels.get(name)
+            if level and number > level.bucket_of(now) - level.size:
+                level.put(number, CountMinSketch.from_bytes(counts, config['width'], config['depth']),
+                          json.loads(heavy))
+        with self._lock:
+            for (name, number), (delta, delta_heavy) in self.pending.items():
+                level = levels.get(name)
+                if level and number > level.bucket_of(now) - level.size:
+                    sketch, heavy = level.bucket(number)
+                    sketch.table += delta.table
+                    level.total.table += delta.table
+                    heavy.update({term: sketch.estimate(term) for term in delta_heavy})
+            self.levels = levels
+            self.loaded_version = max((row[4] for row in rows), default=None)
+            self.loaded_at = now
+
+    def refresh(self):
+        """Перечитывает корзины, если их обновил другой процесс (не чаще refresh_seconds)"""
+        if time.time() - self.loaded_at < self.config['refresh_seconds']:
+            return
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                version = conn.execute("SELECT MAX(updated_at) FROM trend_buckets").fetchone()[0]
+            finally:
+                conn.close()
+            if version != self.loaded_version or self.loaded_version is None:
+                self.load()
+            else:
+                self.loaded_at = time.time()
+        except Exception as e:
+            logger.error(f"❌ Ошибка чтения счетчиков трендов: {e}")
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_trend_detector(db_path="data/news.db"):
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            _detector = TrendDetector(db_path)
+        return _detector
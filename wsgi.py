@@ -0,0 +1,5 @@
+# Точка входа WSGI для продакшн-запуска (см. README, "Запуск в несколько процессов").
+# Инициализация выполняется в каждом воркере хуком post_worker_init из gunicorn.conf.py.
+from app import app
+
+application = app